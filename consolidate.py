@@ -67,14 +67,13 @@ def main(year, doctype='grant'):
           continue
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        main(None)
-    elif len(sys.argv) < 3:
+    doctype, gyear = 'grant', None
+    if len(sys.argv) == 2:
         doctype = sys.argv[1]
         print('Running ' + doctype)
-        main(None, doctype)
-    else:
+    elif len(sys.argv) > 2:
         gyear = sys.argv[2]
         doctype = sys.argv[1]
         print('Running ' + str(gyear) + ' ' + doctype)
+    with alchemy.bulk_load(doctype):
         main(gyear, doctype)
@@ -51,14 +51,30 @@ def integrate(disambig_input_file, disambig_output_file):
     inventor_attributes[3] = inventor_attributes[3].fillna('')
     inventor_attributes['1_x'] = inventor_attributes['1_x'].fillna('')
     rawinventors = defaultdict(list)
-    inventor_inserts = []
-    rawinventor_updates = []
-    patentinventor_inserts = []
     for row in inventor_attributes.iterrows():
         uuid = row[1]['1_y']
         rawinventors[uuid].append(row[1])
-        patentinventor_inserts.append({'inventor_id': uuid, 'patent_id': row[1][4]})
     print 'finished associating ids'
+    session_generator = alchemy.session_generator()
+    session = session_generator()
+    session.execute('truncate inventor; truncate patent_inventor;')
+
+    # the rows are generated as they are written, a chunk at a time
+    from lib.tasks import celery_commit_inserts, celery_commit_updates
+    celery_commit_inserts(vote_inventors(rawinventors), Inventor.__table__, is_mysql(), 20000)
+    patentinventor_inserts = ((raw[4], inventor_id) for inventor_id, raws in rawinventors.iteritems()
+                              for raw in raws)
+    celery_commit_inserts(patentinventor_inserts, patentinventor, is_mysql(), 20000)
+    rawinventor_updates = ((raw[0], inventor_id) for inventor_id, raws in rawinventors.iteritems()
+                           for raw in raws)
+    celery_commit_updates('inventor_id', rawinventor_updates, RawInventor.__table__, is_mysql(), 20000)
+
+def vote_inventors(rawinventors):
+    """
+    Yields the row of the Inventor table for each disambiguated inventor id in
+    [rawinventors], which maps it to the rows of its raw inventors, voting the
+    most frequent name among them
+    """
     i = 0
     for inventor_id in rawinventors.iterkeys():
         i += 1
@@ -80,20 +96,10 @@ def integrate(disambig_input_file, disambig_output_file):
         param['name_last'] = name_last
         param['nationality'] = ''
         assert set(param.keys()) == {'id','name_first','name_last','nationality'}
-        inventor_inserts.append(param)
-        for rawuuid in rawuuids:
-            rawinventor_updates.append({'pk': rawuuid, 'update': param['id']})
+        yield param
         if i % 100000 == 0:
             print i, datetime.now(), rawuuids[0]
     print 'finished voting'
-    session_generator = alchemy.session_generator()
-    session = session_generator()
-    session.execute('truncate inventor; truncate patent_inventor;')
-
-    from lib.tasks import celery_commit_inserts, celery_commit_updates
-    celery_commit_inserts(inventor_inserts, Inventor.__table__, is_mysql(), 20000)
-    celery_commit_inserts(patentinventor_inserts, patentinventor, is_mysql(), 20000)
-    celery_commit_updates('inventor_id', rawinventor_updates, RawInventor.__table__, is_mysql(), 20000)
 
 def main():
     if len(sys.argv) <= 2:
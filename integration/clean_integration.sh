@@ -14,8 +14,9 @@ for table in assignee lawyer location
 do
   echo $table 'diffs...'
   sqlite3 -csv grant.db "select * from ${table}"  > tmp/integration/ipg120327.one/${table}.csv
-  # remove UUIDs from database dump because these change each time
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipg120327.one/${table}.csv
+  # remove row ids (document-table-sequence) from database dump, the
+  # known outputs do not have them
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipg120327.one/${table}.csv
   diff test/integration/clean/ipg120327.one/${table}.csv tmp/integration/ipg120327.one/${table}.csv
 done
 
@@ -29,8 +30,9 @@ for table in assignee lawyer location
 do
   echo $table 'diffs...'
   sqlite3 -csv grant.db "select * from ${table}"  > tmp/integration/ipg120327.two/${table}.csv
-  # remove UUIDs from database dump because these change each time
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipg120327.two/${table}.csv
+  # remove row ids (document-table-sequence) from database dump, the
+  # known outputs do not have them
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipg120327.two/${table}.csv
   diff test/integration/clean/ipg120327.two/${table}.csv tmp/integration/ipg120327.two/${table}.csv
 done
 
@@ -44,8 +46,9 @@ for table in assignee lawyer location
 do
   echo $table 'diffs...'
   sqlite3 -csv grant.db "select * from ${table}"  > tmp/integration/ipg120327.18/${table}.csv
-  # remove UUIDs from database dump because these change each time
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipg120327.18/${table}.csv
+  # remove row ids (document-table-sequence) from database dump, the
+  # known outputs do not have them
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipg120327.18/${table}.csv
   diff test/integration/clean/ipg120327.18/${table}.csv tmp/integration/ipg120327.18/${table}.csv
 done
 
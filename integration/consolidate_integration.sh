@@ -16,7 +16,7 @@ echo Starting clean...
 echo Starting consolidate...
 python consolidate.py
 
-perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12}\t//' disambiguator.csv
+perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+\t//' disambiguator.csv
 diff test/integration/consolidate/ipg120327.two/disambiguator.csv disambiguator.csv
 
 ### 18 rows
@@ -31,7 +31,7 @@ echo Starting clean...
 echo Starting consolidate...
 python consolidate.py
 
-perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12}\t//' disambiguator.csv
+perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+\t//' disambiguator.csv
 diff test/integration/consolidate/ipg120327.18/disambiguator.csv disambiguator.csv
 
 ## clean up after we're done
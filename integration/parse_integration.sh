@@ -11,8 +11,9 @@ for table in application uspatentcitation usapplicationcitation foreigncitation
 do
   echo $table 'diffs...'
   sqlite3 -csv grant.db "select * from ${table}"  > tmp/integration/ipg120327.one/${table}.csv
-  # remove UUIDs from database dump because these change each time
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipg120327.one/${table}.csv
+  # remove row ids (document-table-sequence) from database dump, the
+  # known outputs do not have them
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipg120327.one/${table}.csv
   diff test/integration/parse/ipg120327.one/${table}.csv tmp/integration/ipg120327.one/${table}.csv
 done
 
@@ -25,8 +26,9 @@ for table in application uspatentcitation usapplicationcitation foreigncitation
 do
   echo $table 'diffs...'
   sqlite3 -csv grant.db "select * from ${table}"  > tmp/integration/ipg120327.two/${table}.csv
-  # remove UUIDs from database dump because these change each time
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipg120327.two/${table}.csv
+  # remove row ids (document-table-sequence) from database dump, the
+  # known outputs do not have them
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipg120327.two/${table}.csv
   diff test/integration/parse/ipg120327.two/${table}.csv tmp/integration/ipg120327.two/${table}.csv
 done
 
@@ -39,8 +41,9 @@ for table in application uspatentcitation usapplicationcitation foreigncitation
 do
   echo $table 'diffs...'
   sqlite3 -csv grant.db "select * from ${table}"  > tmp/integration/ipg120327.18/${table}.csv
-  # remove UUIDs from database dump because these change each time
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipg120327.18/${table}.csv
+  # remove row ids (document-table-sequence) from database dump, the
+  # known outputs do not have them
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipg120327.18/${table}.csv
   diff test/integration/parse/ipg120327.18/${table}.csv tmp/integration/ipg120327.18/${table}.csv
 done
 
@@ -53,7 +56,7 @@ for table in application mainclass subclass ipcr uspc claim usreldoc rawlocation
 do
   echo $table 'diffs...'
   sqlite3 -csv -header application.db "select * from ${table}"  > tmp/integration/pa040101.two/${table}.csv
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/pa040101.two/${table}.csv
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/pa040101.two/${table}.csv
   diff test/integration/parse/pa040101.two/${table}.csv tmp/integration/pa040101.two/${table}.csv
 done
 
@@ -66,7 +69,7 @@ for table in application mainclass subclass ipcr uspc claim usreldoc rawlocation
 do
   echo $table 'diffs...'
   sqlite3 -csv -header application.db "select * from ${table}"  > tmp/integration/ipa061228.one/${table}.csv
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipa061228.one/${table}.csv
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipa061228.one/${table}.csv
   diff test/integration/parse/ipa061228.one/${table}.csv tmp/integration/ipa061228.one/${table}.csv
 done
 
@@ -79,7 +82,7 @@ for table in application mainclass subclass ipcr uspc claim usreldoc rawlocation
 do
   echo $table 'diffs...'
   sqlite3 -csv -header application.db "select * from ${table}"  > tmp/integration/ipa130117.one/${table}.csv
-  perl -pi -e 's/^[a-z0-9]{8}-([a-z0-9]{4}-){3}[a-z0-9]{12},//' tmp/integration/ipa130117.one/${table}.csv
+  perl -pi -e 's/^[A-Z0-9]+-[a-z]+-\d+,//' tmp/integration/ipa130117.one/${table}.csv
   diff test/integration/parse/ipa130117.one/${table}.csv tmp/integration/ipa130117.one/${table}.csv
 done
 
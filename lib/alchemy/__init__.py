@@ -1,12 +1,18 @@
 import os
 import re
+import logging
 import ConfigParser
+from contextlib import contextmanager
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.sql import exists
 from collections import defaultdict
 import schema
+import bulk
+import manifest
+import indexes
+import tsv
 from match import *
 
 from sqlalchemy import exc
@@ -34,6 +40,12 @@ def is_mysql():
     return config.get('global').get('database') == 'mysql'
 
 
+# the global configuration file, found once: __file__ may be relative to the
+# directory lib.alchemy was imported from
+default_config = "{0}/config.ini".format(os.path.dirname(os.path.realpath(__file__)))
+# configurations read by get_config, by (absolute path of the local file, default_file)
+_configs = {}
+
 def get_config(localfile="config.ini", default_file=True):
     """
     This grabs a configuration file and converts it into
@@ -41,9 +53,33 @@ def get_config(localfile="config.ini", default_file=True):
 
     The default filename is called config.ini
     First we load the global file, then we load a local file
+
+    The files are only read the first time: the same dictionary is returned
+    to every caller after that (so it must not be modified) until
+    reload_config is called
+    """
+    key = (os.path.abspath(localfile), default_file)
+    config = _configs.get(key)
+    if config is None:
+        config = _configs[key] = read_config(localfile, default_file)
+    return config
+
+
+def reload_config():
+    """
+    Makes get_config read the configuration files again the next time it is
+    called. Engines of databases that are configured differently afterwards
+    are created as they are needed (see get_engine)
+    """
+    _configs.clear()
+
+
+def read_config(localfile="config.ini", default_file=True):
+    """
+    Reads the configuration for get_config, see there
     """
     if default_file:
-        openfile = "{0}/config.ini".format(os.path.dirname(os.path.realpath(__file__)))
+        openfile = default_config
     else:
         openfile = localfile
     config = defaultdict(dict)
@@ -59,21 +95,35 @@ def get_config(localfile="config.ini", default_file=True):
 
     # this enables us to load a local file
     if default_file:
-        newconfig = get_config(localfile, default_file=False)
+        newconfig = read_config(localfile, default_file=False)
         for section in newconfig:
             for item in newconfig[section]:
                 config[section][item] = newconfig[section][item]
 
     return config
 
-def session_generator(db=None, dbtype='grant'):
-    """
-    Read from config.ini file and load appropriate database
 
-    @db: string describing database, e.g. "sqlite" or "mysql"
-    @dbtype: string indicating if we are fetching the session for
-             the grant database or the application database
+# engines created by get_engine in this process, by (db, dbtype, url), and
+# the session classes of fetch_session, by engine
+_engines = {}
+_sessionmakers = {}
+_engines_pid = None
+
+def get_engine(db=None, dbtype='grant', sqlite_prefix=''):
+    """
+    Returns the engine of the [dbtype] database ('grant' or 'application')
+    on the [db] backend, e.g. "sqlite" or "mysql" (by default the configured
+    one). The engine, with its pool of connections, is created and the
+    tables of the schema are created in the database the first time it is
+    asked for in a process; it is reused after that. [sqlite_prefix] is
+    prepended to the path of SQLite databases
     """
+    global _engines_pid
+    if _engines_pid != os.getpid():
+        # connections in the pool of the parent process are not ours to use
+        _engines.clear()
+        _sessionmakers.clear()
+        _engines_pid = os.getpid()
     config = get_config()
     echo = config.get('global').get('echo')
     if not db:
@@ -82,21 +132,136 @@ def session_generator(db=None, dbtype='grant'):
         sqlite_db_path = os.path.join(
             config.get(db).get('path'),
             config.get(db).get('{0}-database'.format(dbtype)))
-        if os.path.basename(os.getcwd()) == 'lib':
-            sqlite_db_path = '../' + sqlite_db_path
-        engine = create_engine('sqlite:///{0}'.format(sqlite_db_path), echo=echo, echo_pool=True)
+        url = 'sqlite:///{0}{1}'.format(sqlite_prefix, sqlite_db_path)
     else:
-        engine = create_engine('mysql+mysqldb://{0}:{1}@{2}/{3}?charset=utf8'.format(
+        url = 'mysql+mysqldb://{0}:{1}@{2}/{3}?charset=utf8'.format(
             config.get(db).get('user'),
             config.get(db).get('password'),
             config.get(db).get('host'),
-            config.get(db).get('{0}-database'.format(dbtype)), echo=echo), pool_size=3, pool_recycle=3600, echo_pool=True)
+            config.get(db).get('{0}-database'.format(dbtype)))
+    key = (db, dbtype, url)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+    if db[:6] == "sqlite":
+        engine = create_engine(url, echo=echo)
+        event.listen(engine, 'connect', lambda connection, record: _bulk_load_connect(connection, dbtype))
+    else:
+        engine = create_engine(url, echo=echo,
+                               pool_size=config.get(db).get('pool_size', 5),
+                               max_overflow=config.get(db).get('max_overflow', 10),
+                               pool_recycle=config.get(db).get('pool_recycle', 3600))
 
     if dbtype == 'grant':
         schema.GrantBase.metadata.create_all(engine)
     else:
         schema.ApplicationBase.metadata.create_all(engine)
+    _engines[key] = engine
+    return engine
+
+# number of bulk_load blocks running, by dbtype
+_bulk_loads = defaultdict(int)
+
+def _set_pragmas(connection, section):
+    """
+    Sets the SQLite pragmas in the [section] of config.ini on the DB-API
+    [connection]
+    """
+    cursor = connection.cursor()
+    for pragma, value in get_config().get(section, {}).iteritems():
+        cursor.execute('PRAGMA {0} = {1}'.format(pragma, value))
+    cursor.close()
+
+def _bulk_load_connect(connection, dbtype):
+    if _bulk_loads[dbtype]:
+        _set_pragmas(connection, 'sqlite-bulk')
+
+@contextmanager
+def bulk_load(dbtype='grant', defer_indexes=False):
+    """
+    Runs a block that loads the [dbtype] database in bulk (parse, clean and
+    consolidate). If the bulk-profile option of [sqlite] is True, every
+    connection to the SQLite database opened in the block gets the pragmas
+    of [sqlite-bulk], which trade durability for speed. When the block ends,
+    the pragmas of [sqlite-safe] are set again and the database is analyzed
+    for the query planner.
+
+    If [defer_indexes] is True (parse) and so is the defer_indexes option of
+    [parse], the secondary indexes of the tables parse.py loads are dropped
+    before the block and created again after it (see lib/alchemy/indexes.py).
+    If the block raises an exception they are left pending; the next
+    bulk_load creates them, so other phases never run without them
+    """
+    config = get_config()
+    profile = config.get('global').get('database')[:6] == 'sqlite' and \
+              config.get('sqlite').get('bulk-profile')
+    if profile:
+        _bulk_loads[dbtype] += 1
+    try:
+        if defer_indexes and config.get('parse').get('defer_indexes'):
+            _deferred_indexes(dbtype, indexes.defer)
+        else:
+            _deferred_indexes(dbtype, indexes.rebuild)
+        yield
+        _deferred_indexes(dbtype, indexes.rebuild)
+    finally:
+        if profile:
+            _bulk_loads[dbtype] -= 1
+            if not _bulk_loads[dbtype]:
+                _finish_bulk_load(dbtype)
+
+def _deferred_indexes(dbtype, function):
+    """
+    Calls [function], indexes.defer or indexes.rebuild, for the tables of
+    the [dbtype] database that parse.py loads, and logs the indexes it
+    returns
+    """
+    if dbtype == 'grant':
+        pending_table, tables = schema.PendingIndex, bulk.grant_tables
+    else:
+        pending_table, tables = schema.App_PendingIndex, bulk.application_tables
+    session = fetch_session(dbtype=dbtype)
+    try:
+        names = function(session, pending_table, tables)
+    finally:
+        session.close()
+    if names:
+        logging.info("{0} indexes {1}: {2}".format(
+            dbtype, 'deferred' if function == indexes.defer else 'created', ', '.join(names)))
+    return names
+
+def _finish_bulk_load(dbtype):
+    """
+    Sets the [sqlite-safe] pragmas on the SQLite [dbtype] database and runs
+    ANALYZE on it. The journal mode can only be changed when no other
+    connection is open, so the module's session of the database is closed
+    first
+    """
+    (grantsession if dbtype == 'grant' else appsession).close()
+    engine = get_engine(dbtype=dbtype)
+    connection = engine.raw_connection()
+    try:
+        _set_pragmas(connection, 'sqlite-safe')
+        cursor = connection.cursor()
+        cursor.execute('ANALYZE')
+        cursor.close()
+        connection.commit()
+    except Exception as e:
+        # e.g. the journal mode cannot be changed while other connections are open
+        logging.warning("could not restore {0}: {1}".format(engine.url, e))
+    finally:
+        connection.close()
+
+def session_generator(db=None, dbtype='grant'):
+    """
+    Read from config.ini file and load appropriate database
 
+    @db: string describing database, e.g. "sqlite" or "mysql"
+    @dbtype: string indicating if we are fetching the session for
+             the grant database or the application database
+    """
+    prefix = '../' if os.path.basename(os.getcwd()) == 'lib' else ''
+    engine = get_engine(db, dbtype, prefix)
     Session = sessionmaker(bind=engine, _enable_transaction_accounting=False)
     return scoped_session(Session)
     #return Session
@@ -109,32 +274,35 @@ def fetch_session(db=None, dbtype='grant'):
     @dbtype: string indicating if we are fetching the session for
              the grant database or the application database
     """
-    config = get_config()
-    echo = config.get('global').get('echo')
-    if not db:
-        db = config.get('global').get('database')
-    if db[:6] == "sqlite":
-        sqlite_db_path = os.path.join(
-            config.get(db).get('path'),
-            config.get(db).get('{0}-database'.format(dbtype)))
-        engine = create_engine('sqlite:///{0}'.format(sqlite_db_path), echo=echo)
-    else:
-        engine = create_engine('mysql+mysqldb://{0}:{1}@{2}/{3}?charset=utf8'.format(
-            config.get(db).get('user'),
-            config.get(db).get('password'),
-            config.get(db).get('host'),
-            config.get(db).get('{0}-database'.format(dbtype)), echo=echo))
-
-    if dbtype == 'grant':
-        schema.GrantBase.metadata.create_all(engine)
-    else:
-        schema.ApplicationBase.metadata.create_all(engine)
-
-    Session = sessionmaker(bind=engine, _enable_transaction_accounting=False)
+    engine = get_engine(db, dbtype)
+    Session = _sessionmakers.get(engine)
+    if Session is None:
+        Session = _sessionmakers[engine] = sessionmaker(bind=engine, _enable_transaction_accounting=False)
     session = Session()
     return session
 
 
+class LazySession(object):
+    """
+    Stands in for the session of the [dbtype] database, which is created by
+    fetch_session the first time it is used, so that importing lib.alchemy
+    does not open (or create) the databases
+    """
+
+    def __init__(self, dbtype):
+        self._dbtype = dbtype
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = fetch_session(dbtype=self._dbtype)
+        return getattr(self._session, name)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
 def add_grant(obj, override=True, temp=False):
     """
     PatentGrant Object converting to tables via SQLAlchemy
@@ -171,13 +339,24 @@ def add_grant(obj, override=True, temp=False):
     pat.application = schema.Application(**obj.app)
     # lots of abstracts seem to be missing. why?
     add_all_fields(obj, pat)
-    grantsession.execute('set foreign_key_checks = 0;')
-    grantsession.execute('set unique_checks = 0;')
+    if is_mysql():
+        grantsession.execute('set foreign_key_checks = 0;')
+        grantsession.execute('set unique_checks = 0;')
     grantsession.commit()
 
     grantsession.merge(pat)
 
 
+def add_grants(objs, override=True):
+    """
+    Bulk version of add_grant: writes the list of PatentGrant objects [objs]
+    in a single transaction using one multi-row INSERT per table (see
+    lib/alchemy/bulk.py), and commits. Returns the number of rows written per table.
+    If the batch fails it is rolled back and the error is raised
+    """
+    return bulk.add_grants(grantsession, objs, is_mysql(), override)
+
+
 def add_all_fields(obj, pat):
     add_asg(obj, pat)
     add_inv(obj, pat)
@@ -370,6 +549,28 @@ def add_app_claims(obj, app):
         app.claims.append(clm)
 
 
+def add_applications(objs, override=True):
+    """
+    Bulk version of add_application: writes the list of PatentApplication
+    objects [objs] in a single transaction using one multi-row INSERT per table
+    (see lib/alchemy/bulk.py), and commits. Returns the number of rows written per table.
+    If the batch fails it is rolled back and the error is raised
+    """
+    return bulk.add_applications(appsession, objs, is_mysql(), override)
+
+
+def get_manifest_entry(filename, handler, doctype='grant'):
+    """
+    Returns the manifest entry recording how far [filename] has been loaded
+    into the [doctype] database with the handler module [handler] (see
+    lib/alchemy/manifest.py). The entry is reset if the file or its handler
+    has changed since it was recorded
+    """
+    if doctype == 'grant':
+        return manifest.get_entry(grantsession, schema.Manifest, filename, handler)
+    return manifest.get_entry(appsession, schema.App_Manifest, filename, handler)
+
+
 def commit_application():
     try:
         appsession.commit()
@@ -377,6 +578,6 @@ def commit_application():
         appsession.rollback()
         print str(e)
 
-grantsession = fetch_session(dbtype='grant')
-appsession = fetch_session(dbtype='application')
+grantsession = LazySession('grant')
+appsession = LazySession('application')
 session = grantsession # default for clean and consolidate
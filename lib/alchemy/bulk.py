@@ -0,0 +1,301 @@
+"""
+Bulk loader for parsed patent documents. Instead of building a graph of ORM
+objects for every document and merging it into the session (see add_grant
+and add_application), a batch of Patobj records is flattened into one list of
+rows per table and each list is written with a single executemany INSERT OR
+IGNORE (SQLite) or INSERT IGNORE (MySQL), all in one transaction per batch.
+"""
+
+import re
+import time
+from collections import OrderedDict
+
+import schema
+
+# set by parse.py to a metrics.Metrics that times the inserts into every
+# table (see lib/metrics.py)
+metrics = None
+
+# tables in the order they are inserted: referenced rows before referencing rows
+grant_tables = [schema.Patent.__table__,
+                schema.Application.__table__,
+                schema.RawLocation.__table__,
+                schema.MainClass.__table__,
+                schema.SubClass.__table__,
+                schema.RawAssignee.__table__,
+                schema.RawInventor.__table__,
+                schema.RawLawyer.__table__,
+                schema.USRelDoc.__table__,
+                schema.USPC.__table__,
+                schema.IPCR.__table__,
+                schema.USPatentCitation.__table__,
+                schema.USApplicationCitation.__table__,
+                schema.ForeignCitation.__table__,
+                schema.OtherReference.__table__,
+                schema.Claim.__table__]
+
+application_tables = [schema.App_Application.__table__,
+                      schema.App_RawLocation.__table__,
+                      schema.App_MainClass.__table__,
+                      schema.App_SubClass.__table__,
+                      schema.App_RawAssignee.__table__,
+                      schema.App_RawInventor.__table__,
+                      schema.App_USRelDoc.__table__,
+                      schema.App_USPC.__table__,
+                      schema.App_IPCR.__table__,
+                      schema.App_Claim.__table__]
+
+# tables holding rows owned by a document, which are replaced when it is reparsed
+grant_patent_tables = [table for table in grant_tables if 'patent_id' in table.c] + \
+                      [schema.patentassignee, schema.patentinventor, schema.patentlawyer]
+
+application_owned_tables = [table for table in application_tables if 'application_id' in table.c] + \
+                            [schema.applicationassignee, schema.applicationinventor]
+
+
+def row(table, data, **extra):
+    """
+    Returns a row for [table] holding the values in the dictionary [data]
+    updated with [extra]. Every column of [table] gets a value (None if it is
+    not in [data]) so that all rows for a table have the same keys, and keys
+    that are not columns of [table] are dropped
+    """
+    data = dict(data, **extra)
+    return dict((column, data.get(column)) for column in table.c.keys())
+
+
+def document_rows(tables, obj, owner, rows, shared):
+    """
+    Adds the rows common to grants and applications for the Patobj [obj] to
+    [rows]. [tables] maps table names to the tables of the grant or the
+    application schema (both use the same names), [owner] is the dictionary
+    holding the foreign key to the document, e.g. {'patent_id': ...}, and
+    [shared] maps the names of the tables whose rows are shared between
+    documents (rawlocation, mainclass, subclass) to an OrderedDict of rows by
+    id. Only the first row seen for an id is kept, here and, through INSERT
+    OR IGNORE, across batches. Rows with the same id need not be equal: the
+    id of a rawlocation is its lowercased, unidecoded city, state and
+    country, while its columns keep the spelling of the document (e.g.
+    Vasteras with or without its accents). The 'orm' loader merges every document, so
+    it keeps the last spelling seen instead
+    """
+    locations = shared['rawlocation']
+    for asg, loc in obj.assignee_list:
+        locations.setdefault(loc['id'], loc)
+        rows[tables['rawassignee']].append(
+            row(tables['rawassignee'], asg, rawlocation_id=loc['id'], **owner))
+    for inv, loc in obj.inventor_list:
+        locations.setdefault(loc['id'], loc)
+        rows[tables['rawinventor']].append(
+            row(tables['rawinventor'], inv, rawlocation_id=loc['id'], **owner))
+    for usr in obj.us_relation_list:
+        rows[tables['usreldoc']].append(
+            row(tables['usreldoc'], usr, rel_id=usr["number"], **owner))
+    for uspc, mc, sc in obj.us_classifications:
+        shared['mainclass'].setdefault(mc['id'], mc)
+        shared['subclass'].setdefault(sc['id'], sc)
+        rows[tables['uspc']].append(
+            row(tables['uspc'], uspc, mainclass_id=mc['id'], subclass_id=sc['id'], **owner))
+    for ipc in obj.ipcr_classifications:
+        rows[tables['ipcr']].append(row(tables['ipcr'], ipc, **owner))
+    for claim in obj.claims:
+        rows[tables['claim']].append(row(tables['claim'], claim, **owner))
+
+
+def flatten(objs, table_list, document_table, document, owner_key, add_rows=None):
+    """
+    Flattens the Patobj records in [objs] into rows for the tables in
+    [table_list]. [document] returns the row dictionary of a record for
+    [document_table] and [owner_key] is the column through which the other
+    rows refer to the document. [add_rows], if given, is called with
+    (obj, owner, rows) to add the rows specific to one schema.
+    Records with a number shorter than three characters are skipped, as in
+    add_grant and add_application. Returns an OrderedDict mapping each table
+    in [table_list] to its list of rows
+    """
+    tables = dict((table.name, table) for table in table_list)
+    rows = OrderedDict((table, []) for table in table_list)
+    shared = dict((name, OrderedDict()) for name in ('rawlocation', 'mainclass', 'subclass'))
+    for obj in objs:
+        if not obj or len(document(obj)["number"]) < 3:
+            continue
+        owner = {owner_key: document(obj)["id"]}
+        rows[document_table].append(row(document_table, document(obj)))
+        if add_rows:
+            add_rows(obj, owner, rows)
+        document_rows(tables, obj, owner, rows, shared)
+    for name, values in shared.iteritems():
+        rows[tables[name]] = [row(tables[name], value) for value in values.itervalues()]
+    return rows
+
+
+def add_grant_rows(obj, owner, rows):
+    """
+    Adds the rows that only grants have: the application, lawyers, and the
+    citations, which are split into US patent, US application and foreign
+    citations as in add_citations
+    """
+    rows[schema.Application.__table__].append(row(schema.Application.__table__, obj.app, **owner))
+    for law in obj.lawyer_list:
+        rows[schema.RawLawyer.__table__].append(row(schema.RawLawyer.__table__, law, **owner))
+    cits, refs = obj.citation_list
+    for cit in cits:
+        if cit['country'] == 'US':
+            # granted patent doc number
+            if re.match(r'^[A-Z]*\d+$', cit['number']):
+                rows[schema.USPatentCitation.__table__].append(
+                    row(schema.USPatentCitation.__table__, cit, citation_id=cit['number'], **owner))
+            # if not above, it's probably an application
+            else:
+                rows[schema.USApplicationCitation.__table__].append(
+                    row(schema.USApplicationCitation.__table__, cit, application_id=cit['number'], **owner))
+        # if not US, then foreign citation
+        else:
+            rows[schema.ForeignCitation.__table__].append(
+                row(schema.ForeignCitation.__table__, cit, **owner))
+    for ref in refs:
+        rows[schema.OtherReference.__table__].append(row(schema.OtherReference.__table__, ref, **owner))
+
+
+def grant_rows(objs):
+    """
+    Flattens the Patobj grant records in [objs] into rows. Returns an
+    OrderedDict mapping each table in [grant_tables] to its list of rows
+    """
+    return flatten(objs, grant_tables, schema.Patent.__table__,
+                   lambda obj: obj.pat, 'patent_id', add_grant_rows)
+
+
+def application_rows(objs):
+    """
+    Flattens the Patobj application records in [objs] into rows. Returns an
+    OrderedDict mapping each table in [application_tables] to its list of rows
+    """
+    return flatten(objs, application_tables, schema.App_Application.__table__,
+                   lambda obj: obj.app, 'application_id')
+
+
+# largest number of values bound in one IN clause. Older SQLite builds
+# refuse statements with more than 999 parameters
+in_clause_size = 500
+
+def chunks(ls, size=in_clause_size):
+    for i in xrange(0, len(ls), size):
+        yield ls[i:i+size]
+
+
+def existing_ids(connection, table, ids):
+    """
+    Returns the list of [ids] that are already primary keys of [table]
+    """
+    primary_key = table.primary_key.columns.values()[0]
+    existing = []
+    for chunk in chunks(ids):
+        existing.extend(r[0] for r in connection.execute(
+            table.select().with_only_columns([primary_key]).where(primary_key.in_(chunk))))
+    return existing
+
+
+def delete_existing(connection, table, owned_tables, owner_key, ids):
+    """
+    Deletes the rows of the documents in [ids] that are already in [table],
+    along with the rows in [owned_tables] that refer to them through the
+    column [owner_key]. Returns the number of existing documents. This keeps
+    the override behaviour of add_grant/add_application (a reparsed document
+    replaces the old one) at the cost of one primary key lookup per batch
+    """
+    existing = existing_ids(connection, table, ids)
+    if not existing:
+        return 0
+    primary_key = table.primary_key.columns.values()[0]
+    for chunk in chunks(existing):
+        for owned in owned_tables:
+            connection.execute(owned.delete().where(owned.c[owner_key].in_(chunk)))
+        connection.execute(table.delete().where(primary_key.in_(chunk)))
+    return len(existing)
+
+
+def skip_existing(session, table, objs, key):
+    """
+    Returns the Patobj records in [objs] whose id, given by the function
+    [key], is not yet in [table]. Used when existing documents are not to be
+    overridden
+    """
+    objs = [obj for obj in objs if obj]
+    if not objs:
+        return objs
+    existing = set(existing_ids(session.connection(), table, [key(obj) for obj in objs]))
+    return [obj for obj in objs if key(obj) not in existing]
+
+
+def insert_rows(session, rows, is_mysql, replace=None):
+    """
+    Writes [rows] (an OrderedDict of table to list of row dictionaries, as
+    returned by grant_rows or application_rows) through [session] in a single
+    transaction, one executemany per table. [replace] is a tuple (table, owned_tables,
+    owner_key) passed to delete_existing for the documents in the batch.
+    Returns a dictionary of the number of rows sent for each table name
+    """
+    ignore_prefix = ("IGNORE",) if is_mysql else ("OR IGNORE",)
+    counts = {}
+    try:
+        connection = session.connection()
+        if is_mysql:
+            connection.execute("set foreign_key_checks = 0; set unique_checks = 0;")
+        start = time.time()
+        if replace:
+            table, owned_tables, owner_key = replace
+            primary_key = table.primary_key.columns.values()[0]
+            ids = [r[primary_key.name] for r in rows[table]]
+            if ids:
+                delete_existing(connection, table, owned_tables, owner_key, ids)
+            if metrics is not None:
+                metrics.add('db.replace', time.time() - start, len(ids))
+        for table, table_rows in rows.iteritems():
+            if table_rows:
+                start = time.time()
+                connection.execute(table.insert(prefixes=ignore_prefix), table_rows)
+                if metrics is not None:
+                    metrics.add('db.' + table.name, time.time() - start, len(table_rows))
+            counts[table.name] = len(table_rows)
+        start = time.time()
+        session.commit()
+        if metrics is not None:
+            metrics.add('db.commit', time.time() - start)
+    except Exception:
+        session.rollback()
+        # the sessions do not account for their transactions (see alchemy.fetch_session), so
+        # changes staged on loaded objects, such as manifest progress, outlive the rollback
+        session.expire_all()
+        raise
+    return counts
+
+
+def add_grants(session, objs, is_mysql, override=True):
+    """
+    Bulk equivalent of calling add_grant for each Patobj in [objs] followed by
+    a commit. If [override] is True, patents that are already in the database
+    are replaced, otherwise they are left as they are.
+    Returns a dictionary of the number of rows sent for each table name
+    """
+    if override:
+        replace = (schema.Patent.__table__, grant_patent_tables, 'patent_id')
+    else:
+        replace = None
+        objs = skip_existing(session, schema.Patent.__table__, objs, lambda obj: obj.pat["id"])
+    return insert_rows(session, grant_rows(objs), is_mysql, replace)
+
+
+def add_applications(session, objs, is_mysql, override=True):
+    """
+    Bulk equivalent of calling add_application for each Patobj in [objs]
+    followed by a commit. If [override] is True, applications that are already
+    in the database are replaced, otherwise they are left as they are.
+    Returns a dictionary of the number of rows sent for each table name
+    """
+    if override:
+        replace = (schema.App_Application.__table__, application_owned_tables, 'application_id')
+    else:
+        replace = None
+        objs = skip_existing(session, schema.App_Application.__table__, objs, lambda obj: obj.app["id"])
+    return insert_rows(session, application_rows(objs), is_mysql, replace)
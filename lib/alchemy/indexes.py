@@ -0,0 +1,84 @@
+"""
+Defers the maintenance of secondary indexes during a bulk load. Keeping an
+index up to date costs a B-tree insertion for every row written; dropping it
+before the load and creating it again afterwards builds it in one sorted
+pass over the loaded table instead, on SQLite and MySQL alike.
+
+Only indexes that are not unique are deferred: the INSERT IGNORE (MySQL) /
+INSERT OR IGNORE (SQLite) of the bulk loader relies on the unique ones to
+skip rows that are already there. Every deferred index is recorded in the
+pending index table (schema.PendingIndex, schema.App_PendingIndex) before it
+is dropped, and the record is deleted once the index has been created again,
+so a load that is interrupted leaves its missing indexes behind in the
+database for rebuild to create.
+"""
+
+import datetime
+
+from sqlalchemy.engine.reflection import Inspector
+
+
+def deferrable(tables):
+    """
+    Returns the indexes of [tables] that may be deferred: those that are not
+    unique, in a stable order
+    """
+    return [index for table in tables
+            for index in sorted(table.indexes, key=lambda index: index.name)
+            if not index.unique]
+
+
+def existing_indexes(connection, tables):
+    """
+    Returns the set of (table name, index name) of the indexes of [tables]
+    that are in the database
+    """
+    inspector = Inspector.from_engine(connection)
+    return set((table.name, index['name']) for table in tables
+               for index in inspector.get_indexes(table.name))
+
+
+def defer(session, pending_table, tables):
+    """
+    Drops the deferrable indexes of [tables], recording each in
+    [pending_table] first, and returns the names of all the indexes that are
+    pending afterwards (including those of an earlier, interrupted load)
+    """
+    pending = set((row.table_name, row.name) for row in session.query(pending_table))
+    existing = existing_indexes(session.connection(), tables)
+    for index in deferrable(tables):
+        key = (index.table.name, index.name)
+        if key in pending or key not in existing:
+            continue
+        session.add(pending_table(table_name=unicode(key[0]), name=unicode(key[1]),
+                                  deferred=datetime.datetime.now()))
+        session.commit()
+        index.drop(bind=session.connection())
+        session.commit()
+        pending.add(key)
+    return sorted(name for table_name, name in pending)
+
+
+def rebuild(session, pending_table, tables):
+    """
+    Creates the indexes of [tables] recorded in [pending_table] again, one at
+    a time, deleting each record once its index exists. Returns the names of
+    the indexes that were created
+    """
+    indexes = dict(((index.table.name, index.name), index) for table in tables
+                   for index in table.indexes)
+    rows = session.query(pending_table).all()
+    if not rows:
+        return []
+    existing = existing_indexes(session.connection(), tables)
+    created = []
+    for row in rows:
+        key = (row.table_name, row.name)
+        index = indexes.get(key)
+        # an index recorded just before an interruption may not have been dropped
+        if index is not None and key not in existing:
+            index.create(bind=session.connection())
+            created.append(row.name)
+        session.delete(row)
+        session.commit()
+    return created
@@ -0,0 +1,135 @@
+"""
+Bookkeeping for the XML source files loaded by parse.py. Every file gets a row
+in the manifest table (schema.Manifest for grants, schema.App_Manifest for
+applications) recording its size, mtime, content hash, the handler that parses
+it, and how far it has been loaded. A file that is unchanged and complete is
+skipped; a partially loaded file is resumed from the last committed document.
+
+Progress is staged on the same session that the documents are written with,
+so it is committed in the same transaction as the documents it describes.
+"""
+
+import os
+import datetime
+import hashlib
+
+
+def file_hash(filename, blocksize=2**20):
+    """
+    Returns the hex SHA-1 digest of the contents of [filename]
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def path_hash(path):
+    """
+    Returns the hex SHA-1 digest of [path], the key of its manifest entry
+    """
+    return unicode(hashlib.sha1(path.encode('utf-8')).hexdigest())
+
+
+def handler_name(handler):
+    """
+    Returns the version recorded for the handler module [handler], e.g.
+    'grant_handler_v42'
+    """
+    return handler.__name__.split('.')[-1]
+
+
+def get_entry(session, table, filename, handler):
+    """
+    Returns the [table] manifest entry for [filename], which is parsed with the
+    handler module [handler]. An entry whose file or handler has changed since
+    it was recorded is reset to an empty, incomplete entry, as is a new one.
+    Files are compared by size and mtime first; the contents are only hashed
+    when the mtime differs (e.g. the file was copied again) or the entry is new
+    """
+    path = unicode(os.path.abspath(filename))
+    stat = os.stat(filename)
+    mtime = int(stat.st_mtime)
+    version = handler_name(handler)
+    key = path_hash(path)
+    entry = session.query(table).get(key)
+    if entry and entry.handler == version and entry.size == stat.st_size:
+        if entry.mtime == mtime:
+            # ends the transaction of the lookup, whose connection would otherwise stay with
+            # this thread while the commits of parse.py run on another (see lib/pipeline.py)
+            session.commit()
+            return entry
+        digest = file_hash(filename)
+        if entry.hash == digest:
+            entry.mtime = mtime
+            session.commit()
+            return entry
+    else:
+        digest = file_hash(filename)
+    if not entry:
+        entry = table(path_hash=key, path=path)
+        session.add(entry)
+    entry.size = stat.st_size
+    entry.mtime = mtime
+    entry.hash = unicode(digest)
+    entry.handler = unicode(version)
+    entry.documents = 0
+    entry.offset = 0
+    entry.complete = False
+    entry.updated = datetime.datetime.now()
+    session.commit()
+    return entry
+
+
+class FileProgress(object):
+    """
+    Tracks how far the documents of one file have been added to the session.
+    Documents are reported by their (offset, length) span and may be reported
+    out of order (see parse.parse_files_parallel); the file is loaded up to
+    the end of the longest run of reported spans starting at the entry's
+    offset. [end] is the offset just past the last document of the file.
+    [entry] may be None, in which case nothing is recorded
+    """
+
+    def __init__(self, entry, end):
+        self.entry = entry
+        self.end = end
+        self.frontier = entry.offset if entry else 0
+        self.documents = entry.documents if entry else 0
+        self.done = {}
+
+    def add(self, offset, length):
+        self.done[offset] = offset + length
+        while self.frontier in self.done:
+            self.frontier = self.done.pop(self.frontier)
+            self.documents += 1
+
+    @property
+    def complete(self):
+        return self.frontier >= self.end
+
+    def stage(self):
+        """
+        Copies the progress onto the manifest entry. It is written with the
+        next commit of the session the entry belongs to
+        """
+        self.checkpoint()()
+
+    def checkpoint(self):
+        """
+        Returns a function that stages the progress as it is now, for a
+        commit that runs later (e.g. on another thread, see lib/pipeline.py)
+        while more documents are added
+        """
+        entry, frontier, documents, complete = self.entry, self.frontier, self.documents, self.complete
+        def stage():
+            if not entry:
+                return
+            if entry.offset == frontier and entry.complete == complete:
+                return
+            entry.offset = frontier
+            entry.documents = documents
+            entry.complete = complete
+            entry.updated = datetime.datetime.now()
+        return stage
@@ -1,10 +1,13 @@
+import itertools
 from collections import defaultdict
 from collections import Counter
 from sqlalchemy.sql.expression import bindparam
 from sqlalchemy import create_engine, MetaData, Table, inspect, VARCHAR, Column
 from sqlalchemy.orm import sessionmaker
 
+import sqlite3
 from datetime import datetime
+from schema import temporary_update
 
 def match(objects, session, default={}, keepexisting=False, commit=True):
     """
@@ -160,6 +163,18 @@ def unmatch(objects, session):
             session.delete(obj)
             session.commit()
 
+def chunks(statements, size):
+    """
+    Yields lists of at most `size` items of the iterable `statements`, so that only one chunk
+    of a generator is held in memory at a time
+    """
+    statements = iter(statements)
+    while True:
+        chunk = list(itertools.islice(statements, size))
+        if not chunk:
+            return
+        yield chunk
+
 def commit_inserts(session, insert_statements, table, is_mysql, commit_frequency = 1000):
     """
     Executes bulk inserts for a given table. This is typically much faster than going through
@@ -167,9 +182,14 @@ def commit_inserts(session, insert_statements, table, is_mysql, commit_frequency
     complaining that certain columns are null, if you did not specify a value for every single
     column for a table.
 
+    `insert_statements` may be any iterable, including a generator, which is consumed and written
+    one chunk at a time. Besides dictionaries, its rows may be tuples holding the values of the
+    columns of the table in order (e.g. (patent_id, assignee_id) for patentassignee). A chunk of
+    tuples is bound by position, without making a dictionary of every row.
+
     Args:
     session -- alchemy session object
-    insert_statements -- list of dictionaries where each dictionary contains key-value pairs of the object
+    insert_statements -- iterable of dictionaries where each dictionary contains key-value pairs of the object, or of tuples
     table -- SQLAlchemy table object. If you have a table reference, you can use TableName.__table__
     is_mysql -- adjusts syntax based on if we are committing to MySQL or SQLite. You can use alchemy.is_mysql() to get this
     commit_frequency -- tune this for speed. Runs "session.commit" every `commit_frequency` items
@@ -180,18 +200,21 @@ def commit_inserts(session, insert_statements, table, is_mysql, commit_frequency
         session.commit()
     else:
         ignore_prefix = ("OR IGNORE",)
-    numgroups = len(insert_statements) / commit_frequency
-    for ng in range(numgroups):
-        if numgroups == 0:
-            break
-        chunk = insert_statements[ng*commit_frequency:(ng+1)*commit_frequency]
-        session.connection().execute(table.insert(prefixes=ignore_prefix), chunk)
-        print "committing chunk",ng+1,"of",numgroups,"with length",len(chunk),"at",datetime.now()
-        session.commit()
-    last_chunk = insert_statements[numgroups*commit_frequency:]
-    if last_chunk:
-        print "committing last",len(last_chunk),"records at",datetime.now()
-        session.connection().execute(table.insert(prefixes=ignore_prefix), last_chunk)
+    keys = table.c.keys()
+    insert = table.insert(prefixes=ignore_prefix)
+    positional = None
+    for ng, chunk in enumerate(chunks(insert_statements, commit_frequency)):
+        connection = session.connection()
+        if isinstance(chunk[0], dict) or not connection.dialect.positional:
+            chunk = [row if isinstance(row, dict) else dict(zip(keys, row)) for row in chunk]
+            connection.execute(insert, chunk)
+        else:
+            if positional is None:
+                # e.g. INSERT OR IGNORE INTO patent_assignee (patent_id, assignee_id) VALUES (?, ?)
+                positional = str(insert.compile(dialect=connection.dialect, column_keys=keys))
+            chunk = [tuple(row.get(key) for key in keys) if isinstance(row, dict) else row for row in chunk]
+            connection.execute(positional, chunk)
+        print "committing chunk",ng+1,"with length",len(chunk),"at",datetime.now()
         session.commit()
 
 def commit_updates(session, update_key, update_statements, table, commit_frequency = 1000):
@@ -201,32 +224,125 @@ def commit_updates(session, update_key, update_statements, table, commit_frequen
     way. You can only update one column at a time. The dictionaries in the list `update_statements`
     must have two keys: `pk`, which is the primary_key for the record to be updated, and `update`
     which is the new value for the column you want to change. The column you want to change
-    is specified as a string by the argument `update_key`.
+    is specified as a string by the argument `update_key`. An update may also be given as a
+    (pk, update) tuple, and `update_statements` may be any iterable, including a generator,
+    which is consumed one chunk at a time.
 
     This method will work regardless if you run it over MySQL or SQLite, but with MySQL, it is
     usually faster to use the celery_commit_updates method (see lib/tasks.py), because it uses
-    a table join to do the updates instead of executing individual statements.
+    a table join to do the updates instead of executing individual statements. On SQLite, each
+    chunk is inserted into a temporary table and applied with a single statement (see
+    commit_sqlite_updates).
 
     Args:
     session -- alchemy session object
     update_key -- the name of the column we want to update
-    update_statements -- list of dictionaries of updates. See above description
+    update_statements -- iterable of dictionaries or tuples of updates. See above description
     table -- SQLAlchemy table object. If you have a table reference, you can use TableName.__table
     commit_frequency -- tune this for speed. Runs "session.commit" every `commit_frequency` items
     """
+    if session.connection().dialect.name == 'sqlite':
+        commit_sqlite_updates(session, update_key, update_statements, table, commit_frequency)
+        return
     primary_key = table.primary_key.columns.values()[0]
     update_key = table.columns[update_key]
     u = table.update().where(primary_key==bindparam('pk')).values({update_key: bindparam('update')})
-    numgroups = len(update_statements) / commit_frequency
-    for ng in range(numgroups):
-        if numgroups == 0:
-            break
-        chunk = update_statements[ng*commit_frequency:(ng+1)*commit_frequency]
+    for ng, chunk in enumerate(chunks(update_statements, commit_frequency)):
+        chunk = [{'pk': pk, 'update': update} for pk, update in map(update_pair, chunk)]
         session.connection().execute(u, *chunk)
-        print "committing chunk",ng+1,"of",numgroups,"with length",len(chunk),"at",datetime.now()
+        print "committing chunk",ng+1,"with length",len(chunk),"at",datetime.now()
         session.commit()
-    last_chunk = update_statements[numgroups*commit_frequency:]
-    if last_chunk:
-        print "committing last",len(last_chunk),"records at",datetime.now()
-        session.connection().execute(u, *last_chunk)
+
+def update_pair(update):
+    """
+    Returns the (pk, update) tuple of an update statement of commit_updates, which may be a
+    dictionary or a tuple
+    """
+    if isinstance(update, dict):
+        return update['pk'], update['update']
+    return tuple(update)
+
+def commit_sqlite_updates(session, update_key, update_statements, table, commit_frequency = 1000):
+    """
+    Executes the bulk updates of commit_updates on SQLite as set-based statements. Each chunk of
+    `commit_frequency` updates is inserted into a temporary table keyed by the primary key, and
+    the column is then updated from it with one UPDATE ... FROM (SQLite 3.33 and later) or a
+    correlated UPDATE, instead of one UPDATE per record. As with the individual statements, the
+    last update of a primary key that is given several times is the one that is kept. The
+    temporary table is dropped after every chunk, also when the update fails.
+
+    Args: see commit_updates
+    """
+    primary_key = table.primary_key.columns.values()[0]
+    update_key = table.columns[update_key]
+    dialect = session.connection().dialect
+    temp = 'temp_update_{0}'.format(table.name)
+    create = 'CREATE TEMPORARY TABLE IF NOT EXISTS {0} (pk {1} PRIMARY KEY, "update" {2})'.format(
+        temp, primary_key.type.compile(dialect=dialect), update_key.type.compile(dialect=dialect))
+    insert = 'INSERT OR REPLACE INTO {0} (pk, "update") VALUES (?, ?)'.format(temp)
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        update = 'UPDATE {0} SET {1} = {2}."update" FROM {2} WHERE {2}.pk = {0}.{3}'
+    else:
+        update = 'UPDATE {0} SET {1} = (SELECT "update" FROM {2} WHERE {2}.pk = {0}.{3}) WHERE {3} IN (SELECT pk FROM {2})'
+    update = update.format(table.name, update_key.name, temp, primary_key.name)
+    for ng, chunk in enumerate(chunks(update_statements, commit_frequency)):
+        # temporary tables belong to the connection, which a commit may close
+        connection = session.connection()
+        connection.execute(create)
+        # the DB-API cursor skips compiling the insert for every record
+        cursor = connection.connection.cursor()
+        try:
+            cursor.executemany(insert, map(update_pair, chunk))
+            connection.execute(update)
+        finally:
+            cursor.close()
+            connection.execute('DROP TABLE {0}'.format(temp))
+        print "committing chunk",ng+1,"with length",len(chunk),"at",datetime.now()
         session.commit()
+
+def commit_mysql_updates(session, update_key, update_statements, table, commit_frequency = 1000):
+    """
+    Executes the bulk updates of commit_updates on MySQL with a join: the updates are inserted
+    into the temporary_update table, the column is updated from it with one UPDATE ... JOIN,
+    and the table is emptied again.
+
+    Args: see commit_updates
+    """
+    commit_inserts(session, update_statements, temporary_update, True, 10000)
+    # now update using the join
+    primary_key = table.primary_key.columns.values()[0]
+    update_key = table.columns[update_key]
+    session.execute("UPDATE {0} join temporary_update ON temporary_update.pk = {1} SET {2} = temporary_update.update;".format(table.name, primary_key.name, update_key.name ))
+    session.commit()
+    session.execute("truncate temporary_update;")
+    session.commit()
+
+def commit_statements(session, inserts, updates, is_mysql, commit_frequency = 1000, final = False):
+    """
+    Writes the rows a disambiguation collects as it matches records (see
+    lib/assignee_disambiguation.py, lib/lawyer_disambiguation.py and lib/geoalchemy.py) once
+    there are `commit_frequency` updates, or whatever is left if `final`, and empties the lists
+    they are in, so that they never hold more than a chunk of the table being matched. The
+    inserts are written before the updates that refer to them.
+
+    Args:
+    session -- alchemy session object
+    inserts -- list of (insert_statements, table) pairs, see commit_inserts
+    updates -- (update_key, update_statements, table), see commit_updates. On MySQL they are
+        applied with commit_mysql_updates
+    is_mysql -- see commit_inserts
+    commit_frequency -- the number of updates to collect before writing, also passed on as the
+        size of a chunk
+    final -- writes the rows even if there are fewer updates
+    """
+    update_key, update_statements, table = updates
+    if len(update_statements) < commit_frequency and not final:
+        return
+    for insert_statements, insert_table in inserts:
+        commit_inserts(session, insert_statements, insert_table, is_mysql, commit_frequency)
+        del insert_statements[:]
+    if is_mysql:
+        commit_mysql_updates(session, update_key, update_statements, table, commit_frequency)
+    else:
+        commit_updates(session, update_key, update_statements, table, commit_frequency)
+    del update_statements[:]
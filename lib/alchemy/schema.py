@@ -1,5 +1,5 @@
 from sqlalchemy import func
-from sqlalchemy import Column, Date, Integer, Float, Boolean, VARCHAR
+from sqlalchemy import Column, Date, DateTime, Integer, BigInteger, Float, Boolean, VARCHAR
 from sqlalchemy import ForeignKey, Index
 from sqlalchemy import Unicode, UnicodeText
 from sqlalchemy.orm import deferred, relationship
@@ -987,6 +987,49 @@ class CitedBy(GrantBase):
     citation_id = Column(Unicode(36))
     year = Column(Integer)
 
+# PARSING --------------------------
+
+class Manifest(GrantBase):
+    """
+    One row per XML source file loaded by parse.py (see lib/alchemy/manifest.py).
+    [offset] is the byte offset just past the last document committed from the
+    file and [documents] the number of documents up to it, so a partially
+    loaded file is resumed from there. A complete file is skipped as long as
+    its contents and the handler that parses it stay the same. Rows are keyed
+    on [path_hash], the SHA-1 of [path], as an index on the path itself would
+    be longer than MySQL allows
+    """
+    __tablename__ = "manifest"
+    path_hash = Column(Unicode(40), primary_key=True)
+    path = Column(Unicode(256))
+    size = Column(BigInteger)
+    mtime = Column(Integer)
+    hash = Column(Unicode(40))
+    handler = Column(Unicode(64))
+    documents = Column(Integer)
+    offset = Column(BigInteger)
+    complete = Column(Boolean)
+    updated = Column(DateTime)
+
+    def __repr__(self):
+        return "<Manifest('{0}, {1}, {2}')>".format(self.path, self.documents, self.complete)
+
+
+class PendingIndex(GrantBase):
+    """
+    One row per index of [table_name] that a bulk load has dropped and not
+    yet created again (see lib/alchemy/indexes.py). Rows are written before
+    the index is dropped and deleted after it is created, so the indexes of
+    an interrupted load are still known to be missing
+    """
+    __tablename__ = "pending_index"
+    table_name = Column(Unicode(64), primary_key=True)
+    name = Column(Unicode(64), primary_key=True)
+    deferred = Column(DateTime)
+
+    def __repr__(self):
+        return "<PendingIndex('{0}, {1}')>".format(self.table_name, self.name)
+
 ## Application Tables
 
 # ASSOCIATION ----------------------
@@ -1672,3 +1715,39 @@ class App_InventorRank(ApplicationBase):
     num_applications = Column(Integer)
     year = Column(Integer)
     rank = Column(Integer)
+
+# PARSING --------------------------
+
+class App_Manifest(ApplicationBase):
+    """
+    One row per XML source file loaded into the application database, as
+    Manifest is for grants
+    """
+    __tablename__ = "manifest"
+    path_hash = Column(Unicode(40), primary_key=True)
+    path = Column(Unicode(256))
+    size = Column(BigInteger)
+    mtime = Column(Integer)
+    hash = Column(Unicode(40))
+    handler = Column(Unicode(64))
+    documents = Column(Integer)
+    offset = Column(BigInteger)
+    complete = Column(Boolean)
+    updated = Column(DateTime)
+
+    def __repr__(self):
+        return "<Manifest('{0}, {1}, {2}')>".format(self.path, self.documents, self.complete)
+
+
+class App_PendingIndex(ApplicationBase):
+    """
+    One row per index of the application database dropped by a bulk load and
+    not yet created again, as PendingIndex is for grants
+    """
+    __tablename__ = "pending_index"
+    table_name = Column(Unicode(64), primary_key=True)
+    name = Column(Unicode(64), primary_key=True)
+    deferred = Column(DateTime)
+
+    def __repr__(self):
+        return "<PendingIndex('{0}, {1}')>".format(self.table_name, self.name)
@@ -0,0 +1,121 @@
+"""
+Writes parsed patent documents as tab-separated files, one per table, in the
+format of `mysqldump -T` that starcluster/load.sql loads with LOAD DATA
+INFILE: fields are separated by tabs and rows by newlines, NULL is written
+as \N and backslashes, tabs, newlines, carriage returns, NUL characters and
+double quotes (load.sql reads fields ENCLOSED BY '"') are escaped with a
+backslash. Columns are in the order of the schema, which is the order of
+the tables created from it. Rows are built as in the bulk loader (see
+lib/alchemy/bulk.py), without going through a database.
+"""
+
+import os
+import re
+import datetime
+
+from sqlalchemy import Boolean, Date
+
+import bulk
+
+null = '\\N'
+special = re.compile(r'[\\\t\n\r\0"]')
+escapes = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0', '"': '\\"'}
+
+
+def escape(string):
+    """
+    Escapes the characters of [string] that LOAD DATA INFILE would read as
+    field or row separators, escapes or enclosures
+    """
+    if not special.search(string):
+        return string
+    return special.sub(lambda match: escapes[match.group()], string)
+
+
+def column_formatter(column):
+    """
+    Returns a function that formats a value of [column] as a field
+    """
+    if isinstance(column.type, Boolean):
+        return lambda value: null if value is None else ('1' if value else '0')
+    if isinstance(column.type, Date):
+        date_format = '%Y-%m-%d'
+    else:
+        date_format = '%Y-%m-%d %H:%M:%S'
+    def format_value(value):
+        if value is None:
+            return null
+        if isinstance(value, unicode):
+            return escape(value.encode('utf-8'))
+        if isinstance(value, str):
+            return escape(value)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.strftime(date_format)
+        return escape(str(value))
+    return format_value
+
+
+class TSVWriter(object):
+    """
+    Writes the rows of [doctype] Patobj records to <table>.txt files in
+    [directory]. The files a writer's tables had from an earlier run are
+    removed when it is made, so a run that is repeated does not load its rows
+    twice. Files are opened on first use and appended to until close(), and
+    opened again if rows are added after it. Rawlocation, mainclass and
+    subclass rows, which many documents share, are only written once per
+    writer
+    """
+
+    def __init__(self, directory, doctype='grant'):
+        self.directory = directory
+        if doctype == 'grant':
+            self.rows = bulk.grant_rows
+            self.tables = bulk.grant_tables
+        else:
+            self.rows = bulk.application_rows
+            self.tables = bulk.application_tables
+        self.columns = dict((table, table.c.keys()) for table in self.tables)
+        self.formatters = dict((table, [column_formatter(column) for column in table.c])
+                               for table in self.tables)
+        self.shared = dict((table, set()) for table in self.tables
+                           if table.name in ('rawlocation', 'mainclass', 'subclass'))
+        self.files = {}
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for table in self.tables:
+            if os.path.exists(self.path(table)):
+                os.remove(self.path(table))
+
+    def path(self, table):
+        return os.path.join(self.directory, table.name + '.txt')
+
+    def add_all(self, objs):
+        """
+        Appends the rows of the Patobj records in [objs] to the table files.
+        Returns a dictionary of the number of rows written for each table name
+        """
+        counts = {}
+        for table, rows in self.rows(objs).iteritems():
+            if table in self.shared:
+                seen = self.shared[table]
+                rows = [row for row in rows if row['id'] not in seen]
+                seen.update(row['id'] for row in rows)
+            counts[table.name] = len(rows)
+            if not rows:
+                continue
+            if table not in self.files:
+                self.files[table] = open(self.path(table), 'ab')
+            columns = zip(self.columns[table], self.formatters[table])
+            self.files[table].writelines(
+                '\t'.join([format_value(row[column]) for column, format_value in columns]) + '\n'
+                for row in rows)
+        return counts
+
+    def flush(self):
+        for f in self.files.itervalues():
+            f.flush()
+
+    def close(self):
+        for f in self.files.itervalues():
+            f.close()
+        self.files = {}
@@ -20,7 +20,8 @@ class ArgHandler(object):
         self.parser.add_argument('--xmlregex','-x', type=str,
                 nargs='?',
                 help='regex used to match xml files in the PATENTROOT directory.\
-                     Defaults to ipg\d{6}.xml')
+                     Defaults to ipg\d{6}.xml. Zip archives holding the xml file\
+                     (e.g. ipg\d{6}.zip) are read without extracting them')
         self.parser.add_argument('--verbosity', '-v', type = int,
                 nargs='?', default=0,
                 help='Set the level of verbosity for the computation. The higher the \
@@ -35,6 +36,26 @@ class ArgHandler(object):
                 default='grant',
                 help='Set the type of patent document to be parsed: grant (default) \
                 or application')
+        self.parser.add_argument('--workers', '-w', type=int, nargs='?',
+                default=1,
+                help='Number of processes used to parse the XML documents. Defaults \
+                to 1; with more than 1, a single process still does all database writes')
+        self.parser.add_argument('--store', '-s', type=str, nargs='?',
+                default=None,
+                help='Directory to also write the parsed records to, one file per XML file \
+                (see lib/store.py), so the database can be loaded again without parsing')
+        self.parser.add_argument('--from-store', action='store_true',
+                help='Load the database from the records in the --store directory \
+                instead of parsing the XML files')
+        self.parser.add_argument('--tsv', type=str, nargs='?',
+                default=None,
+                help='Directory to write the parsed records to as tab-separated files, \
+                one per table (see starcluster/load.sql), instead of the database. \
+                Table files already there are replaced')
+        self.parser.add_argument('--metrics', type=str, nargs='?',
+                default=None,
+                help='File to append the time spent in every stage of the parse to, \
+                as lines of JSON (see lib/metrics.py)')
 
         # parse arguments and assign values
         args = self.parser.parse_args(self.arglist)
@@ -42,6 +63,13 @@ class ArgHandler(object):
         self.patentroot = args.patentroot
         self.output_directory = args.output_directory
         self.document_type = args.document_type
+        self.workers = args.workers
+        self.store_directory = args.store
+        self.from_store = args.from_store
+        self.tsv_directory = args.tsv
+        self.metrics_file = args.metrics
+        if self.from_store and not self.store_directory:
+            self.parser.error('--from-store needs the --store directory')
         if self.xmlregex == None: # set defaults for xmlregex here depending on doctype
             if self.document_type == 'grant':
                 self.xmlregex = r"ipg\d{6}.xml"
@@ -70,6 +98,21 @@ class ArgHandler(object):
     def get_document_type(self):
         return self.document_type
 
+    def get_workers(self):
+        return self.workers
+
+    def get_store_directory(self):
+        return self.store_directory
+
+    def get_from_store(self):
+        return self.from_store
+
+    def get_tsv_directory(self):
+        return self.tsv_directory
+
+    def get_metrics_file(self):
+        return self.metrics_file
+
     def get_help(self):
         self.parser.print_help()
         sys.exit(1)
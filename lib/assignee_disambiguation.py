@@ -13,7 +13,7 @@ from collections import Counter
 from Levenshtein import jaro_winkler
 from alchemy import get_config, match
 from alchemy.schema import *
-from alchemy.match import commit_inserts, commit_updates
+from alchemy.match import commit_inserts, commit_updates, commit_statements
 from handlers.xml_util import normalize_utf8
 from datetime import datetime
 from sqlalchemy.sql import or_
@@ -102,6 +102,9 @@ def create_jw_blocks(list_of_assignees):
 assignee_insert_statements = []
 patentassignee_insert_statements = []
 update_statements = []
+# the statements are written every commit_frequency updates, as they are matched
+commit_frequency = 20000
+
 def create_assignee_table(session):
     """
     Given a list of assignees and the redis key-value disambiguation,
@@ -111,6 +114,11 @@ def create_assignee_table(session):
     if alchemy.is_mysql():
         session.execute('set foreign_key_checks = 0;')
         session.commit()
+    # the statements assignee_match collects are written every commit_frequency updates
+    writer = alchemy.session_generator()
+    inserts = [(assignee_insert_statements, Assignee.__table__),
+               (patentassignee_insert_statements, patentassignee)]
+    updates = ('assignee_id', update_statements, RawAssignee.__table__)
     i = 0
     for assignee in blocks.iterkeys():
         ra_ids = (id_map[ra] for ra in blocks[assignee])
@@ -122,9 +130,8 @@ def create_assignee_table(session):
               assignee_match(rawassignees, session, commit=True)
           else:
               assignee_match(rawassignees, session, commit=False)
-    celery_commit_inserts(assignee_insert_statements, Assignee.__table__, alchemy.is_mysql(), 20000)
-    celery_commit_inserts(patentassignee_insert_statements, patentassignee, alchemy.is_mysql(), 20000)
-    celery_commit_updates('assignee_id', update_statements, RawAssignee.__table__, alchemy.is_mysql(), 20000)
+          commit_statements(writer, inserts, updates, alchemy.is_mysql(), commit_frequency)
+    commit_statements(writer, inserts, updates, alchemy.is_mysql(), commit_frequency, final=True)
     session.commit()
     print i, datetime.now()
 
@@ -182,8 +189,8 @@ def assignee_match(objects, session, commit=False):
     assignee_insert_statements.append(param)
     tmpids = map(lambda x: x.uuid, objects)
     patents = map(lambda x: x.patent_id, objects)
-    patentassignee_insert_statements.extend([{'patent_id': x, 'assignee_id': param['id']} for x in patents])
-    update_statements.extend([{'pk':x,'update':param['id']} for x in tmpids])
+    patentassignee_insert_statements.extend((x, param['id']) for x in patents)
+    update_statements.extend((x, param['id']) for x in tmpids)
 
 def examine():
     assignees = s.query(Assignee).all()
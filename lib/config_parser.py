@@ -1,4 +1,5 @@
 import importlib
+from bisect import bisect_right
 from ConfigParser import ConfigParser
 
 defaults = {'parse': 'defaultparse',
@@ -8,7 +9,10 @@ defaults = {'parse': 'defaultparse',
             'grantregex': 'ipg\d{6}.xml',
             'applicationregex': 'ipa\d{6}.xml',
             'years': None,
-            'downloaddir' : None}
+            'downloaddir' : None,
+            'downloadworkers': '4',
+            'extract': 'True',
+            'workers': '1'}
 
 def extract_process_options(handler, config_section):
     """
@@ -35,6 +39,9 @@ def extract_parse_options(handler, config_section):
     options['applicationregex'] = handler.get(config_section, 'applicationregex')
     options['years'] = handler.get(config_section,'years')
     options['downloaddir'] = handler.get(config_section,'downloaddir')
+    options['downloadworkers'] = int(handler.get(config_section,'downloadworkers'))
+    options['extract'] = handler.get(config_section,'extract') == 'True'
+    options['workers'] = int(handler.get(config_section,'workers'))
     if options['years'] and options['downloaddir']:
         options['datadir'] = options['downloaddir']
     return options
@@ -90,9 +97,78 @@ def get_xml_handlers(configfile, document_type='grant'):
                    else 'application-xml-handlers'
     for yearrange, handler in handler.items(config_item):
         for year in get_dates(yearrange):
-            try:
-                xmlhandlers[year] = importlib.import_module(handler)
-            except:
-                importlib.sys.path.append('..')
-                xmlhandlers[year] = importlib.import_module(handler)
+            xmlhandlers[year] = _import_handler(handler)
     return xmlhandlers
+
+
+class HandlerRegistry(object):
+    """
+    Lookup table of which XML handler module parses documents from a given
+    date. Handlers are registered for a range of dates (YYYYMMDD integers, see
+    get_dates) and are found with a binary search over the sorted range starts.
+    When ranges overlap, the range with the latest start wins, so a new handler
+    version can be registered from its first date onwards without editing the
+    ranges that are already there.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ranges = []
+        self.default = None
+
+    def register(self, start, end, handler):
+        """
+        Registers [handler] (a module, or the dotted name of one) for documents
+        dated from [start] to [end] inclusive. [end] may be float('inf').
+        If [start] is 'default', [handler] is used for any date not covered
+        """
+        if isinstance(handler, basestring):
+            handler = _import_handler(handler)
+        if start == 'default':
+            self.default = handler
+            return
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ranges.insert(i, (start, end, handler))
+
+    def lookup(self, date):
+        """
+        Returns the handler module registered for [date], or the default
+        handler if no range covers it
+        """
+        if date != 'default':
+            i = bisect_right(self.starts, date)
+            while i > 0:
+                i -= 1
+                start, end, handler = self.ranges[i]
+                if date <= end:
+                    return handler
+        return self.default
+
+
+def _import_handler(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        importlib.sys.path.append('..')
+        return importlib.import_module(name)
+
+
+handler_registries = {}
+
+def get_handler_registry(configfile, document_type='grant'):
+    """
+    Returns the HandlerRegistry for [document_type] built from the xml-handlers
+    section of [configfile]. The configuration file is only read the first time;
+    later calls return the same registry
+    """
+    key = (configfile, document_type)
+    if key not in handler_registries:
+        registry = HandlerRegistry()
+        for year, handler in get_xml_handlers(configfile, document_type).iteritems():
+            if year == 'default':
+                registry.register('default', None, handler)
+            else:
+                registry.register(year[0], year[1], handler)
+        handler_registries[key] = registry
+    return handler_registries[key]
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""
+Downloads the weekly USPTO bulk archives (zip files holding one XML file)
+and extracts their XML files. Archives are downloaded by a pool of threads,
+streamed to disk rather than held in memory, and written under a .part name
+until they are complete, so an interrupted download is resumed with a Range
+request the next time instead of starting over. A downloaded archive is
+checked against the length the server reported, against an md5 checksum if
+one is known, and against the CRCs of its members before it is extracted.
+"""
+
+import os
+import shutil
+import hashlib
+import zipfile
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+chunk_size = 2**20
+# keeps the progress lines of the download threads apart
+output = threading.Lock()
+
+
+def report(*words):
+    with output:
+        print ' '.join(map(str, words))
+
+
+def archive_name(url):
+    return url.split('/')[-1]
+
+
+def xml_name(url):
+    """
+    Returns the name of the XML file in the archive at [url], e.g.
+    ipg130101.xml for .../ipg130101.zip
+    """
+    return archive_name(url).replace('zip', 'xml')
+
+
+def md5sum(filename, blocksize=chunk_size):
+    digest = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_length(url, response, session=requests, timeout=60):
+    """
+    Returns the length of the file at [url] given in the Content-Range
+    (bytes */<length>) of the 416 [response] to a Range request, or else
+    in the Content-Length of a HEAD request. None if neither gives it
+    """
+    content_range = response.headers.get('content-range', '')
+    if content_range.startswith('bytes */'):
+        return int(content_range[len('bytes */'):])
+    head = session.head(url, timeout=timeout, allow_redirects=True)
+    length = head.headers.get('content-length')
+    return int(length) if head.ok and length is not None else None
+
+
+def download(url, directory, md5=None, session=requests, timeout=60):
+    """
+    Downloads [url] into [directory] and returns the path of the file. If a
+    partial download (<name>.part) is there, only the rest is requested; if
+    the server has nothing past it, it is kept only if it is as long as the
+    file and is otherwise downloaded again. The file is verified against the
+    length reported by the server and, if [md5] is given, against that
+    checksum; IOError is raised if either differs
+    """
+    path = os.path.join(directory, archive_name(url))
+    partial = path + '.part'
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+    response = session.get(url, headers=headers, stream=True, timeout=timeout)
+    if response.status_code == 416 and offset:
+        response.close()
+        size = file_length(url, response, session, timeout)
+        if size != offset:
+            # a stale or oversized partial file, not the whole file
+            report('restarting', archive_name(url), 'with', offset, 'of', size, 'bytes')
+            os.remove(partial)
+            return download(url, directory, md5, session, timeout)
+    else:
+        response.raise_for_status()
+        if response.status_code != 206:
+            # the server ignored the Range header, start over
+            offset = 0
+        length = response.headers.get('content-length')
+        size = offset + int(length) if length is not None else None
+        with open(partial, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+    if size is not None and os.path.getsize(partial) != size:
+        raise IOError("{0}: got {1} of {2} bytes".format(url, os.path.getsize(partial), size))
+    if md5 and md5sum(partial) != md5:
+        os.remove(partial)
+        raise IOError("{0}: md5 checksum does not match".format(url))
+    os.rename(partial, path)
+    return path
+
+
+def extract(archive, directory):
+    """
+    Extracts the XML files in the zip file [archive] into [directory], one
+    block at a time, and returns their paths. Raises IOError if a member is
+    corrupt
+    """
+    paths = []
+    with zipfile.ZipFile(archive) as z:
+        bad = z.testzip()
+        if bad:
+            raise IOError("{0}: {1} is corrupt".format(archive, bad))
+        for member in z.namelist():
+            if not member.lower().endswith('.xml'):
+                continue
+            path = os.path.join(directory, os.path.basename(member))
+            with z.open(member) as source:
+                with open(path + '.part', 'wb') as target:
+                    shutil.copyfileobj(source, target, chunk_size)
+            os.rename(path + '.part', path)
+            paths.append(path)
+    return paths
+
+
+def fetch(url, directory, md5=None, keep_archive=False, extract_xml=True, session=requests):
+    """
+    Downloads and extracts the archive at [url] into [directory], unless its
+    XML file is already there. Returns the list of extracted paths (empty if
+    there was nothing to do). The archive is removed after extraction unless
+    [keep_archive] is True. If [extract_xml] is False, the archive is only
+    downloaded (parse.py reads archives directly) and its path is returned
+    """
+    name = xml_name(url) if extract_xml else archive_name(url)
+    if os.path.exists(os.path.join(directory, name)):
+        report('already have', name)
+        return []
+    report('downloading', url)
+    archive = download(url, directory, md5, session)
+    if not extract_xml:
+        return [archive]
+    report('unzipping', archive_name(url))
+    paths = extract(archive, directory)
+    if not keep_archive:
+        os.remove(archive)
+    return paths
+
+
+def download_files(urls, directory, workers=4, checksums={}, keep_archive=False,
+                   extract_xml=True):
+    """
+    Downloads and extracts the archives at [urls] into [directory] with
+    [workers] threads. [checksums] maps archive names to their md5 checksum,
+    for the archives whose checksum is known. See fetch for [keep_archive]
+    and [extract_xml]. Returns False if a file could
+    not be downloaded or extracted (it is resumed by the next run), True
+    otherwise
+    """
+    if not (directory and urls):
+        return False
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    print 'downloading to', directory
+    def fetch_url(url):
+        try:
+            fetch(url, directory, checksums.get(archive_name(url)), keep_archive, extract_xml)
+            return True
+        except Exception as e:
+            report('ERROR: downloading or unzipping', archive_name(url), e)
+            return False
+    pool = ThreadPool(max(1, min(workers, len(urls))))
+    try:
+        return all(pool.map(fetch_url, urls))
+    finally:
+        pool.close()
+        pool.join()
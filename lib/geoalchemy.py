@@ -13,7 +13,7 @@ from collections import defaultdict, Counter
 import pandas as pd
 
 import alchemy
-from alchemy.match import commit_inserts, commit_updates
+from alchemy.match import commit_inserts, commit_updates, commit_statements
 from tasks import celery_commit_inserts, celery_commit_updates
 
 #The config file alchemy uses to store information
@@ -216,6 +216,12 @@ def match_grouped_locations(identified_grouped_locations_enum, t, alchemy_sessio
     if alchemy.is_mysql():
         alchemy_session.execute("set foreign_key_checks = 0; truncate location;")
         alchemy_session.commit()
+    # emptied before matching, as the locations are written while they are matched
+    alchemy_session.execute('truncate location; truncate assignee_location; truncate inventor_location;')
+    # the statements geo_match collects are written every commit_freq updates
+    writer = alchemy.session_generator()
+    inserts = [(location_insert_statements, alchemy.schema.Location.__table__)]
+    updates = ('location_id', update_statements, alchemy.schema.RawLocation.__table__)
     for i, item in identified_grouped_locations_enum:
         #grouped_locations_list = a list of every grouped location with the same grouping_id
         # Note that a grouped_location is a dict, as described above
@@ -244,9 +250,8 @@ def match_grouped_locations(identified_grouped_locations_enum, t, alchemy_sessio
         #No need to run match() if no matching location was found.
         if(grouping_id!="nolocationfound"):
             run_geo_match(grouping_id, default, match_group, i, t, alchemy_session)
-    alchemy_session.execute('truncate location; truncate assignee_location; truncate inventor_location;')
-    celery_commit_inserts(location_insert_statements, alchemy.schema.Location.__table__, alchemy.is_mysql(), commit_freq)
-    celery_commit_updates('location_id', update_statements, alchemy.schema.RawLocation.__table__, alchemy.is_mysql(), commit_freq)
+            commit_statements(writer, inserts, updates, alchemy.is_mysql(), commit_freq)
+    commit_statements(writer, inserts, updates, alchemy.is_mysql(), commit_freq, final=True)
     alchemy_session.commit()
     session_generator = alchemy.session_generator()
     session = session_generator()
@@ -258,7 +263,7 @@ def match_grouped_locations(identified_grouped_locations_enum, t, alchemy_sessio
     assigneelocation = assigneelocation[assigneelocation[0].notnull()]
     assigneelocation = assigneelocation[assigneelocation[1].notnull()]
     assigneelocation.columns = ['location_id','assignee_id']
-    locationassignee_inserts = [row[1].to_dict() for row in assigneelocation.iterrows()]
+    locationassignee_inserts = (row[1].to_dict() for row in assigneelocation.iterrows())
     celery_commit_inserts(locationassignee_inserts, alchemy.schema.locationassignee, alchemy.is_mysql(), 20000)
 
     res = session.execute('select location.id, inventor.id from inventor \
@@ -269,7 +274,7 @@ def match_grouped_locations(identified_grouped_locations_enum, t, alchemy_sessio
     inventorlocation = inventorlocation[inventorlocation[0].notnull()]
     inventorlocation = inventorlocation[inventorlocation[1].notnull()]
     inventorlocation.columns = ['location_id','inventor_id']
-    locationinventor_inserts = [row[1].to_dict() for row in inventorlocation.iterrows()]
+    locationinventor_inserts = (row[1].to_dict() for row in inventorlocation.iterrows())
     celery_commit_inserts(locationinventor_inserts, alchemy.schema.locationinventor, alchemy.is_mysql(), 20000)
 
     session.commit()
@@ -310,6 +315,7 @@ def run_geo_match(key, default, match_group, counter, runtime, alchemy_session):
 
 location_insert_statements = []
 update_statements = []
+
 def geo_match(objects, session, default):
     freq = defaultdict(Counter)
     param = {}
@@ -345,14 +351,10 @@ def geo_match(objects, session, default):
     if '?' in param['city']:
       print param['city']
       #TODO: Fix param city ?????
-<<<<<<< HEAD
 
-=======
-    
->>>>>>> be654fe07f263efe81e81f7bf6dcad60966dc5ca
     location_insert_statements.append(param)
     tmpids = map(lambda x: x.id, objects)
-    update_statements.extend([{'pk':x,'update':param['id']} for x in tmpids])
+    update_statements.extend((x, param['id']) for x in tmpids)
 
 
 def clean_raw_locations_from_file(inputfilename, outputfilename):
@@ -5,37 +5,28 @@ Uses the extended ContentHandler from xml_driver to extract the needed fields
 from patent grant documents
 """
 
-from cStringIO import StringIO
 from datetime import datetime
 from unidecode import unidecode
-from handler import Patobj, PatentHandler
+from handler import ApplicationRecord, PatentHandler, cached_property
 import re
-import uuid
-import xml.sax
 import xml_util
 import xml_driver
 
 claim_num_regex = re.compile(r'^\d+\. *') # removes claim number from claim text
 
+# the parts of the document read by this handler; the rest (description,
+# drawings) is not built by the XMLHandler
+xml_paths = ['patent_application_publication/subdoc_bibliographic_information',
+             'patent_application_publication/subdoc_abstract',
+             'patent_application_publication/subdoc_claims']
+
 
 class Patent(PatentHandler):
 
-    def __init__(self, xml_string, is_string=False):
-        xh = xml_driver.XMLHandler()
-        parser = xml_driver.make_parser()
+    record = ApplicationRecord
 
-        parser.setContentHandler(xh)
-        parser.setFeature(xml_driver.handler.feature_external_ges, False)
-        l = xml.sax.xmlreader.Locator()
-        xh.setDocumentLocator(l)
-        if is_string:
-            parser.parse(StringIO(xml_string))
-        else:
-            parser.parse(xml_string)
-
-        self.attributes = ['app','application','assignee_list','inventor_list',
-                          'us_relation_list','us_classifications','ipcr_classifications',
-                          'claims']
+    def __init__(self, xml_string, is_string=False):
+        xh = xml_driver.parse(xml_string, xml_paths, is_string)
 
         self.xml = xh.root.patent_application_publication
 
@@ -113,7 +104,7 @@ class Patent(PatentHandler):
             print inst, datestring
             return None
 
-    @property
+    @cached_property
     def assignee_list(self):
         """
         Returns list of dictionaries:
@@ -155,11 +146,11 @@ class Patent(PatentHandler):
                 loc['id'] = u''
             if any(asg.values()) or any(loc.values()):
                 asg['sequence'] = i
-                asg['uuid'] = str(uuid.uuid1())
+                asg['uuid'] = self.row_id('assignee', i)
                 res.append([asg, loc])
         return res
 
-    @property
+    @cached_property
     def inventor_list(self):
         """
         Returns list of lists of applicant dictionary and location dictionary
@@ -192,7 +183,7 @@ class Patent(PatentHandler):
             loc['id'] = unidecode("|".join([loc['city'], loc['state'], loc['country']]).lower())
             if any(app.values()) or any(loc.values()):
                 app['sequence'] = i
-                app['uuid'] = str(uuid.uuid1())
+                app['uuid'] = self.row_id('inventor', i)
                 res.append([app, loc])
         return res
 
@@ -212,7 +203,7 @@ class Patent(PatentHandler):
             root.contents_of('doc_number')[0])
         return res
 
-    @property
+    @cached_property
     def us_relation_list(self):
         """
         returns list of dictionaries for us reldoc:
@@ -239,7 +230,7 @@ class Patent(PatentHandler):
                 data['date'] = self._fix_date(data['date'])
                 if any(data.values()):
                     data['sequence'] = i
-                    data['uuid'] = str(uuid.uuid1())
+                    data['uuid'] = self.row_id('usreldoc', i)
                     i = i + 1
                     res.append(data)
             for relation in reldoc.parent_child:
@@ -254,12 +245,12 @@ class Patent(PatentHandler):
                     data['relationship'] = relationship  # parent/child
                     if any(data.values()):
                         data['sequence'] = i
-                        data['uuid'] = str(uuid.uuid1())
+                        data['uuid'] = self.row_id('usreldoc', i)
                         i = i + 1
                         res.append(data)
         return res
 
-    @property
+    @cached_property
     def us_classifications(self):
         """
         Returns list of dictionaries representing us classification
@@ -274,7 +265,7 @@ class Patent(PatentHandler):
               'subclass': main.contents_of('subclass', as_string=True)}
         if any(data.values()):
             classes.append([
-                {'uuid': str(uuid.uuid1()), 'sequence': i},
+                {'uuid': self.row_id('uspc', i), 'sequence': i},
                 {'id': data['class'].upper()},
                 {'id': "{class}/{subclass}".format(**data).upper()}])
             i = i + 1
@@ -285,13 +276,13 @@ class Patent(PatentHandler):
                         'subclass': classification.contents_of('class', as_string=True)}
                 if any(data.values()):
                     classes.append([
-                        {'uuid': str(uuid.uuid1()), 'sequence': i},
+                        {'uuid': self.row_id('uspc', i), 'sequence': i},
                         {'id': data['class'].upper()},
                         {'id': "{class}/{subclass}".format(**data).upper()}])
                     i = i + 1
         return classes
 
-    @property
+    @cached_property
     def ipcr_classifications(self):
         """
         Returns list of dictionaries representing ipcr classifications
@@ -325,11 +316,11 @@ class Patent(PatentHandler):
             data['subgroup'] = ipcr.contents_of('ipc', as_string=True).split('/')[1]
             if any(data.values()):
                 data['sequence'] = i
-                data['uuid'] = str(uuid.uuid1())
+                data['uuid'] = self.row_id('ipcr', i)
                 res.append(data)
         return res
 
-    @property
+    @cached_property
     def claims(self):
         """
         Returns list of dictionaries representing claims
@@ -356,6 +347,6 @@ class Patent(PatentHandler):
                                         as_string=True).split(' ')[-1]
             if 'dependent' in data:
                 data['dependent'] = int(''.join(c for c in data['dependent'] if c.isdigit()))
-            data['uuid'] = str(uuid.uuid1())
+            data['uuid'] = self.row_id('claim', i)
             res.append(data)
         return res
@@ -5,37 +5,28 @@ Uses the extended ContentHandler from xml_driver to extract the needed fields
 from patent grant documents
 """
 
-from cStringIO import StringIO
 from datetime import datetime
 from unidecode import unidecode
-from handler import Patobj, PatentHandler
+from handler import ApplicationRecord, PatentHandler, cached_property
 import re
-import uuid
-import xml.sax
 import xml_util
 import xml_driver
 
 claim_num_regex = re.compile(r'^\d+\. *') # removes claim number from claim text
 
+# the parts of the document read by this handler; the rest (description,
+# drawings) is not built by the XMLHandler
+xml_paths = ['us_patent_application/us_bibliographic_data_application',
+             'us_patent_application/abstract',
+             'us_patent_application/claims']
+
 
 class Patent(PatentHandler):
 
-    def __init__(self, xml_string, is_string=False):
-        xh = xml_driver.XMLHandler()
-        parser = xml_driver.make_parser()
+    record = ApplicationRecord
 
-        parser.setContentHandler(xh)
-        parser.setFeature(xml_driver.handler.feature_external_ges, False)
-        l = xml.sax.xmlreader.Locator()
-        xh.setDocumentLocator(l)
-        if is_string:
-            parser.parse(StringIO(xml_string))
-        else:
-            parser.parse(xml_string)
-
-        self.attributes = ['app','application','assignee_list','inventor_list',
-                          'us_relation_list','us_classifications','ipcr_classifications',
-                          'claims']
+    def __init__(self, xml_string, is_string=False):
+        xh = xml_driver.parse(xml_string, xml_paths, is_string)
 
         self.xml = xh.root.us_patent_application
 
@@ -109,7 +100,7 @@ class Patent(PatentHandler):
             print inst, datestring
             return None
 
-    @property
+    @cached_property
     def assignee_list(self):
         """
         Returns list of dictionaries:
@@ -146,11 +137,11 @@ class Patent(PatentHandler):
             loc['id'] = unidecode(u"|".join([loc['city'], loc['state'], loc['country']]).lower())
             if any(asg.values()) or any(loc.values()):
                 asg['sequence'] = i
-                asg['uuid'] = str(uuid.uuid1())
+                asg['uuid'] = self.row_id('assignee', i)
                 res.append([asg, loc])
         return res
 
-    @property
+    @cached_property
     def inventor_list(self):
         """
         Returns list of lists of inventor dictionary and location dictionary
@@ -182,7 +173,7 @@ class Patent(PatentHandler):
             loc['id'] = unidecode("|".join([loc['city'], loc['state'], loc['country']]).lower())
             if any(inv.values()) or any(loc.values()):
                 inv['sequence'] = i
-                inv['uuid'] = str(uuid.uuid1())
+                inv['uuid'] = self.row_id('inventor', i)
                 res.append([inv, loc])
         return res
 
@@ -199,7 +190,7 @@ class Patent(PatentHandler):
             root.contents_of('doc_number')[0])
         return res
 
-    @property
+    @cached_property
     def us_relation_list(self):
         """
         returns list of dictionaries for us reldoc:
@@ -227,7 +218,7 @@ class Patent(PatentHandler):
                 data['date'] = self._fix_date(data['date'])
                 if any(data.values()):
                     data['sequence'] = i
-                    data['uuid'] = str(uuid.uuid1())
+                    data['uuid'] = self.row_id('usreldoc', i)
                     i = i + 1
                     res.append(data)
             for relation in reldoc.relation:
@@ -243,12 +234,12 @@ class Patent(PatentHandler):
                     data['relationship'] = relationship  # parent/child
                     if any(data.values()):
                         data['sequence'] = i
-                        data['uuid'] = str(uuid.uuid1())
+                        data['uuid'] = self.row_id('usreldoc', i)
                         i = i + 1
                         res.append(data)
         return res
 
-    @property
+    @cached_property
     def us_classifications(self):
         """
         Returns list of dictionaries representing us classification
@@ -263,7 +254,7 @@ class Patent(PatentHandler):
                 'subclass': main[0][3:].replace(' ', '')}
         if any(data.values()):
             classes.append([
-                {'uuid': str(uuid.uuid1()), 'sequence': i},
+                {'uuid': self.row_id('uspc', i), 'sequence': i},
                 {'id': data['class'].upper()},
                 {'id': "{class}/{subclass}".format(**data).upper()}])
             i = i + 1
@@ -274,13 +265,13 @@ class Patent(PatentHandler):
                         'subclass': classification[3:].replace(' ', '')}
                 if any(data.values()):
                     classes.append([
-                        {'uuid': str(uuid.uuid1()), 'sequence': i},
+                        {'uuid': self.row_id('uspc', i), 'sequence': i},
                         {'id': data['class'].upper()},
                         {'id': "{class}/{subclass}".format(**data).upper()}])
                     i = i + 1
         return classes
 
-    @property
+    @cached_property
     def ipcr_classifications(self):
         """
         Returns list of dictionaries representing ipcr classifications
@@ -315,11 +306,11 @@ class Patent(PatentHandler):
             data['action_date'] = self._fix_date(ipcr.action_date.contents_of('date', as_string=True))
             if any(data.values()):
                 data['sequence'] = i
-                data['uuid'] = str(uuid.uuid1())
+                data['uuid'] = self.row_id('ipcr', i)
                 res.append(data)
         return res
 
-    @property
+    @cached_property
     def claims(self):
         """
         Returns list of dictionaries representing claims
@@ -342,6 +333,6 @@ class Patent(PatentHandler):
                 claim_str = claim.contents_of('claim_ref',\
                                         as_string=True).split(' ')[-1]
                 data['dependent'] = int(''.join(c for c in claim_str if c.isdigit()))
-            data['uuid'] = str(uuid.uuid1())
+            data['uuid'] = self.row_id('claim', i)
             res.append(data)
         return res
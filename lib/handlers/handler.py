@@ -1,9 +1,93 @@
+import time
+
+# set by parse.py to a metrics.Metrics that times the extraction of every
+# field (see lib/metrics.py)
+metrics = None
+
+
+class cached_property(object):
+    """
+    Decorator for the properties of a PatentHandler that extract a field of
+    the document. The field is extracted the first time it is read and then
+    stored on the handler, so reading it again (e.g. from get_patobj and from
+    another property) does not extract it again
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+        self.stage = 'handler.' + func.__name__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        if metrics is None:
+            value = obj.__dict__[self.__name__] = self.func(obj)
+            return value
+        start = time.time()
+        value = obj.__dict__[self.__name__] = self.func(obj)
+        metrics.add(self.stage, time.time() - start)
+        return value
+
+
 class Patobj(object):
-    pass
+    """
+    The fields extracted from one document, as returned by get_patobj.
+    Subclasses list the fields of a document type in __slots__, so records
+    have no instance __dict__
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for field, value in fields.iteritems():
+            setattr(self, field, value)
+
+    def as_dict(self):
+        """
+        Returns the fields of the record as a dictionary
+        """
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        for field, value in state.iteritems():
+            setattr(self, field, value)
+
+
+class GrantRecord(Patobj):
+    # the field holding the document number
+    key = 'patent'
+    __slots__ = ('pat', 'app', 'assignee_list', 'patent', 'inventor_list', 'lawyer_list',
+                 'us_relation_list', 'us_classifications', 'ipcr_classifications',
+                 'citation_list', 'claims')
+
+
+class ApplicationRecord(Patobj):
+    key = 'application'
+    __slots__ = ('app', 'application', 'assignee_list', 'inventor_list',
+                 'us_relation_list', 'us_classifications', 'ipcr_classifications',
+                 'claims')
+
 
 class PatentHandler(object):
+    # the Patobj subclass of the records returned by get_patobj
+    record = None
+
+    def row_id(self, table, sequence):
+        """
+        Returns the identifier (the uuid column) of the [table] row numbered
+        [sequence] of this document, e.g. '8142722-claim-0'. Identifiers
+        depend only on the document, so parsing a document again gives the
+        same rows the same identifiers
+        """
+        return u'{0}-{1}-{2}'.format(getattr(self, self.record.key), table, sequence)
+
     def get_patobj(self):
-        patobj = Patobj()
-        for attr in self.attributes:
-            patobj.__dict__[attr] = getattr(self, attr)
-        return patobj
\ No newline at end of file
+        patobj = self.record()
+        for attr in self.record.__slots__:
+            setattr(patobj, attr, getattr(self, attr))
+        return patobj
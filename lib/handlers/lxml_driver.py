@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+
+"""
+XML engine built on lxml (libxml2), an alternative to parsing with xml.sax
+and expat. Selected with xml_driver.set_engine('lxml'), which parse.py does
+when the xml_engine option of lib/alchemy/config.ini is 'lxml'.
+
+The document is parsed into an lxml tree in C, and the handlers read it
+through LXMLElements: XMLElements that wrap an lxml element and make their
+children, attributes and content the first time they are read. Tag lookups
+search the lxml tree with its iterators, so the elements a handler never
+reads are never built in Python.
+
+The content of an element is the same as the XMLHandler gives it. The
+XMLHandler joins text by the chunks expat reports it in: expat reports the
+text of an element one line at a time and splits it again at every character
+or entity reference, and the XMLHandler drops chunks that are only whitespace
+and wraps every chunk inside a sub element in <sub></sub>. expat also reports
+a CDATA section as a chunk of its own. libxml2 resolves references into the
+text and merges CDATA sections into it, so before parsing every reference and
+CDATA section is surrounded by a reference to U+FDD0, a noncharacter that
+does not occur in patent documents, and the text is split at those to find
+the same chunks. Line numbers come from the line libxml2 records for every
+node (where the start tag of an element ends, where a comment or processing
+instruction ends) plus the newlines in the text since. libxml2 stops counting
+lines at 65535, so longer documents are parsed with sax.
+
+Unlike expat, lxml does not report xmlns declarations as attributes.
+"""
+
+import re
+from lxml import etree
+import xml_driver
+from xml_driver import XMLElement, ChainList, tag_name, path_trie, whole_subtree
+
+marker = u'\ufdd0'
+references = re.compile(r'&(?:#[0-9]+|#x[0-9a-fA-F]+|[A-Za-z_:][\w.:-]*);')
+# the parts of a document whose text is not parsed for references, and the
+# start of a processing instruction with what could be a reference in it
+sections = re.compile(r'(<!\[CDATA\[.*?\]\]>|<!--.*?-->|<\?.*?\?>)', re.S)
+instruction_reference = re.compile(r'<\?(?:[^?&]|\?(?!>))*&')
+# what may come before the DOCTYPE declaration, and the declaration with its
+# internal subset, whose literals, comments and processing instructions may
+# hold ]> and references
+prolog = re.compile(r'(?:<\?.*?\?>|<!--.*?-->|\s)*', re.S)
+doctype = re.compile(r'''<!DOCTYPE(?:[^\[>"']|"[^"]*"|'[^']*')*'''
+                     r'''(?:\[(?:<!--.*?-->|<\?.*?\?>|"[^"]*"|'[^']*'|<(?!!--|\?)|[^\]"'<])*\]\s*)?>''',
+                     re.S)
+xml_namespace = '{http://www.w3.org/XML/1998/namespace}'
+# documents with this many newlines have lines libxml2 does not number
+max_lines = 65534
+# elements whose text is put to their parent, see XMLHandler.put_characters
+inline = ('b', 'i', 'sub')
+
+parser = etree.XMLParser(resolve_entities=False, load_dtd=False,
+                         no_network=True, huge_tree=True)
+
+
+def mark_references(xml_string):
+    """
+    Returns [xml_string] with every character and entity reference, and
+    every CDATA section, surrounded by a reference to the marker character.
+    Text that only looks like a reference, inside a CDATA section, comment,
+    processing instruction or the DOCTYPE declaration, is left alone
+    """
+    declaration = doctype.match(xml_string, prolog.match(xml_string).end())
+    if declaration:
+        end = declaration.end()
+        if xml_string.find('&', 0, end) >= 0 or xml_string.find('<![CDATA[', 0, end) >= 0:
+            return xml_string[:end] + mark_content(xml_string[end:])
+    return mark_content(xml_string)
+
+
+def mark_content(xml_string):
+    """
+    Does what mark_references does for [xml_string], in which no DOCTYPE
+    declaration holds anything that looks like a reference
+    """
+    if '<![CDATA[' not in xml_string:
+        if '&' not in xml_string:
+            return xml_string
+        if '<!--' not in xml_string and not instruction_reference.search(xml_string):
+            return references.sub(r'&#xFDD0;\g<0>&#xFDD0;', xml_string)
+    parts = sections.split(xml_string)
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            parts[i] = references.sub(r'&#xFDD0;\g<0>&#xFDD0;', part)
+        elif part.startswith('<![CDATA['):
+            parts[i] = '&#xFDD0;' + part + '&#xFDD0;'
+    return ''.join(parts)
+
+
+def qualified_name(name, element):
+    """
+    Returns the name expat reports for the lxml tag or attribute [name] of
+    [element], e.g. 'm:math' for '{http://www.w3.org/1998/Math/MathML}math'
+    """
+    if name[0] != '{':
+        return name
+    uri, local = name[1:].split('}', 1)
+    if name.startswith(xml_namespace):
+        return 'xml:' + local
+    for prefix, namespace in element.nsmap.iteritems():
+        if namespace == uri and prefix:
+            return prefix + ':' + local
+    return local
+
+
+def element_name(element):
+    """
+    Returns the XMLElement name of the lxml [element]
+    """
+    return tag_name(qualified_name(element.tag, element))
+
+
+def child_node(node, name):
+    """
+    Returns the path trie node of the child [name] of an element at trie
+    [node], or None if the XMLHandler skips it
+    """
+    return node if node is whole_subtree else node.get(name)
+
+
+def text_end(text, line):
+    """
+    Returns the line of the last chunk or newline expat reports for [text],
+    which starts on [line]
+    """
+    return line + text.count('\n') - (text[-1] == '\n')
+
+
+def end_line(node):
+    """
+    Returns the line the lxml [node] ends on, where the text after it starts
+    """
+    newlines = 0
+    while isinstance(node.tag, basestring) and len(node):
+        last = node[-1]
+        if last.tail:
+            newlines += last.tail.count('\n')
+        node = last
+    if isinstance(node.tag, basestring) and node.text:
+        newlines += node.text.count('\n')
+    return node.sourceline + newlines
+
+
+def last_line(element, node):
+    """
+    Returns the line of the last text expat reports inside the lxml
+    [element], at trie [node], or None if there is none
+    """
+    for child in reversed(element):
+        if child.tail:
+            return text_end(child.tail, end_line(child))
+        if isinstance(child.tag, basestring):
+            child_trie = child_node(node, element_name(child))
+            if child_trie is not None:
+                line = last_line(child, child_trie)
+                if line is not None:
+                    return line
+    if element.text:
+        return text_end(element.text, element.sourceline)
+    return None
+
+
+class LXMLElement(XMLElement):
+    """
+    XMLElement for the lxml [element] named [name], at path trie [node] (see
+    xml_driver.path_trie) and [depth] below the root of the LXMLDocument
+    [document]. Its attributes, children and content are made the first time
+    they are read
+    """
+
+    __slots__ = ('_element', '_node', '_document', '_found',
+                 '_attribute_values', '_child_elements', '_chunks')
+
+    # tag lookups search the lxml tree, see LXMLDocument.find
+    _indexed = True
+
+    def __init__(self, name, element, node, depth, document):
+        self._name = name
+        self.is_root = False
+        self._depth = depth
+        self._cache = None
+        self._element = element
+        self._node = node
+        self._document = document
+        self._found = None
+        self._attribute_values = None
+        self._child_elements = None
+        self._chunks = None
+
+    @property
+    def _attributes(self):
+        if self._attribute_values is None:
+            self._attribute_values = {}
+            if self._element is not None:
+                for key, value in self._element.items():
+                    self._attribute_values[qualified_name(key, self._element)] = \
+                        unicode(value.replace(marker, u''))
+        return self._attribute_values or None
+
+    @property
+    def children(self):
+        if self._child_elements is None:
+            self._child_elements = self._document.children(self)
+        return self._child_elements
+
+    @property
+    def content(self):
+        if self._chunks is None:
+            self._chunks = self._document.content(self)
+        return self._chunks
+
+    def _find(self, key):
+        # a copy, XMLElement.__getattr__ sorts what it is given
+        if self._found is None:
+            self._found = {}
+        if key not in self._found:
+            self._found[key] = self._document.find(self, key)
+        return list(self._found[key])
+
+
+class LXMLHandler(object):
+    """
+    Holds the root LXMLElement of the lxml [tree] of a document, which has
+    the children, content and lookups of the root XMLHandler builds with the
+    same [paths]
+    """
+
+    def __init__(self, tree, paths=None):
+        self.root = LXMLElement(None, None, path_trie(paths) if paths else whole_subtree,
+                                0, LXMLDocument(tree))
+        self.root.is_root = True
+
+
+class LXMLDocument(object):
+    """
+    Makes the children, content and lookups of the LXMLElements of the lxml
+    [tree] of a document. It holds no LXMLElements, so the tree is freed with
+    the last of them
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        # XMLElement name -> the lxml tags of the elements with that name
+        self.tags = {}
+        for tag in set(element.tag for element in tree.iter(etree.Element)):
+            name = element_name(tree.iter(tag).next()) if tag[0] == '{' else tag_name(tag)
+            self.tags[name] = self.tags.get(name, ()) + (tag,)
+        # the content being made and the line of the last chunk, see content
+        self.chunks = None
+        self.lastline = -1
+
+    def children(self, parent):
+        """
+        Returns the children of the LXMLElement [parent]
+        """
+        if parent._element is None:
+            elements = (self.tree,)
+        else:
+            elements = parent._element.iterchildren(etree.Element)
+        res = None
+        for element in elements:
+            name = element_name(element)
+            node = child_node(parent._node, name)
+            if node is not None:
+                if res is None:
+                    res = ChainList()
+                res.append(LXMLElement(name, element, node, parent._depth + 1, self))
+        return res if res is not None else xml_driver.no_children
+
+    def find(self, parent, key):
+        """
+        Returns the elements named [key] below the LXMLElement [parent] that
+        are not inside another element named [key], in document order, as
+        XMLElement._find does
+        """
+        tags = self.tags.get(key)
+        if not tags:
+            return []
+        if parent._node is not whole_subtree:
+            res = []
+            for child in parent.children:
+                if child._name == key:
+                    res.append(child)
+                else:
+                    res.extend(child._find(key))
+            return res
+        # the whole subtree is built, so it is searched in C
+        stop = parent._element
+        if stop is None:
+            matches = self.tree.iter(*tags)
+        else:
+            matches = stop.iterdescendants(*tags)
+        res = []
+        for match in matches:
+            depth = parent._depth + 1
+            ancestor = match.getparent()
+            while ancestor is not stop:
+                if ancestor.tag in tags:
+                    break  # inside an earlier match
+                depth += 1
+                ancestor = ancestor.getparent()
+            else:
+                res.append(LXMLElement(key, match, whole_subtree, depth, self))
+        return res
+
+    def content(self, element):
+        """
+        Returns the content of the LXMLElement [element]: the chunks of text
+        the XMLHandler puts to it, joined as XMLElement.put_content does
+        """
+        lxml_element = element._element
+        if lxml_element is None:
+            return xml_driver.no_content
+        text = lxml_element.text
+        if text.__class__ is str and not len(lxml_element) and '\n' not in text \
+           and element._name not in inline:
+            # most elements: one line of ascii text
+            return [unicode(text)] if not text.isspace() else xml_driver.no_content
+        self.chunks = []
+        self.lastline = -1
+        own = element._name not in inline
+        self.add_text(text, lxml_element.sourceline, own, False)
+        self.add_children(lxml_element, element._node, own, False, True)
+        chunks, self.chunks = self.chunks, None
+        return chunks or xml_driver.no_content
+
+    def add_children(self, element, node, put, wrap, nested):
+        """
+        Goes through the text after each child of the lxml [element], at
+        trie [node], as add_text does, and through the text of its b, i and
+        sub children too if [nested]. Only the line of the last text inside
+        the other children is kept
+        """
+        for child in element:
+            if isinstance(child.tag, basestring):
+                name = element_name(child)
+                child_trie = child_node(node, name)
+                if child_trie is not None:
+                    if nested and name in inline:
+                        sub = name == 'sub'
+                        self.add_text(child.text, child.sourceline, True, sub)
+                        self.add_children(child, child_trie, True, sub, False)
+                    else:
+                        line = last_line(child, child_trie)
+                        if line is not None:
+                            self.lastline = line
+            if child.tail:
+                self.add_text(child.tail, end_line(child), put, wrap)
+
+    def add_text(self, text, line, put, wrap):
+        """
+        Goes through [text], which starts on [line], one chunk at a time, as
+        expat would report it, and adds the chunks to the content being made
+        if [put], inside <sub></sub> if [wrap]
+        """
+        if not text:
+            return
+        if text.__class__ is str:
+            # ascii text, so there are no markers in it
+            if not put or text.isspace():
+                self.lastline = text_end(text, line)
+                return
+            if '\n' not in text:
+                self.put_content(unicode(text), line, wrap)
+                return
+            text = unicode(text)
+        lines = text.split(u'\n')
+        last = len(lines) - 1
+        for i, content in enumerate(lines):
+            for chunk in content.split(marker):
+                if chunk:
+                    if put and chunk.strip():
+                        self.put_content(chunk, line, wrap)
+                    self.lastline = line
+            if i < last:
+                self.lastline = line
+                line += 1
+
+    def put_content(self, chunk, line, wrap):
+        """
+        Adds [chunk], found on [line], to the content being made, as
+        XMLElement.put_content does
+        """
+        if wrap:
+            chunk = u'<sub>' + chunk + u'</sub>'
+        if not self.chunks or self.lastline != line:
+            self.chunks.append(chunk)
+        else:
+            self.chunks[-1] += chunk
+        self.lastline = line
+
+
+def parse(source, paths=None, is_string=False):
+    """
+    Parses the XML document [source], a string if [is_string] or else a
+    filename or file object, with lxml and returns the LXMLHandler holding
+    its tree. [paths] is passed on to LXMLHandler
+    """
+    if not is_string:
+        if hasattr(source, 'read'):
+            source = source.read()
+        else:
+            with open(source, 'rb') as f:
+                source = f.read()
+    if source.count('\n') >= max_lines:
+        return xml_driver.parse_sax(source, paths, True)
+    return LXMLHandler(etree.fromstring(mark_references(source), parser), paths)
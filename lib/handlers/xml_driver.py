@@ -6,9 +6,13 @@ Python's xml.sax module.  Works in conjunction with lib/xml_util.py, which
 provides useful helper methods to handle the parsed data.
 """
 
+import sys
+import time
 import functools
+from bisect import bisect_left, bisect_right
 from collections import deque
-from xml.sax import make_parser, handler
+from cStringIO import StringIO
+from xml.sax import make_parser, handler, xmlreader
 import xml_util
 
 class ChainList(list):
@@ -28,33 +32,78 @@ class ChainList(list):
         return ChainList(res) if res else default
 
     def __getattr__(self, key):
-        res = []
-        scope = deque(self)
-        while scope:
-            current = scope.popleft()
-            if current._name == key: res.append(current)
-            else: scope.extend(current.children)
-        return ChainList(res)
+        if not all(item._indexed for item in self):
+            return ChainList(breadth_first(self, key))
+        # a breadth first search from every item at once finds, at each
+        # distance from the items, the matches under the first item, then
+        # those under the second, and so on
+        found = []
+        for i, item in enumerate(self):
+            if item._name == key:
+                found.append((0, i, item))
+            else:
+                found.extend((match._depth - item._depth, i, match)
+                             for match in item._find(key))
+        found.sort(key=lambda x: x[:2])
+        return ChainList(match for distance, i, match in found)
 
     def __reduce__(self): return (ChainList, (), None, iter(self), None)
     def __getstate__(self): return None
 
+def breadth_first(scope, key):
+    """
+    Returns the elements named [key] found by a breadth first search from the
+    elements in [scope], without looking inside the elements that match
+    """
+    res = []
+    scope = deque(scope)
+    while scope:
+        current = scope.popleft()
+        if current._name == key: res.append(current)
+        else: scope.extend(current.children)
+    return res
+
+# shared by the elements that have no content or children. They are replaced
+# by a list of their own when the first content or child is added
+no_content = ()
+no_children = ChainList()
+
 class XMLElement(object):
     """
     Represents XML elements from a document. These will assist
     us in representing an XML document as a Python object.
     Heavily inspired from: https://github.com/stchris/untangle/blob/master/untangle.py
+
+    There is one of these for every element of every document parsed, so they
+    are kept small: no instance __dict__, no attribute dictionary unless the
+    element has attributes, and shared empty content and children
     """
 
+    __slots__ = ('_name', '_attributes', 'content', 'children', 'is_root',
+                 '_index', '_pos', '_end', '_depth', '_cache')
+
     def __init__(self, name, attributes):
         self._name = name
-        self._attributes = attributes
-        self.content = []
-        self.children = ChainList()
+        self._attributes = attributes or None
+        self.content = no_content
+        self.children = no_children
         self.is_root = False
+        # set by XMLHandler: the tag index of the document, the position of
+        # the element in document order, the position just past its last
+        # descendant, and its depth below the root
+        self._index = None
+        self._pos = None
+        self._end = None
+        self._depth = 0
+        # results of tag lookups on this element, created on first use
+        self._cache = None
 
     def __getstate__(self):
-        return self.__dict__
+        return dict((slot, getattr(self, slot)) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in state.iteritems():
+            setattr(self, slot, value)
 
     def __iter__(self):
         yield self
@@ -66,18 +115,47 @@ class XMLElement(object):
         return self.get_attribute(key)
 
     def __getattr__(self, key):
-        res = []
-        scope = deque(self.children)
-        while scope:
-            current = scope.popleft()
-            if current._name == key: res.append(current)
-            else: scope.extend(current.children)
+        if key in XMLElement.__slots__ or key.startswith('__'):
+            # special methods (looked up by pickle and copy), or a slot of an
+            # element that is not initialised yet, e.g. while unpickling
+            raise AttributeError(key)
+        if self._cache and key in self._cache:
+            return self._cache[key]
+        if self._indexed:
+            res = self._find(key)
+            res.sort(key=lambda x: x._depth)  # stable: document order within a level
+        else:
+            res = breadth_first(self.children, key)
         if res:
-            self.__dict__[key] = ChainList(res)
+            if self._cache is None:
+                self._cache = {}
+            self._cache[key] = ChainList(res)
             return ChainList(res)
         else:
             return ChainList('')
 
+    @property
+    def _indexed(self):
+        return self._index is not None and self._end is not None
+
+    def _find(self, key):
+        """
+        Returns the descendants named [key] that are not inside another
+        descendant named [key], in document order. Uses the tag index of the
+        document, so the cost is in the number of [key] elements in the
+        document rather than the size of the subtree
+        """
+        positions, elements = self._index.get(key, ((), ()))
+        lo = bisect_right(positions, self._pos)
+        hi = bisect_left(positions, self._end, lo)
+        res = []
+        end = -1
+        for element in elements[lo:hi]:
+            if element._pos >= end:
+                res.append(element)
+                end = element._end
+        return res
+
     def contents_of(self, key, default=ChainList(''), as_string=False, upper=True):
         candidates = self.__getattr__(key)
         if candidates:
@@ -102,16 +180,21 @@ class XMLElement(object):
             return map(functools.partial(xml_util.clean, upper=upper), self.content)
 
     def put_content(self, content, lastlinenumber, linenumber):
-        if not self.content or lastlinenumber != linenumber:
+        if not self.content:
+            self.content = [content]
+        elif lastlinenumber != linenumber:
             self.content.append(content)
         else:
             self.content[-1] += content
 
     def add_child(self, child):
+        if self.children is no_children:
+            self.children = ChainList()
         self.children.append(child)
 
     def get_attribute(self, key, upper=True):
-        return xml_util.clean(self._attributes.get(key, None), upper=upper)
+        attributes = self._attributes
+        return xml_util.clean(attributes.get(key, None) if attributes else None, upper=upper)
 
     def get_xmlelements(self, name):
         return filter(lambda x: x._name == name, self.children) \
@@ -119,21 +202,101 @@ class XMLElement(object):
                self.children
 
 
+tag_names = {}
+
+def tag_name(name):
+    """
+    Returns the attribute name used for the XML tag [name], e.g. 'doc_number'
+    for 'doc-number'. Names are computed once and interned, so every element
+    with the same tag shares one string
+    """
+    try:
+        return tag_names[name]
+    except KeyError:
+        clean = name.replace('-','_').replace('.','_').replace(':','_')
+        try:
+            clean = intern(str(clean))
+        except UnicodeEncodeError:
+            pass
+        tag_names[name] = clean
+        return clean
+
+
+# marks a path whose whole subtree is built
+whole_subtree = {}
+
+def path_trie(paths):
+    """
+    Given a list of element [paths] such as 'us_patent_grant/claims', returns
+    a nested dictionary of the element names along them. The last element of
+    each path maps to whole_subtree
+    """
+    trie = {}
+    for path in paths:
+        node = trie
+        names = path.split('/')
+        for name in names[:-1]:
+            if node.get(name) is whole_subtree:
+                break  # already built by a shorter path
+            node = node.setdefault(name, {})
+        else:
+            node[names[-1]] = whole_subtree
+    return trie
+
+
 class XMLHandler(handler.ContentHandler):
     """
     SAX Handler to create the Python object while parsing
+
+    If [paths] is given (see path_trie), only the elements along those paths
+    and inside the subtrees they end at are built; any other element is
+    skipped together with everything inside it. Handlers pass the paths
+    they read (the xml_paths of each handler module), so the description and
+    drawings of a document are not built. The text of skipped elements is
+    not looked at, so text directly inside an element along a path that shares
+    a line with a skipped element may be joined differently; patent documents
+    have no such text.
     """
 
-    def __init__(self):
+    def __init__(self, paths=None):
+        # tag name -> ([positions], [elements]) in document order, shared by
+        # all the elements of the document (see XMLElement._find)
+        self.index = {}
+        self.count = 0
         self.root = XMLElement(None, None)
         self.root.is_root = True
+        self.root._index = self.index
+        self.root._pos = -1
+        self.root._end = sys.maxint
         self.elements = ChainList()
+        # path trie node of every open element, and the depth inside a skipped element
+        self.nodes = [path_trie(paths) if paths else whole_subtree]
+        self.skipped = 0
         handler.ContentHandler.__init__(self)
         self.lastline = -1
 
     def startElement(self, name, attributes):
-        name = name.replace('-','_').replace('.','_').replace(':','_')
-        xmlelem = XMLElement(name, dict(attributes.items()))
+        if self.skipped:
+            self.skipped += 1
+            return
+        name = tag_name(name)
+        node = self.nodes[-1]
+        if node is not whole_subtree:
+            node = node.get(name)
+            if node is None:
+                self.skipped = 1
+                return
+        self.nodes.append(node)
+        xmlelem = XMLElement(name, dict(attributes.items()) if len(attributes) else None)
+        xmlelem._index = self.index
+        xmlelem._pos = self.count
+        xmlelem._depth = len(self.elements) + 1
+        self.count += 1
+        postings = self.index.get(name)
+        if postings is None:
+            postings = self.index[name] = ([], [])
+        postings[0].append(xmlelem._pos)
+        postings[1].append(xmlelem)
         if self.elements:
             self.elements[-1].add_child(xmlelem)
         else:
@@ -141,11 +304,22 @@ class XMLHandler(handler.ContentHandler):
         self.elements.append(xmlelem)
 
     def endElement(self, name):
-        if self.elements:
-            self.elements.pop()
+        if self.skipped:
+            self.skipped -= 1
+        elif self.elements:
+            self.nodes.pop()
+            self.elements.pop()._end = self.count
 
     def characters(self, content):
-        currentlinenumber = self._locator.getLineNumber()
+        if self.skipped:
+            return
+        self.put_characters(content, self._locator.getLineNumber())
+
+    def put_characters(self, content, currentlinenumber):
+        """
+        Adds the character data [content] found on line [currentlinenumber]
+        to the open element, or to its parent for b, i and sub elements
+        """
         if content.strip():
           if self.elements[-1]._name in ('b','i'):
             self.elements[-2].put_content(content, self.lastline, currentlinenumber)
@@ -154,4 +328,56 @@ class XMLHandler(handler.ContentHandler):
             self.elements[-2].put_content(newtxt, self.lastline, currentlinenumber)
           else:
             self.elements[-1].put_content(content, self.lastline, currentlinenumber)
-        self.lastline = self._locator.getLineNumber()
+        self.lastline = currentlinenumber
+
+
+# the XML engine used by parse(): 'sax' (xml.sax with expat) or 'lxml'
+# (lxml_driver, needs the lxml package). parse.py sets it from the
+# xml_engine option of lib/alchemy/config.ini
+engine = 'sax'
+
+def set_engine(name):
+    """
+    Selects the XML engine [name] used by parse(). Raises ImportError if
+    the engine is 'lxml' and lxml is not installed
+    """
+    global engine
+    if name == 'lxml':
+        import lxml_driver
+    elif name != 'sax':
+        raise ValueError("unknown XML engine: {0}".format(name))
+    engine = name
+
+# set by parse.py to a metrics.Metrics that times every parse (see lib/metrics.py)
+metrics = None
+
+def parse(source, paths=None, is_string=False):
+    """
+    Parses the XML document [source], a string if [is_string] or else a
+    filename or file object, with the selected engine and returns the
+    XMLHandler holding its tree. [paths] is passed on to XMLHandler
+    """
+    if metrics is None:
+        return parse_document(source, paths, is_string)
+    start = time.time()
+    xh = parse_document(source, paths, is_string)
+    metrics.add('xml', time.time() - start)
+    return xh
+
+def parse_document(source, paths=None, is_string=False):
+    if engine == 'lxml':
+        import lxml_driver
+        return lxml_driver.parse(source, paths, is_string)
+    return parse_sax(source, paths, is_string)
+
+def parse_sax(source, paths=None, is_string=False):
+    """
+    Parses [source], as parse does, with xml.sax and expat
+    """
+    xh = XMLHandler(paths)
+    parser = make_parser()
+    parser.setContentHandler(xh)
+    parser.setFeature(handler.feature_external_ges, False)
+    xh.setDocumentLocator(xmlreader.Locator())
+    parser.parse(StringIO(source) if is_string else source)
+    return xh
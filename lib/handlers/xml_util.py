@@ -9,6 +9,15 @@ from itertools import izip
 from unicodedata import normalize
 from cgi import escape
 
+html_lt = re.compile('<(?!/?sub>)',flags=re.I)
+html_gt = re.compile('(?=.)*(?<!sub)>',flags=re.I)
+html_amp = re.compile('&(?!(amp;|lt;|gt;))',flags=re.I)
+escape_seqs = re.compile(r'[\r\n\t\v\b\f\a ]+')
+identifier_prefix = re.compile(r'([A-Z]*)0?')
+# anything clean() has to change apart from the case: characters other than
+# printable ascii and single spaces, and markup
+needs_cleaning = re.compile(r'[^\x21-\x7e ]|  |[&<>]')
+
 
 def flatten(ls_of_ls):
     """
@@ -37,12 +46,9 @@ def escape_html_nosub(string):
     Escapes html sequences (e.g. <b></b>) that are not the known idiom
     for subscript: <sub>...</sub>
     """
-    lt = re.compile('<(?!/?sub>)',flags=re.I)
-    gt = re.compile('(?=.)*(?<!sub)>',flags=re.I)
-    amp = re.compile('&(?!(amp;|lt;|gt;))',flags=re.I)
-    string = re.sub(amp,'&amp;',string)
-    string = re.sub(lt,"&lt;",string)
-    string = re.sub(gt,"&gt;",string)
+    string = html_amp.sub('&amp;',string)
+    string = html_lt.sub("&lt;",string)
+    string = html_gt.sub("&gt;",string)
     return string
 
 def has_content(l):
@@ -66,8 +72,7 @@ def remove_escape_sequences(string):
     Replaces all contiguous instances of "\r\n\t\v\b\f\a " and replaces
     it with a single space. Preserves at most one space of surrounding whitespace
     """
-    escape_seqs = r'[\r\n\t\v\b\f\a ]+'
-    return re.sub(escape_seqs,' ', string)
+    return escape_seqs.sub(' ', string)
 
 def translate_underscore(string, lower=False):
     """
@@ -92,7 +97,7 @@ def normalize_document_identifier(identifier):
     """
     # create splits on identifier
     if not identifier: return ''
-    return re.sub(r'([A-Z]*)0?',r'\g<1>',identifier,1)
+    return identifier_prefix.sub(r'\g<1>',identifier,1)
 
 def associate_prefix(firstname, lastname):
     """
@@ -107,6 +112,37 @@ def associate_prefix(firstname, lastname):
     last = prefix+space+lastname
     return name, last
 
+class LRUCache(object):
+    """
+    Dictionary of at most 2*[size] entries that forgets the entries least
+    recently used (approximately: entries are kept in two generations, and the
+    older one is dropped when the newer one is full)
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.recent = {}
+        self.old = {}
+
+    def get(self, key):
+        value = self.recent.get(key)
+        if value is None:
+            value = self.old.get(key)
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        if len(self.recent) >= self.size:
+            self.old = self.recent
+            self.recent = {}
+        self.recent[key] = value
+
+# clean() results for short strings that need cleaning, which are mostly the
+# same few values over and over (countries, cities, names), by [upper]
+clean_cache = {True: LRUCache(5000), False: LRUCache(5000)}
+clean_cache_length = 64
+
 def clean(string, upper=True):
     """
     Applies a subset of the above functions in the correct order
@@ -114,6 +150,24 @@ def clean(string, upper=True):
 
     Change &amp;
     """
+    if string.__class__ is unicode:
+        # unicode strings come from the XML parser; most are short ascii
+        # that only needs its case changed
+        if not needs_cleaning.search(string):
+            return string.upper() if upper else string
+        if len(string) <= clean_cache_length:
+            cache = clean_cache[upper]
+            cleaned = cache.get(string)
+            if cleaned is None:
+                cleaned = clean_string(string, upper)
+                cache.put(string, cleaned)
+            return cleaned
+    return clean_string(string, upper)
+
+def clean_string(string, upper=True):
+    """
+    clean() without the shortcuts for strings that need no cleaning
+    """
     string = normalize_utf8(string)
     string = remove_escape_sequences(string)
     string = translate_underscore(string)
@@ -13,7 +13,7 @@ from collections import Counter
 from Levenshtein import jaro_winkler
 from alchemy import get_config, match
 from alchemy.schema import *
-from alchemy.match import commit_inserts, commit_updates
+from alchemy.match import commit_inserts, commit_updates, commit_statements
 from handlers.xml_util import normalize_utf8
 from datetime import datetime
 from sqlalchemy.sql import or_
@@ -101,6 +101,9 @@ def create_jw_blocks(list_of_lawyers):
 lawyer_insert_statements = []
 patentlawyer_insert_statements = []
 update_statements = []
+# the statements are written every commit_frequency updates, as they are matched
+commit_frequency = 20000
+
 def create_lawyer_table(session):
     """
     Given a list of lawyers and the redis key-value disambiguation,
@@ -110,6 +113,11 @@ def create_lawyer_table(session):
     if alchemy.is_mysql():
         session.execute('set foreign_key_checks = 0;')
         session.commit()
+    # the statements lawyer_match collects are written every commit_frequency updates
+    writer = alchemy.session_generator()
+    inserts = [(lawyer_insert_statements, Lawyer.__table__),
+               (patentlawyer_insert_statements, patentlawyer)]
+    updates = ('lawyer_id', update_statements, RawLawyer.__table__)
     i = 0
     for lawyer in blocks.iterkeys():
         ra_ids = (id_map[ra] for ra in blocks[lawyer])
@@ -121,12 +129,8 @@ def create_lawyer_table(session):
               lawyer_match(rawlawyers, session, commit=True)
           else:
               lawyer_match(rawlawyers, session, commit=False)
-    t1 = celery_commit_inserts.delay(lawyer_insert_statements, Lawyer.__table__, alchemy.is_mysql(), 20000)
-    t2 = celery_commit_inserts.delay(patentlawyer_insert_statements, patentlawyer, alchemy.is_mysql(), 20000)
-    t3 = celery_commit_updates.delay('lawyer_id', update_statements, RawLawyer.__table__, alchemy.is_mysql(), 20000)
-    t1.get()
-    t2.get()
-    t3.get()
+          commit_statements(writer, inserts, updates, alchemy.is_mysql(), commit_frequency)
+    commit_statements(writer, inserts, updates, alchemy.is_mysql(), commit_frequency, final=True)
     session.commit()
     print i, datetime.now()
 
@@ -182,8 +186,8 @@ def lawyer_match(objects, session, commit=False):
     lawyer_insert_statements.append(param)
     tmpids = map(lambda x: x.uuid, objects)
     patents = map(lambda x: x.patent_id, objects)
-    patentlawyer_insert_statements.extend([{'patent_id': x, 'lawyer_id': param['id']} for x in patents])
-    update_statements.extend([{'pk':x,'update':param['id']} for x in tmpids])
+    patentlawyer_insert_statements.extend((x, param['id']) for x in patents)
+    update_statements.extend((x, param['id']) for x in tmpids)
 
 def examine():
     lawyers = s.query(lawyer).all()
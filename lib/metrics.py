@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+Per-stage metrics of a parse.py run (parse.py --metrics FILE). Each stage of
+the pipeline adds the time it took, and a count, under a name of its own:
+
+    split            finding the document spans of a file (count: documents)
+    read             reading the documents (count: documents, plus `bytes`)
+    parse            parsing a document with its handler, all of the below
+    xml              building the tree of a document with the XML engine
+    handler.<field>  extracting one field, e.g. handler.claims. Fields read
+                     by other fields are included in the time of those too
+    write            committing a batch with the configured loader
+    db.<table>       inserting the rows of one table (bulk loader, count: rows)
+    db.replace       deleting the earlier rows of reparsed documents
+    db.commit        committing the transaction
+
+parse.py installs a Metrics object as the `metrics` attribute of the modules
+it instruments (see parse.set_metrics); those are None otherwise, so a run
+without metrics does not pay for them. Records are handed to a reporter, any
+object with a report(record) method taking a dictionary, such as
+JSONLinesReporter. Records have an `event` key:
+
+    batch   after every commit: documents and docs/sec so far
+    file    after every file: documents, bytes, seconds, docs/sec and the
+            stages of that file
+    run     at the end: the same for the whole run
+
+All records carry the peak resident set size of the process so far
+(`peak_rss_kb`), and the run record that of the worker processes too.
+"""
+
+import json
+import time
+import resource
+from collections import OrderedDict
+
+
+def peak_rss(who=resource.RUSAGE_SELF):
+    """
+    Returns the peak resident set size in kilobytes of this process, or of
+    its finished child processes for resource.RUSAGE_CHILDREN
+    """
+    return resource.getrusage(who).ru_maxrss
+
+
+class JSONLinesReporter(object):
+    """
+    Writes every record as a line of JSON to the file [path], which is
+    appended to
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def report(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Metrics(object):
+    """
+    Collects the stage times and counts of every file parsed in a run and
+    reports them to [reporter]. start_file begins a file and end_file
+    reports it; add may be called from any thread in between
+    """
+
+    def __init__(self, reporter):
+        self.reporter = reporter
+        self.started = time.time()
+        self.files = OrderedDict()
+        self.file_started = None
+        self.set_file(None)
+
+    def set_file(self, filename):
+        """
+        Makes [filename] the file that add() records stages for. Stages
+        recorded with no file (None) only count towards the run
+        """
+        self.current = filename
+        if filename not in self.files:
+            self.files[filename] = {'documents': 0, 'bytes': 0, 'stages': {}}
+
+    def start_file(self, filename):
+        self.set_file(filename)
+        self.file_started = time.time()
+
+    def add(self, stage, seconds, count=1):
+        stages = self.files[self.current]['stages']
+        if stage in stages:
+            totals = stages[stage]
+            totals[0] += seconds
+            totals[1] += count
+        else:
+            stages[stage] = [seconds, count]
+
+    def add_document(self, length):
+        """
+        Counts a document of [length] bytes in the current file
+        """
+        stats = self.files[self.current]
+        stats['documents'] += 1
+        stats['bytes'] += length
+
+    def merge(self, files):
+        """
+        Adds [files], the `files` of the Metrics of another process (see
+        parse._parse_worker), to these
+        """
+        for filename, stats in files.iteritems():
+            self.set_file(filename)
+            mine = self.files[filename]
+            mine['documents'] += stats['documents']
+            mine['bytes'] += stats['bytes']
+            for stage, (seconds, count) in stats['stages'].iteritems():
+                self.add(stage, seconds, count)
+
+    def batch(self, documents):
+        """
+        Reports the progress of the current file (or of the run, if no file
+        was begun with start_file), with [documents] loaded so far
+        """
+        seconds = time.time() - (self.file_started or self.started)
+        self.reporter.report(OrderedDict([
+            ('event', 'batch'), ('file', self.current), ('documents', documents),
+            ('seconds', seconds), ('docs_per_sec', rate(documents, seconds)),
+            ('peak_rss_kb', peak_rss())]))
+
+    def end_file(self, filename=None):
+        """
+        Reports the summary of [filename] (by default the current file). Its
+        seconds and docs/sec are only known if it was begun with start_file
+        """
+        filename = filename or self.current
+        seconds = None
+        if filename == self.current and self.file_started:
+            seconds = time.time() - self.file_started
+            self.file_started = None
+        self.reporter.report(summary('file', filename, [self.files[filename]], seconds))
+
+    def end_run(self, workers=False):
+        """
+        Reports the summary of the whole run. [workers] adds the peak
+        resident set size of the worker processes
+        """
+        record = summary('run', None, self.files.values(), time.time() - self.started)
+        if workers:
+            record['peak_rss_kb_workers'] = peak_rss(resource.RUSAGE_CHILDREN)
+        self.reporter.report(record)
+
+
+def rate(documents, seconds):
+    return round(documents / seconds, 2) if seconds else None
+
+
+def summary(event, filename, files, seconds):
+    """
+    Returns the [event] record adding up the stats of [files]
+    """
+    documents = sum(stats['documents'] for stats in files)
+    stages = {}
+    for stats in files:
+        for stage, (stage_seconds, count) in stats['stages'].iteritems():
+            totals = stages.setdefault(stage, [0.0, 0])
+            totals[0] += stage_seconds
+            totals[1] += count
+    record = OrderedDict([('event', event)])
+    if filename:
+        record['file'] = filename
+    record.update([
+        ('documents', documents), ('bytes', sum(stats['bytes'] for stats in files)),
+        ('seconds', seconds), ('docs_per_sec', rate(documents, seconds)),
+        ('peak_rss_kb', peak_rss()),
+        ('stages', OrderedDict((stage, {'seconds': round(stage_seconds, 6), 'count': count})
+                               for stage, (stage_seconds, count) in sorted(stages.iteritems())))])
+    return record
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""
+Runs the commits of parse.py on a thread of their own, so that one batch of
+documents is written to the database while the next batch is being parsed
+instead of the two taking turns. The thread is the only one using the
+database session while it runs: the parsing thread only collects records,
+and waits for the commits to finish (Committer.join) before it uses the
+session itself again, e.g. to look up the manifest entry of the next file.
+"""
+
+import sys
+import time
+import Queue
+import logging
+import threading
+
+
+class Committer(object):
+    """
+    Runs the jobs (functions without arguments) given to submit one at a
+    time, in order, on a separate thread. At most [depth] jobs are in flight,
+    waiting or running: submit blocks until one of them is done, which caps
+    the number of parsed batches held in memory. With a [depth] of 0, jobs
+    run in the calling thread when they are submitted. If a job raises an
+    exception, the jobs after it are skipped and the exception is raised
+    again by the next call to submit or join
+    """
+
+    def __init__(self, depth=1):
+        self.depth = depth
+        self.jobs = Queue.Queue()
+        self.slots = threading.BoundedSemaphore(depth) if depth else None
+        self.thread = None
+        self.error = None
+        self.submitted = 0
+        # jobs submitted and not yet done, logged as the depth of the pipeline
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        # seconds submit has spent waiting for a job to finish
+        self.blocked = 0.0
+
+    def submit(self, job):
+        self.check()
+        self.submitted += 1
+        if not self.depth:
+            job()
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+        start = time.time()
+        self.slots.acquire()
+        blocked = time.time() - start
+        self.blocked += blocked
+        with self.lock:
+            waiting = self.in_flight
+            self.in_flight += 1
+        self.jobs.put(job)
+        logging.info("commit {0} queued behind {1} (pipeline depth {2}), waited {3:.3f}s".format(
+            self.submitted, waiting, self.depth, blocked))
+
+    def run(self):
+        for job in iter(self.jobs.get, None):
+            try:
+                if self.error is None:
+                    job()
+            except Exception:
+                self.error = sys.exc_info()
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                self.slots.release()
+
+    def join(self):
+        """
+        Waits until every job submitted so far has run and stops the thread
+        (submit starts a new one)
+        """
+        if self.thread is not None:
+            self.jobs.put(None)
+            self.thread.join()
+            self.thread = None
+            logging.info("{0} commits, parsing waited {1:.3f}s for them in all".format(
+                self.submitted, self.blocked))
+        self.check()
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error[0], error[1], error[2]
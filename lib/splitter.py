@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+"""
+Splits the weekly USPTO bulk files (ipg*.xml, ipa*.xml, pa*.xml) into their
+individual XML documents. A weekly file is a concatenation of several thousand
+complete XML documents, each of which starts with an <?xml ...?> declaration
+and a <!DOCTYPE ...> line naming the root element. The end of a document is
+the line that closes that root element, e.g. </us-patent-grant>.
+
+Rather than building every document up line by line, the file is memory-mapped
+and the document boundaries are found by byte offset, so the cost of a split
+is a single linear scan of the file.
+
+The weekly files may also be given as the zip archives they are published in
+(e.g. ipg120327.zip). The XML file in an archive is read as a stream, front
+to back, without extracting it to disk; offsets are then offsets into the
+XML file, as for a file that was extracted.
+"""
+
+import mmap
+import re
+import zipfile
+from contextlib import contextmanager
+
+# the root elements used by the DOCTYPEs of the documents we know how to handle.
+# Any other DOCTYPE is split the same way, using the root element it names.
+#   us-patent-grant: grant_handler_v42, grant_handler_v44
+#   us-patent-application: application_handler_v42, application_handler_v43
+#   patent-application-publication: application_handler_v41
+DOCTYPES = ('us-patent-grant', 'us-patent-application',
+            'patent-application-publication')
+
+doctype_regex = re.compile(r'^<!DOCTYPE ([^\s\[>]+)', re.M)
+
+
+def document_spans(buf, offset=0):
+    """
+    Given a string or buffer-like object [buf] (e.g. an mmap) holding one or
+    more concatenated XML documents, returns a generator that yields a tuple
+    (offset, length) for every complete XML document found after [offset].
+    A document runs from the end of the previous document to the end of the
+    line that closes the root element named in its DOCTYPE. Trailing data
+    without a closing tag is ignored.
+    """
+    end = len(buf)
+    while offset < end:
+        match = doctype_regex.search(buf, offset)
+        if not match:
+            return
+        closing = '\n</{0}>'.format(match.group(1))
+        close = buf.find(closing, match.end())
+        if close < 0:
+            return
+        stop = buf.find('\n', close + len(closing))
+        stop = end if stop < 0 else stop + 1
+        yield offset, stop - offset
+        offset = stop
+
+
+def stream_documents(f, offset=0, blocksize=2**20):
+    """
+    Same as document_spans, but reads the documents from the file-like
+    object [f] front to back, [blocksize] bytes at a time, and yields a tuple
+    (offset, xmldoc string) for every complete document after [offset].
+    Only about one document is held in memory, so this works on streams that
+    cannot be memory-mapped, such as the member of a zip archive. The blocks
+    of a document are kept in a list until the line closing it may be in the
+    last one, and the search for it goes on from where it stopped
+    """
+    skip(f, offset)
+    buf = ''        # the data read and joined, of which [start] on is not yielded
+    start = 0
+    closing = None  # the line closing the document at [start], once its DOCTYPE is read
+    close = -1      # where [closing] is in buf, once it is found
+    resume = 0      # where the search for the DOCTYPE or [closing] goes on
+    eof = False
+    while True:
+        if closing is None:
+            match = doctype_regex.search(buf, resume)
+            if match and (match.end() < len(buf) or eof):
+                closing = '\n</{0}>'.format(match.group(1))
+                resume = match.end()
+            else:
+                # the DOCTYPE line may go on in the next block
+                resume = match.start() if match else max(start, buf.rfind('\n') + 1)
+        if closing is not None and close < 0:
+            close = buf.find(closing, resume)
+            if close < 0:
+                resume = max(resume, len(buf) - len(closing))
+        if close >= 0:
+            stop = buf.find('\n', close + len(closing))
+            # the line closing the document may go on in the next block
+            if stop >= 0 or eof:
+                stop = len(buf) if stop < 0 else stop + 1
+                yield offset, buf[start:stop]
+                offset += stop - start
+                start = resume = stop
+                closing, close = None, -1
+                continue
+        if eof:
+            return
+        blocks = [buf[start:]]
+        tail = blocks[0][-len(closing):] if closing is not None and close < 0 else None
+        while True:
+            block = f.read(blocksize)
+            eof = not block
+            blocks.append(block)
+            if tail is None or eof or closing in block or closing in tail + block[:len(closing)]:
+                break
+            tail = (tail + block[-len(closing):])[-len(closing):]
+        buf = ''.join(blocks)
+        resume -= start
+        if close >= 0:
+            close -= start
+        start = 0
+
+
+def skip(f, length, blocksize=2**20):
+    """
+    Reads and discards the next [length] bytes of the file-like object [f]
+    """
+    while length > 0:
+        block = f.read(min(length, blocksize))
+        if not block:
+            return
+        length -= len(block)
+
+
+def is_archive(filename):
+    return filename.lower().endswith('.zip')
+
+
+def archive_member(filename):
+    """
+    Returns the name of the XML file in the zip archive [filename]
+    """
+    with zipfile.ZipFile(filename) as archive:
+        return _xml_member(archive, filename)
+
+
+def _xml_member(archive, filename):
+    for name in archive.namelist():
+        if name.lower().endswith('.xml'):
+            return name
+    raise IOError("{0} holds no XML file".format(filename))
+
+
+class MappedReader(object):
+    """
+    Reads the documents of an XML file through a memory mapping of it (see
+    map_file). Readers are returned by open_reader; spans(offset) returns the
+    (offset, length) spans of the documents after [offset], as document_spans,
+    and read(offset, length) returns a span of the file as a string
+    """
+
+    def __init__(self, filename):
+        self.mm = map_file(filename)
+
+    def spans(self, offset=0):
+        return document_spans(self.mm, offset)
+
+    def read(self, offset, length):
+        return self.mm[offset:offset+length]
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ArchiveReader(MappedReader):
+    """
+    Same as MappedReader, for the XML file in the zip archive [filename],
+    which is decompressed as it is read. read() is meant to be called with
+    increasing offsets, as the spans are in order: going back means starting
+    again from the beginning of the XML file. spans() reads the XML file
+    separately, so the two can be used together
+    """
+
+    def __init__(self, filename):
+        self.archive = zipfile.ZipFile(filename)
+        self.member = _xml_member(self.archive, filename)
+        self.file = None
+        self.position = 0
+
+    def spans(self, offset=0):
+        with self.archive.open(self.member) as f:
+            for start, doc in stream_documents(f, offset):
+                yield start, len(doc)
+
+    def read(self, offset, length):
+        if self.file is None or offset < self.position:
+            if self.file is not None:
+                self.file.close()
+            self.file = self.archive.open(self.member)
+            self.position = 0
+        skip(self.file, offset - self.position)
+        data = self.file.read(length)
+        self.position = offset + len(data)
+        return data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        self.archive.close()
+
+
+def open_reader(filename):
+    """
+    Returns an ArchiveReader for the zip archive [filename], or a
+    MappedReader for any other file
+    """
+    if is_archive(filename):
+        return ArchiveReader(filename)
+    return MappedReader(filename)
+
+
+def map_file(filename):
+    """
+    Memory-maps [filename] read-only and returns the mapping. The mapping
+    stays valid after the file itself is closed. Empty files (which cannot
+    be mapped) are returned as an empty string
+    """
+    with open(filename, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # zero-length file
+            return ''
+
+
+@contextmanager
+def mapped_file(filename):
+    """
+    Context manager around map_file that closes the mapping on exit
+    """
+    mm = map_file(filename)
+    try:
+        yield mm
+    finally:
+        if mm:
+            mm.close()
+
+
+def split_file(filename, offset=0):
+    """
+    Given a string [filename], returns a generator that yields a tuple
+    (offset, xmldoc buffer) for every XML document in the file. The buffers
+    are zero-copy views on the memory-mapped file and are only valid while
+    the generator is being consumed; call str() on a buffer to keep it.
+    For a zip archive, the documents of its XML file are yielded as strings
+    """
+    if is_archive(filename):
+        with zipfile.ZipFile(filename) as archive:
+            with archive.open(_xml_member(archive, filename)) as f:
+                for start, doc in stream_documents(f, offset):
+                    yield start, doc
+        return
+    with mapped_file(filename) as mm:
+        for start, length in document_spans(mm, offset):
+            yield start, buffer(mm, start, length)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+Intermediate store for parsed documents, so the database can be loaded again
+(e.g. after a change to the schema or to clean/consolidate) without parsing
+the XML again. parse.py writes the Patobj records of every source file it
+parses to a file of its own in the store directory (see parse.py --store),
+and can load the database from those files instead of the XML (--from-store).
+
+A store file (<source file name>.records) is:
+
+    'PATOBJS1'   magic number and format version
+    header       length-prefixed pickle of {'doctype', 'source', 'fields'}
+    batch ...    length-prefixed, zlib-compressed pickle of one batch
+
+Lengths are 4 byte big-endian unsigned integers. A batch holds up to
+`batch_size` records by column: a dictionary from each record field (pat,
+claims, inventor_list, ...) to the list of its values, one per record. The
+file is written under a temporary name and renamed when it is complete, so
+a store file is never partial. Store files are pickles, so only read ones
+written by parse.py.
+"""
+
+import os
+import zlib
+import struct
+import cPickle as pickle
+from handlers.handler import GrantRecord, ApplicationRecord
+
+magic = 'PATOBJS1'
+length = struct.Struct('>I')
+records = {'grant': GrantRecord, 'application': ApplicationRecord}
+
+
+def store_path(directory, filename):
+    """
+    Returns the path of the store file in [directory] for the XML file
+    [filename]
+    """
+    return os.path.join(directory, os.path.basename(filename) + '.records')
+
+
+def list_store(directory):
+    """
+    Returns the store files in [directory], in name order
+    """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith('.records'))
+
+
+class RecordWriter(object):
+    """
+    Writes the [doctype] records parsed from the XML file [source] to the
+    store file [path]. Records are added with add(); close() writes the last
+    batch and puts the file in place. Can be used as a context manager, which
+    only puts the file in place if no exception was raised
+    """
+
+    def __init__(self, path, doctype, source, batch_size=1000, compression=1):
+        self.path = path
+        self.tmppath = path + '.tmp'
+        self.fields = records[doctype].__slots__
+        self.batch_size = batch_size
+        self.compression = compression
+        self.count = 0
+        self.batch = []
+        self.file = open(self.tmppath, 'wb')
+        self.file.write(magic)
+        self.write_block(pickle.dumps({'doctype': doctype, 'fields': self.fields,
+                                       'source': os.path.basename(source)}, 2))
+
+    def write_block(self, data):
+        self.file.write(length.pack(len(data)))
+        self.file.write(data)
+
+    def add(self, patobj):
+        self.batch.append(patobj)
+        self.count += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the records added since the last batch as a batch
+        """
+        if not self.batch:
+            return
+        columns = dict((field, [getattr(patobj, field) for patobj in self.batch])
+                       for field in self.fields)
+        self.write_block(zlib.compress(pickle.dumps(columns, 2), self.compression))
+        del self.batch[:]
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        os.rename(self.tmppath, self.path)
+
+    def abort(self):
+        """
+        Closes and removes the partially written file
+        """
+        self.file.close()
+        os.remove(self.tmppath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_block(f):
+    prefix = f.read(length.size)
+    if not prefix:
+        return None
+    if len(prefix) < length.size:
+        raise IOError("truncated store file {0}".format(f.name))
+    size, = length.unpack(prefix)
+    data = f.read(size)
+    if len(data) < size:
+        raise IOError("truncated store file {0}".format(f.name))
+    return data
+
+
+def read_header(path):
+    """
+    Returns the header of the store file [path]: a dictionary with the
+    doctype of its records, the fields they have and the source XML file
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise IOError("{0} is not a store file".format(path))
+        return pickle.loads(read_block(f))
+
+
+def read_records(path):
+    """
+    Yields the Patobj records in the store file [path], in the order they
+    were added
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise IOError("{0} is not a store file".format(path))
+        header = pickle.loads(read_block(f))
+        record = records[header['doctype']]
+        fields = header['fields']
+        for data in iter(lambda: read_block(f), None):
+            columns = pickle.loads(zlib.decompress(data))
+            for values in zip(*[columns[field] for field in fields]):
+                patobj = record()
+                for field, value in zip(fields, values):
+                    setattr(patobj, field, value)
+                yield patobj
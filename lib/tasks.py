@@ -3,9 +3,8 @@ This module uses the Celery task manager to dispatch parallel database tasks to
 of performing multiple updates over multiple tables.
 """
 import celery
-from alchemy.match import commit_inserts, commit_updates
+from alchemy.match import commit_inserts, commit_updates, commit_mysql_updates
 from alchemy import session_generator
-from alchemy.schema import temporary_update
 from sqlalchemy import create_engine, MetaData, Table, inspect, VARCHAR, Column
 from sqlalchemy.orm import sessionmaker
 
@@ -21,10 +20,12 @@ def celery_commit_inserts(insert_statements, table, is_mysql, commit_frequency =
     column for a table.
 
     A session is generated using the scoped_session factory through SQLAlchemy, and then
-    the actual lib.alchemy.match.commit_inserts task is dispatched.
+    the actual lib.alchemy.match.commit_inserts task is dispatched. Called directly, it accepts
+    a generator of rows like commit_inserts does; dispatched through Celery (.delay), the rows
+    must be a list, which is sent to the worker.
 
     Args:
-    insert_statements -- list of dictionaries where each dictionary contains key-value pairs of the object
+    insert_statements -- iterable of dictionaries where each dictionary contains key-value pairs of the object, or of tuples
     table -- SQLAlchemy table object. If you have a table reference, you can use TableName.__table__
     is_mysql -- adjusts syntax based on if we are committing to MySQL or SQLite. You can use alchemy.is_mysql() to get this
     commit_frequency -- tune this for speed. Runs "session.commit" every `commit_frequency` items
@@ -43,27 +44,23 @@ def celery_commit_updates(update_key, update_statements, table, is_mysql, commit
     is specified as a string by the argument `update_key`.
 
     If is_mysql is True, then the update will be performed by inserting the record updates
-    into the table temporary_update and then executing an UPDATE/JOIN. If is_mysql is False,
-    then SQLite is assumed, and traditional updates are used (lib.alchemy.match.commit_updates)
+    into the table temporary_update and then executing an UPDATE/JOIN (see
+    lib.alchemy.match.commit_mysql_updates). If is_mysql is False,
+    then SQLite is assumed, and the updates are applied from a temporary table by
+    lib.alchemy.match.commit_updates
 
     A session is generated using the scoped_session factory through SQLAlchemy, and then
-    the actual task is dispatched.
+    the actual task is dispatched. As with celery_commit_inserts, the updates may be (pk, update)
+    tuples and, unless dispatched through Celery, a generator.
 
     Args:
     update_key -- the name of the column we want to update
-    update_statements -- list of dictionaries of updates. See above description
+    update_statements -- iterable of dictionaries or tuples of updates. See above description
     table -- SQLAlchemy table object. If you have a table reference, you can use TableName.__table
     commit_frequency -- tune this for speed. Runs "session.commit" every `commit_frequency` items
     """
     session = session_generator()
-    if not is_mysql:
+    if is_mysql:
+        commit_mysql_updates(session, update_key, update_statements, table, commit_frequency)
+    else:
         commit_updates(session, update_key, update_statements, table, commit_frequency)
-        return
-    commit_inserts(session, update_statements, temporary_update, is_mysql, 10000)
-    # now update using the join
-    primary_key = table.primary_key.columns.values()[0]
-    update_key = table.columns[update_key]
-    session.execute("UPDATE {0} join temporary_update ON temporary_update.pk = {1} SET {2} = temporary_update.update;".format(table.name, primary_key.name, update_key.name ))
-    session.commit()
-    session.execute("truncate temporary_update;")
-    session.commit()
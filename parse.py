@@ -1,18 +1,53 @@
 #!/usr/bin/env python
 
 import logging
+import multiprocessing
 import os
 import datetime
 import re
 import sys
+import time
+import Queue
+import traceback
 import lib.argconfig_parse as argconfig_parse
 import lib.alchemy as alchemy
+import lib.splitter as splitter
+import lib.store as store
+import lib.pipeline as pipeline
 import shutil
-from lib.config_parser import get_xml_handlers
+from lib.config_parser import get_handler_registry
+from lib.metrics import Metrics, JSONLinesReporter
+import lib.handlers.xml_driver as xml_driver
+import lib.handlers.handler as patent_handler
 
 logfile = "./" + 'xml-parsing.log'
 logging.basicConfig(filename=logfile, level=logging.DEBUG)
 commit_frequency = alchemy.get_config().get('parse').get('commit_frequency')
+# 'bulk' or 'orm', see lib/alchemy/config.ini
+loader = alchemy.get_config().get('parse').get('loader', 'bulk')
+# number of parsed records each worker process may have waiting for the writer
+queue_size = alchemy.get_config().get('parse').get('queue_size', 100)
+# number of batches being committed while the next one is parsed, see lib/pipeline.py
+pipeline_depth = alchemy.get_config().get('parse').get('pipeline_depth', 1)
+# skip unchanged files and resume partially loaded ones, see lib/alchemy/manifest.py
+use_manifest = alchemy.get_config().get('parse').get('manifest', True)
+# 'sax' or 'lxml', see lib/alchemy/config.ini
+xml_driver.set_engine(alchemy.get_config().get('parse').get('xml_engine', 'sax'))
+# per-stage metrics of the run (see set_metrics), None when not collected
+metrics = None
+
+
+def set_metrics(collector):
+    """
+    Makes [collector], a lib.metrics.Metrics, record the stages of the files
+    parsed from now on (None stops recording). It is installed in every
+    instrumented module: the handlers, the XML driver and the bulk loader
+    """
+    global metrics
+    metrics = collector
+    patent_handler.metrics = collector
+    xml_driver.metrics = collector
+    alchemy.bulk.metrics = collector
 
 
 def list_files(patentroot, xmlregex):
@@ -31,8 +66,11 @@ def list_files(patentroot, xmlregex):
 def _get_date(filename, dateformat='ipg%y%m%d.xml'):
     """
     Given a [filename], returns the expanded year.
-    The optional [dateformat] argument allows for different file formats
+    The optional [dateformat] argument allows for different file formats.
+    For a zip archive, the date is read from the name of the XML file in it
     """
+    if splitter.is_archive(filename):
+        filename = splitter.archive_member(filename)
     filename = re.search(r'ip[ag]\d{6}', filename) or re.search(r'p[ag]\d{6}', filename)
     if not filename:
         return 'default'
@@ -46,37 +84,32 @@ def _get_parser(date, doctype='grant'):
     Given a [date], returns the class of parser needed
     to parse it
     """
-    xmlhandlers = get_xml_handlers('process.cfg', doctype)
-    for daterange in xmlhandlers.iterkeys():
-        if daterange[0] <= date <= daterange[1]:
-            return xmlhandlers[daterange]
-    return xmlhandlers['default']
+    return get_handler_registry('process.cfg', doctype).lookup(date)
+
+
+def register_parser(start, end, handler, doctype='grant'):
+    """
+    Registers the handler module [handler] (or its dotted name) to parse
+    [doctype] documents dated from [start] to [end] (YYYYMMDD integers,
+    [end] may be float('inf')), in addition to the handlers configured in
+    process.cfg. See lib.config_parser.HandlerRegistry
+    """
+    get_handler_registry('process.cfg', doctype).register(start, end, handler)
 
 
 def extract_xml_strings(filename):
     """
     Given a string [filename], opens the file and returns a generator
     that yields tuples. A tuple is of format (year, xmldoc string). A tuple
-    is returned for every valid XML doc in [filename]
-    """
-    # search for terminating XML tag
-    endtag_regex = re.compile('^<!DOCTYPE (.*) SYSTEM')
-    endtag = ''
-    with open(filename, 'r') as f:
-        doc = ''  # (re)initialize current XML doc to empty string
-        for line in f:
-            doc += line
-            endtag = endtag_regex.findall(line) if not endtag else endtag
-            if not endtag:
-                continue
-            terminate = re.compile('^</{0}>'.format(endtag[0]))
-            if terminate.findall(line):
-                yield (_get_date(filename), doc)
-                endtag = ''
-                doc = ''
+    is returned for every valid XML doc in [filename], which may also be a
+    zip archive holding the XML file
+    """
+    date = _get_date(filename)
+    for offset, doc in splitter.split_file(filename):
+        yield (date, str(doc))
 
 
-def parse_files(filelist, doctype='grant'):
+def parse_files(filelist, doctype='grant', workers=1, store_directory=None, tsv_directory=None):
     """
     Takes in a list of patent file names (from __main__() and start.py) and commits
     them to the database. This method is designed to be used sequentially to
@@ -84,39 +117,406 @@ def parse_files(filelist, doctype='grant'):
     determines the frequency with which we commit the objects to the database.
     If set to 0, it will commit after all patobjects have been added.  Setting
     `commit_frequency` to be low (but not 0) is helpful for low memory machines.
+    If [workers] is greater than 1, the XML parsing is spread over that many
+    processes (see parse_files_parallel). If [store_directory] is given, the
+    records of every file are also written there (see lib/store.py). If
+    [tsv_directory] is given, the records are written to tab-separated files
+    there instead of the database (see _get_writer)
     """
     if not filelist:
         return
-    commit = alchemy.commit
+    if workers > 1:
+        return parse_files_parallel(filelist, doctype, workers, store_directory, tsv_directory)
+    add, commit = _get_writer(doctype, tsv_directory)
     for filename in filelist:
         print filename
-        for i, xmltuple in enumerate(extract_xml_strings(filename)):
-            patobj = parse_patent(xmltuple, doctype)
-            if doctype == 'grant':
-                alchemy.add_grant(patobj)
-                commit = alchemy.commit
-            else:
-                alchemy.add_application(patobj)
-                commit = alchemy.commit_application
+        date = _get_date(filename)
+        handler = _get_parser(date, doctype)
+        if metrics:
+            metrics.start_file(filename)
+        with splitter.open_reader(filename) as reader:
+            progress = _get_progress(filename, reader, handler, doctype, tsv_directory)
+            if not progress:
+                # already loaded, reported with no documents
+                if metrics:
+                    metrics.end_file()
+                continue
+            writer = _get_store_writer(store_directory, filename, progress, doctype)
+            for i, (offset, length) in enumerate(progress.spans):
+                patobj = _parse_span(reader, offset, length, date, doctype, handler)
+                if patobj:
+                    add(patobj)
+                    if writer:
+                        writer.add(patobj)
+                progress.add(offset, length)
+                if commit_frequency and ((i+1) % commit_frequency == 0):
+                    commit([progress.checkpoint()])
+                    logging.info("{0} - {1} - {2}".format(filename, progress.documents, datetime.datetime.now()))
+                    print " *", progress.documents, datetime.datetime.now()
+                    if metrics:
+                        metrics.batch(progress.documents)
+        commit([progress.checkpoint()], wait=True)
+        if writer:
+            writer.close()
+        if metrics:
+            metrics.end_file()
+        print " *", "Complete", datetime.datetime.now()
+    if metrics:
+        metrics.end_run()
+
+
+def _parse_span(reader, offset, length, date, doctype='grant', handler=None):
+    """
+    Reads the document spanning [length] bytes from [offset] with [reader]
+    (see splitter.open_reader) and parses it with parse_patent, recording
+    the time of both in `metrics` if it is set
+    """
+    if metrics is None:
+        return parse_patent((date, reader.read(offset, length)), doctype, handler)
+    start = time.time()
+    xml = reader.read(offset, length)
+    read = time.time()
+    patobj = parse_patent((date, xml), doctype, handler)
+    metrics.add('read', read - start)
+    metrics.add('parse', time.time() - read)
+    metrics.add_document(length)
+    return patobj
+
+
+def load_store(store_directory, doctype='grant', tsv_directory=None):
+    """
+    Loads the [doctype] records in the store files in [store_directory]
+    (written by parse_files, see lib/store.py) into the database, or into
+    tab-separated files in [tsv_directory], without parsing any XML,
+    committing every `commit_frequency` records
+    """
+    add, commit = _get_writer(doctype, tsv_directory)
+    for path in store.list_store(store_directory):
+        if store.read_header(path)['doctype'] != doctype:
+            continue
+        print path
+        if metrics:
+            metrics.start_file(path)
+        for i, patobj in enumerate(store.read_records(path)):
+            add(patobj)
             if commit_frequency and ((i+1) % commit_frequency == 0):
                 commit()
-                logging.info("{0} - {1} - {2}".format(filename, (i+1), datetime.datetime.now()))
-                print " *", (i+1), datetime.datetime.now()
-        commit()
+                logging.info("{0} - {1} - {2}".format(path, i+1, datetime.datetime.now()))
+                print " *", i+1, datetime.datetime.now()
+                if metrics:
+                    metrics.batch(i+1)
+        commit(wait=True)
+        if metrics:
+            metrics.end_file()
         print " *", "Complete", datetime.datetime.now()
+    if metrics:
+        metrics.end_run()
+
+
+def _get_store_writer(store_directory, filename, progress, doctype='grant'):
+    """
+    Returns a store.RecordWriter for the records parsed from [filename], or
+    None if there is no [store_directory]. A file that is resumed part way
+    (see _get_progress) is not written to the store, as its store file would
+    miss the documents loaded before
+    """
+    if not store_directory:
+        return
+    if progress.frontier:
+        print " *", "Not written to the store when resuming"
+        return
+    if not os.path.exists(store_directory):
+        os.makedirs(store_directory)
+    return store.RecordWriter(store.store_path(store_directory, filename), doctype, filename,
+                              commit_frequency or 1000)
+
+
+def _get_progress(filename, reader, handler, doctype='grant', tsv_directory=None):
+    """
+    Looks up the manifest entry of [filename] (read by [reader], see
+    splitter.open_reader) and returns a manifest.FileProgress for it, with the
+    document spans still to be loaded as its `spans` attribute. Returns None if the file is complete
+    and unchanged. If the manifest is turned off in config.ini, or the records
+    go to the tab-separated files in [tsv_directory], every file is loaded
+    from the start
+    """
+    entry = None
+    if use_manifest and not tsv_directory:
+        entry = alchemy.get_manifest_entry(filename, handler, doctype)
+    if entry and entry.complete:
+        print " *", "Unchanged, {0} documents already loaded".format(entry.documents)
+        return
+    start = time.time()
+    spans = list(reader.spans(entry.offset if entry else 0))
+    if metrics:
+        metrics.add('split', time.time() - start, len(spans))
+    progress = alchemy.manifest.FileProgress(entry, sum(spans[-1]) if spans else 0)
+    progress.spans = spans
+    if entry and entry.offset:
+        print " *", "Resuming after {0} documents".format(entry.documents)
+    return progress
+
+
+def _get_writer(doctype='grant', tsv_directory=None):
+    """
+    Returns a tuple of functions (add, commit) used to write [doctype] Patobj
+    records to the database: add is called for every record and commit every
+    `commit_frequency` records. commit(stages) first runs the functions in
+    [stages] (manifest.FileProgress checkpoints), so that the manifest is
+    written in the same transaction as the records it accounts for.
+    With the 'bulk' loader, add only collects the record and commit writes
+    everything collected with alchemy.add_grants or alchemy.add_applications.
+    If [tsv_directory] is given, commit instead appends the collected records
+    to one tab-separated file per table there, which starcluster/load.sql
+    loads with LOAD DATA INFILE (see lib/alchemy/tsv.py). The files are
+    started over by every call to _get_writer, and closed by
+    commit(wait=True). Both run on a separate thread while the next batch is
+    parsed, with up to `pipeline_depth` batches in flight (see
+    lib/pipeline.py); commit(wait=True) waits until everything collected so
+    far is written, and has to be called before the session is used by the
+    caller again. A commit that fails is rolled back along with the manifest
+    progress it carries (see _commit_session), and its error is raised by the
+    next call to commit, so that a file is never recorded as loaded past a
+    batch that was not written.
+    With the 'orm' loader, records are added through the ORM one at a time
+    and commit writes them right away
+    """
+    if loader == 'orm' and not tsv_directory:
+        add_record = alchemy.add_grant if doctype == 'grant' else alchemy.add_application
+        def add(patobj):
+            if metrics is None:
+                return add_record(patobj)
+            start = time.time()
+            add_record(patobj)
+            metrics.add('write', time.time() - start, 0)
+        def commit(stages=(), wait=False):
+            start = time.time()
+            for stage in stages:
+                stage()
+            _commit_session(doctype)
+            if metrics:
+                metrics.add('write', time.time() - start)
+        return add, commit
+    close = None
+    if tsv_directory:
+        writer = alchemy.tsv.TSVWriter(tsv_directory, doctype)
+        close = writer.close
+        def write(records):
+            writer.add_all(records)
+            writer.flush()
+    else:
+        add_all = alchemy.add_grants if doctype == 'grant' else alchemy.add_applications
+        def write(records):
+            if records:
+                add_all(records)
+            else:
+                _commit_session(doctype)  # manifest progress may still be pending
+    batch = []
+    committer = pipeline.Committer(pipeline_depth)
+    def commit(stages=(), wait=False):
+        records = batch[:]
+        del batch[:]
+        def job():
+            start = time.time()
+            for stage in stages:
+                stage()
+            write(records)
+            if metrics:
+                metrics.add('write', time.time() - start)
+        committer.submit(job)
+        if wait:
+            try:
+                committer.join()
+            finally:
+                if close:
+                    close()
+    return batch.append, commit
+
+
+def _commit_session(doctype='grant'):
+    """
+    Commits the grantsession or appsession of [doctype] for _get_writer.
+    Unlike alchemy.commit and alchemy.commit_application, which print the
+    error and go on, a commit that fails is rolled back and its error is
+    raised
+    """
+    session = alchemy.grantsession if doctype == 'grant' else alchemy.appsession
+    try:
+        session.commit()
+    except Exception, e:
+        session.rollback()
+        # staged changes outlive the rollback, see bulk.insert_rows
+        session.expire_all()
+        logging.error(e)
+        raise
+
+
+def _parse_worker(tasks, records, doctype):
+    """
+    Body of a parse_files_parallel worker process. Reads spans of the form
+    (filename, date, offset, length) from the [tasks] queue until it gets None,
+    parses the XML document in each span and puts a tuple (filename, offset,
+    length, record) on the [records] queue, where record is the resulting
+    Patobj, or None if the document could not be parsed.
+    Puts None on [records] when done, also if it fails, after a tuple
+    ('error', traceback) for the calling process to raise
+    """
+    filename, reader = None, None
+    try:
+        if metrics:
+            set_metrics(Metrics(None))
+        for name, date, offset, length in iter(tasks.get, None):
+            if name != filename:
+                if reader:
+                    reader.close()
+                    reader = None
+                filename, reader = name, splitter.open_reader(name)
+                handler = _get_parser(date, doctype)
+                if metrics:
+                    metrics.set_file(name)
+            patobj = _parse_span(reader, offset, length, date, doctype, handler)
+            records.put((name, offset, length, patobj))
+        if metrics:
+            records.put(('metrics', metrics.files))
+    except Exception:
+        records.put(('error', traceback.format_exc()))
+    finally:
+        if reader:
+            reader.close()
+        records.put(None)
+
+
+def _check_workers(processes):
+    """
+    Raises an error if one of the worker [processes] of parse_files_parallel
+    has died, e.g. killed by the system, without putting its None on the
+    records queue
+    """
+    for process in processes:
+        if process.exitcode:
+            raise RuntimeError("parse worker {0} exited with {1}".format(process.pid, process.exitcode))
 
 
-def parse_patent(xmltuple, doctype='grant'):
+def parse_files_parallel(filelist, doctype='grant', workers=2, store_directory=None,
+                         tsv_directory=None):
+    """
+    Same as parse_files, but the XML documents are parsed by [workers] separate
+    processes. The document spans of each file (see lib/splitter.py) are handed
+    out to the workers, which send back the Patobj records over a
+    bounded queue. The calling process is the only writer: it owns the
+    grantsession/appsession and adds and commits the records, so SQLite only
+    ever sees one connection writing. Records come back in any order, so the
+    manifest only records a file as loaded up to its first document that is
+    still being parsed. A worker reads a zip archive front to back, skipping
+    the documents handed to the other workers. If a worker fails, the others
+    are stopped and its error is raised
+    """
+    get_handler_registry('process.cfg', doctype)  # build once, before forking
+    tasks = multiprocessing.Queue()
+    records = multiprocessing.Queue(maxsize=workers * queue_size)
+    processes = [multiprocessing.Process(target=_parse_worker, args=(tasks, records, doctype))
+                 for i in range(workers)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+    try:
+        _load_parallel(filelist, doctype, processes, tasks, records, store_directory, tsv_directory)
+    except:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        raise
+
+
+def _load_parallel(filelist, doctype, processes, tasks, records, store_directory=None,
+                   tsv_directory=None):
+    """
+    The calling process's part of parse_files_parallel: hands out the spans
+    of the files in [filelist] on the [tasks] queue to the worker [processes]
+    and writes the records they put on the [records] queue
+    """
+    add, commit = _get_writer(doctype, tsv_directory)
+    files = {}
+    writers = {}
+    for filename in filelist:
+        print filename
+        date = _get_date(filename)
+        if metrics:
+            metrics.set_file(filename)
+        with splitter.open_reader(filename) as reader:
+            progress = _get_progress(filename, reader, _get_parser(date, doctype), doctype, tsv_directory)
+        if not progress:
+            continue
+        files[filename] = progress
+        writers[filename] = _get_store_writer(store_directory, filename, progress, doctype)
+        for offset, length in progress.spans:
+            tasks.put((filename, date, offset, length))
+    for process in processes:
+        tasks.put(None)
+    if metrics:
+        # the commits are not counted towards any one file
+        metrics.set_file(None)
+
+    def checkpoints():
+        return [progress.checkpoint() for progress in files.itervalues()]
+
+    running = len(processes)
+    i = 0
+    while running:
+        try:
+            record = records.get(timeout=1)
+        except Queue.Empty:
+            _check_workers(processes)
+            continue
+        if record is None:
+            running -= 1
+            continue
+        if len(record) == 2:
+            if record[0] == 'error':
+                raise RuntimeError("parse worker failed:\n" + record[1])
+            metrics.merge(record[1])
+            continue
+        filename, offset, length, patobj = record
+        writer = writers[filename]
+        if patobj:
+            add(patobj)
+            if writer:
+                writer.add(patobj)
+        files[filename].add(offset, length)
+        if writer and files[filename].complete:
+            writer.close()
+            writers[filename] = None
+        i += 1
+        if commit_frequency and (i % commit_frequency == 0):
+            commit(checkpoints())
+            logging.info("{0} workers - {1} - {2}".format(len(processes), i, datetime.datetime.now()))
+            print " *", i, datetime.datetime.now()
+            if metrics:
+                metrics.batch(i)
+    commit(checkpoints(), wait=True)
+    for process in processes:
+        process.join()
+    if metrics:
+        for filename in files:
+            metrics.end_file(filename)
+        metrics.end_run(workers=True)
+    print " *", "Complete", datetime.datetime.now()
+
+
+def parse_patent(xmltuple, doctype='grant', handler=None):
     """
     Parses an xml string given as [xmltuple] with the appropriate parser (given
-    by the first part of the tuple). Returns list of objects
+    by the first part of the tuple, unless the [handler] module has already
+    been resolved for the file). Returns list of objects
     to be inserted into the database using SQLAlchemy
     """
     if not xmltuple:
         return
     try:
         date, xml = xmltuple  # extract out the parts of the tuple
-        patent = _get_parser(date, doctype).Patent(xml, True)
+        if not handler:
+            handler = _get_parser(date, doctype)
+        patent = handler.Patent(xml, True)
     except Exception as inst:
         logging.error(inst)
         logging.error("  - Error parsing patent: %s" % (xml[:400]))
@@ -143,18 +543,36 @@ def move_tables(output_directory):
         print 'Database file {0} does not exist'.format(dbfile)
 
 
-def main(patentroot, xmlregex, verbosity, output_directory='.', doctype='grant'):
+def main(patentroot, xmlregex, verbosity, output_directory='.', doctype='grant', workers=1,
+         store_directory=None, from_store=False, tsv_directory=None, metrics_file=None):
     logfile = "./" + 'xml-parsing.log'
     logging.basicConfig(filename=logfile, level=verbosity)
+    if metrics_file:
+        set_metrics(Metrics(JSONLinesReporter(metrics_file)))
+
+    if from_store:
+        logging.info("Loading records from {0}".format(store_directory))
+        if tsv_directory:
+            load_store(store_directory, doctype, tsv_directory)
+        else:
+            with alchemy.bulk_load(doctype, defer_indexes=True):
+                load_store(store_directory, doctype)
+            move_tables(output_directory)
+        logging.info("Load completed at {0}".format(str(datetime.datetime.today())))
+        return
 
     logging.info("Starting parse on {0} on directory {1}".format(str(datetime.datetime.today()), patentroot))
     files = list_files(patentroot, xmlregex)
 
     logging.info("Found all files matching {0} in directory {1}".format(xmlregex, patentroot))
-    parse_files(files, doctype)
-    move_tables(output_directory)
-
-    logging.info("SQL tables moved to {0}".format(output_directory))
+    if tsv_directory:
+        parse_files(files, doctype, workers, store_directory, tsv_directory)
+        logging.info("Tables written to {0}".format(tsv_directory))
+    else:
+        with alchemy.bulk_load(doctype, defer_indexes=True):
+            parse_files(files, doctype, workers, store_directory)
+        move_tables(output_directory)
+        logging.info("SQL tables moved to {0}".format(output_directory))
     logging.info("Parse completed at {0}".format(str(datetime.datetime.today())))
 
 
@@ -166,5 +584,11 @@ if __name__ == '__main__':
     VERBOSITY = args.get_verbosity()
     PATENTOUTPUTDIR = args.get_output_directory()
     DOCUMENTTYPE = args.get_document_type()
+    WORKERS = args.get_workers()
+    STOREDIRECTORY = args.get_store_directory()
+    FROMSTORE = args.get_from_store()
+    TSVDIRECTORY = args.get_tsv_directory()
+    METRICSFILE = args.get_metrics_file()
 
-    main(PATENTROOT, XMLREGEX, VERBOSITY, PATENTOUTPUTDIR, DOCUMENTTYPE)
+    main(PATENTROOT, XMLREGEX, VERBOSITY, PATENTOUTPUTDIR, DOCUMENTTYPE, WORKERS,
+         STOREDIRECTORY, FROMSTORE, TSVDIRECTORY, METRICSFILE)
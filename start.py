@@ -7,13 +7,12 @@ import itertools
 import datetime
 import logging
 import requests
-import zipfile
-import cStringIO as StringIO
 from bs4 import BeautifulSoup as bs
 import lib.alchemy as alchemy
 
 sys.path.append('lib')
 from config_parser import get_config_options
+import download
 
 logfile = "./" + 'xml-parsing.log'
 logging.basicConfig(filename=logfile, level=logging.DEBUG)
@@ -66,38 +65,17 @@ def generate_download_list(years, doctype='grant'):
             a = a.findNext()
     return urls
 
-def download_files(urls):
+def download_files(urls, downloaddir, workers=4, extract=True):
     """
     [downloaddir]: string representing base download directory. Will download
-    files to this directory in folders named for each year
+    the files at [urls] to this directory with [workers] threads (see
+    lib/download.py), and extract their XML files if [extract] is True
     Returns: False if files were not downloaded or if there was some error,
     True otherwise
     """
-    import os
-    import requests
-    import zipfile
-    import cStringIO as StringIO
-    if not (downloaddir and urls): return False
-    complete = True
-    print 'downloading to',downloaddir
-    for url in urls:
-        filename = url.split('/')[-1].replace('zip','xml')
-        if filename in os.listdir(downloaddir):
-            print 'already have',filename
-            continue
-        print 'downloading',url
-        try:
-            r = requests.get(url)
-            z = zipfile.ZipFile(StringIO.StringIO(r.content))
-            print 'unzipping',filename
-            z.extractall(downloaddir)
-        except:
-            print 'ERROR: downloading or unzipping',filename
-            complete = False
-            continue
-    return complete
+    return download.download_files(urls, downloaddir, workers, extract_xml=extract)
 
-def run_parse(files, doctype='grant'):
+def run_parse(files, doctype='grant', workers=1):
     import parse
     import time
     import sys
@@ -106,7 +84,8 @@ def run_parse(files, doctype='grant'):
     import logging
     logfile = "./" + 'xml-parsing.log'
     logging.basicConfig(filename=logfile, level=logging.DEBUG)
-    parse.parse_files(files, doctype)
+    with alchemy.bulk_load(doctype, defer_indexes=True):
+        parse.parse_files(files, doctype, workers)
 
 def run_clean(process_config):
     if not process_config['clean']:
@@ -153,7 +132,7 @@ if __name__=='__main__':
     if downloaddir and not os.path.exists(downloaddir):
         os.makedirs(downloaddir)
     print 'Downloading files at {0}'.format(str(datetime.datetime.today()))
-    download_files(urls)
+    download_files(urls, downloaddir, parse_config['downloadworkers'], parse_config['extract'])
     print 'Downloaded files:',parse_config['years']
     f = datetime.datetime.now()
     print 'Finished downloading in {0}'.format(str(f-s))
@@ -163,14 +142,14 @@ if __name__=='__main__':
     if should_process_grants:
         files = parse.list_files(parse_config['datadir'],parse_config['grantregex'])
         print 'Running grant parse...'
-        run_parse(files, 'grant')
+        run_parse(files, 'grant', parse_config['workers'])
         f = datetime.datetime.now()
         print "Found {2} files matching {0} in directory {1}"\
                 .format(parse_config['grantregex'], parse_config['datadir'], len(files))
     if should_process_applications:
         files = parse.list_files(parse_config['datadir'],parse_config['applicationregex'])
         print 'Running application parse...'
-        run_parse(files, 'application')
+        run_parse(files, 'application', parse_config['workers'])
         f = datetime.datetime.now()
         print "Found {2} files matching {0} in directory {1}"\
                 .format(parse_config['applicationregex'], parse_config['datadir'], len(files))
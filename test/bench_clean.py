@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Measures the cost of xml_util.clean per parsed document. Run from the test
+directory:
+
+    python bench_clean.py [repeat]
+
+Every document of the fixtures (test/fixtures/xml and test/fixtures/ipgxml)
+is parsed once with its handler, recording the arguments of every call to
+xml_util.clean. The recorded calls are then replayed [repeat] times (default
+5) through xml_util.clean_string, which does every cleaning step on every
+string, and through xml_util.clean, which skips the strings that need no
+cleaning and caches short ones, and the fastest pass of each is reported in
+microseconds per document. Also checks that both give the same results.
+"""
+
+import os
+import sys
+import glob
+from timeit import default_timer as timer
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+import splitter
+import xml_util
+import grant_handler_v42
+import application_handler_v41
+import application_handler_v43
+
+testdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/xml/'))
+ipgdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/ipgxml/'))
+
+fixtures = [(os.path.join(ipgdir, '*.xml'), grant_handler_v42),
+            (os.path.join(testdir, 'ipg*.xml'), grant_handler_v42),
+            (os.path.join(testdir, 'ipa*.xml'), application_handler_v43),
+            (os.path.join(testdir, 'pa[0-9]*.xml'), application_handler_v41)]
+
+
+def record_calls():
+    """
+    Returns, for every fixture document, the list of (string, upper)
+    arguments xml_util.clean is called with while it is parsed
+    """
+    documents = []
+    clean = xml_util.clean
+    def recorder(string, upper=True):
+        documents[-1].append((string, upper))
+        return clean(string, upper)
+    xml_util.clean = recorder
+    try:
+        for pattern, handler in fixtures:
+            for filename in sorted(glob.glob(pattern)):
+                for offset, doc in splitter.split_file(filename):
+                    documents.append([])
+                    handler.Patent(str(doc), True).get_patobj()
+    finally:
+        xml_util.clean = clean
+    return documents
+
+
+def run(label, clean, documents, repeat):
+    """
+    Replays the calls in [documents] through [clean] [repeat] times, prints
+    the time per document of the fastest pass and returns the results
+    """
+    times = []
+    for i in range(repeat):
+        for cache in xml_util.clean_cache.values():
+            cache.__init__(cache.size)
+        start = timer()
+        results = [clean(string, upper) for calls in documents for string, upper in calls]
+        times.append(timer() - start)
+    print "{0:<12} {1:>6} docs {2:>8} calls {3:>8.3f}s {4:>10.1f} us/doc".format(
+        label, len(documents), len(results), min(times), min(times) / len(documents) * 1e6)
+    return results
+
+
+def main(repeat=5):
+    documents = record_calls()
+    results = [run('clean_string', xml_util.clean_string, documents, repeat),
+               run('clean', xml_util.clean, documents, repeat)]
+    assert results[0] == results[1]
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+Compares the two XML engines the handlers can parse documents with (see
+lib/handlers/xml_driver.py): 'sax' (xml.sax with expat) and 'lxml'
+(lib/handlers/lxml_driver.py). Run from the test directory:
+
+    python bench_driver.py [repeat] [application|grant]
+
+The application fixtures (test/fixtures/xml/ipa*.xml and pa*.xml) or the
+grant fixtures (test/fixtures/ipgxml) are split into documents, and every
+document is parsed into a Patobj with each engine, as parse.parse_patent
+does. This is repeated [repeat] times (default 5) and the fastest pass of
+each engine is reported in documents parsed per second. Also checks that both
+engines give the same records.
+"""
+
+import os
+import sys
+import glob
+from timeit import default_timer as timer
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+import splitter
+import xml_driver
+import grant_handler_v42
+import application_handler_v41
+import application_handler_v43
+
+testdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/xml/'))
+ipgdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/ipgxml/'))
+
+fixtures = {'application': [(os.path.join(testdir, 'ipa*.xml'), application_handler_v43),
+                            (os.path.join(testdir, 'pa[0-9]*.xml'), application_handler_v41)],
+            'grant': [(os.path.join(ipgdir, '*.xml'), grant_handler_v42)]}
+
+
+def documents(doctype):
+    """
+    Returns (handler, xml string) for every document of the [doctype] fixtures
+    """
+    docs = []
+    for pattern, handler in fixtures[doctype]:
+        for filename in sorted(glob.glob(pattern)):
+            docs.extend((handler, str(doc)) for offset, doc in splitter.split_file(filename))
+    return docs
+
+
+def run(engine, docs, repeat):
+    """
+    Parses [docs] [repeat] times with [engine], prints the documents parsed
+    per second in the fastest pass and returns the records of the last pass
+    """
+    xml_driver.set_engine(engine)
+    times = []
+    for i in range(repeat):
+        start = timer()
+        records = [handler.Patent(doc, True).get_patobj() for handler, doc in docs]
+        times.append(timer() - start)
+    print "{0:<6} {1:>6} docs {2:>8.3f}s {3:>10.1f} docs/sec".format(
+        engine, len(docs), min(times), len(docs) / min(times))
+    return [record.as_dict() for record in records]
+
+
+def main(repeat=5, doctype='application'):
+    docs = documents(doctype)
+    results = [run('sax', docs, repeat), run('lxml', docs, repeat)]
+    assert results[0] == results[1]
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+         sys.argv[2] if len(sys.argv) > 2 else 'application')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""
+Compares the two ways parse.py can write parsed documents to the database:
+the ORM path (alchemy.add_application / alchemy.add_grant, one merge per
+document) and the bulk path (alchemy.add_applications / alchemy.add_grants,
+one multi-row INSERT per table for a batch, see lib/alchemy/bulk.py).
+Run from the test directory:
+
+    python bench_loader.py [repeat] [application|grant]
+
+The application fixtures (test/fixtures/xml/ipa*.xml and pa*.xml) or the
+grant fixtures (test/fixtures/ipgxml) are parsed [repeat] times (default 50),
+renumbering each copy so that every document is new, and the records are
+loaded into an empty SQLite database both ways, committing every
+`commit_frequency` documents as parse.py does.
+"""
+
+import os
+import sys
+import glob
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+rootdir = os.path.realpath('..')
+sys.path.append(rootdir)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+testdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/xml/'))
+ipgdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/ipgxml/'))
+
+fixtures = {'application': [os.path.join(testdir, 'ipa*.xml'), os.path.join(testdir, 'pa[0-9]*.xml')],
+            'grant': [os.path.join(ipgdir, '*.xml')]}
+
+
+def renumber_rows(value, copy):
+    """
+    Appends [copy] to the row identifiers (uuid fields) inside [value]
+    """
+    if isinstance(value, dict):
+        if 'uuid' in value:
+            value['uuid'] = u'{0}-{1}'.format(value['uuid'], copy)
+        value = value.values()
+    if isinstance(value, list):
+        for item in value:
+            renumber_rows(item, copy)
+
+
+def parse_documents(parse, doctype, repeat):
+    """
+    Returns the list of Patobj records for [repeat] copies of the [doctype]
+    fixtures. Each copy is parsed again and gets its own document number and
+    row identifiers
+    """
+    objs = []
+    filenames = sorted(f for pattern in fixtures[doctype] for f in glob.glob(pattern))
+    for i in range(repeat):
+        for filename in filenames:
+            for xmltuple in parse.extract_xml_strings(filename):
+                obj = parse.parse_patent(xmltuple, doctype)
+                if not obj:
+                    continue
+                doc = obj.pat if doctype == 'grant' else obj.app
+                doc['number'] = u'{0}-{1}'.format(doc['number'], i)
+                doc['id'] = u'{0}-{1}'.format(doc['id'], i)
+                if doctype == 'grant':
+                    obj.patent = doc['number']
+                else:
+                    obj.application = doc['number']
+                renumber_rows(obj.as_dict().values(), i)
+                objs.append(obj)
+    return objs
+
+
+def load_orm(alchemy, doctype, objs, commit_frequency):
+    add = alchemy.add_grant if doctype == 'grant' else alchemy.add_application
+    commit = alchemy.commit if doctype == 'grant' else alchemy.commit_application
+    for i, obj in enumerate(objs):
+        add(obj)
+        if commit_frequency and ((i+1) % commit_frequency == 0):
+            commit()
+    commit()
+
+
+def load_bulk(alchemy, doctype, objs, commit_frequency):
+    add_all = alchemy.add_grants if doctype == 'grant' else alchemy.add_applications
+    size = commit_frequency or len(objs)
+    for i in range(0, len(objs), size):
+        add_all(objs[i:i+size])
+
+
+def run(label, load, alchemy, doctype, objs, tmpdir):
+    """
+    Loads [objs] with [load] into a new SQLite database and prints the time
+    taken and the number of rows written per second
+    """
+    engine = create_engine('sqlite:///{0}'.format(os.path.join(tmpdir, label+'.db')))
+    base = alchemy.schema.GrantBase if doctype == 'grant' else alchemy.schema.ApplicationBase
+    base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, _enable_transaction_accounting=False)()
+    if doctype == 'grant':
+        alchemy.grantsession = session
+    else:
+        alchemy.appsession = session
+    start = timer()
+    load(alchemy, doctype, objs, alchemy.get_config()['parse'].get('commit_frequency', 0))
+    elapsed = timer() - start
+    rows = sum(session.execute(table.count()).scalar() for table in base.metadata.sorted_tables)
+    session.close()
+    print "{0:<6} {1:>6} docs {2:>8} rows {3:>8.3f}s {4:>10.1f} rows/sec".format(
+        label, len(objs), rows, elapsed, rows / elapsed)
+    return rows
+
+
+def main(repeat=50, doctype='application'):
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        # importing alchemy opens the configured databases in the current directory
+        os.chdir(tmpdir)
+        import parse
+        import lib.alchemy as alchemy
+        # handlers are looked up in process.cfg
+        os.chdir(rootdir)
+        objs = parse_documents(parse, doctype, repeat)
+        counts = [run('orm', load_orm, alchemy, doctype, objs, tmpdir),
+                  run('bulk', load_bulk, alchemy, doctype, objs, tmpdir)]
+        assert len(set(counts)) == 1, counts
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+         sys.argv[2] if len(sys.argv) > 2 else 'application')
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks every stage of the parse path over the fixture corpora and keeps
+the results, so that a regression can be found by comparing two commits.
+Run from the test directory:
+
+    python bench_parse.py [--repeat N] [--doctype grant|application]
+    python bench_parse.py --compare BASE [HEAD]
+
+The grant corpus is test/fixtures/ipgxml and test/fixtures/xml/ipg120327.*,
+the application corpus test/fixtures/xml/ipa*.one.xml and pa040101.two.xml;
+between them they hold documents for every handler version in process.cfg.
+The stages of each corpus are:
+
+    split            splitting the files into documents (lib/splitter.py)
+    xml.<engine>     building the tree of every document with the sax and,
+                     if it is installed, the lxml engine. The lxml engine
+                     builds elements as they are read, so this is only the
+                     parse by libxml2; test/bench_driver.py compares the
+                     engines with the handlers reading the trees
+    handler.<name>   parsing the documents of one handler version into
+                     records, with the configured engine
+    load.bulk        loading the records into an empty SQLite database with
+                     the bulk loader, committing every `commit_frequency`
+
+Each stage runs [repeat] times (default 5) in a process of its own, so that
+its peak memory is its own, and the fastest pass is reported:
+
+    docs/sec         documents per second
+    peak_rss_kb      peak resident set size of the stage's process
+    rss_growth_kb    how much the stage grew it beyond the parsed corpus
+    objects          objects tracked by the garbage collector that the last
+                     pass left allocated (e.g. the records of a handler)
+    minor_faults     pages of memory the stage newly touched, in all passes
+
+Python 2 has no tracemalloc, so the last two stand in for allocations.
+Every stage is appended as a line of JSON to bench_results.jsonl (see
+--results), with the commit the tree is at (and whether it has uncommitted
+changes). --compare prints the docs/sec and peak memory of the latest results
+of commit BASE against those of HEAD (by default the current commit), marks
+the stages that got slower by more than --threshold percent and exits with 1
+if there are any.
+"""
+
+import gc
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import traceback
+import subprocess
+import multiprocessing
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+rootdir = os.path.realpath('..')
+sys.path.append(rootdir)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from lib.metrics import JSONLinesReporter, peak_rss, rate
+
+testdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/xml/'))
+ipgdir = os.path.realpath(os.path.join(os.curdir, 'fixtures/ipgxml/'))
+results_file = os.path.realpath(os.path.join(os.curdir, 'bench_results.jsonl'))
+
+corpora = OrderedDict([
+    ('grant', [os.path.join(ipgdir, '*.xml'), os.path.join(testdir, 'ipg120327.*.xml')]),
+    ('application', [os.path.join(testdir, 'ipa*.one.xml'), os.path.join(testdir, 'pa040101.two.xml')])])
+engines = ['sax', 'lxml']
+
+
+def current_commit():
+    """
+    Returns the abbreviated commit the tree is at, and whether tracked files
+    have changed since
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=rootdir).strip()
+        status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                         cwd=rootdir)
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def measure(run, repeat, setup=None):
+    """
+    Calls [run] [repeat] times in a child process, [setup] before each call
+    if it is given, and returns the seconds of the fastest call along with
+    the memory stats of the process (see the module documentation)
+    """
+    results = multiprocessing.Queue()
+    def child():
+        try:
+            gc.collect()
+            objects = len(gc.get_objects())
+            start_rss = peak_rss()
+            start_faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+            times = []
+            for i in range(repeat):
+                if setup:
+                    setup()
+                start = timer()
+                kept = run()
+                times.append(timer() - start)
+            results.put({'seconds': min(times),
+                         'peak_rss_kb': peak_rss(),
+                         'rss_growth_kb': peak_rss() - start_rss,
+                         'objects': len(gc.get_objects()) - objects,
+                         'minor_faults': resource.getrusage(resource.RUSAGE_SELF).ru_minflt - start_faults})
+            del kept
+        except Exception:
+            results.put(traceback.format_exc())
+    process = multiprocessing.Process(target=child)
+    process.start()
+    result = results.get()
+    process.join()
+    if isinstance(result, basestring):
+        raise RuntimeError(result)
+    return result
+
+
+def stages(parse, alchemy, doctype, tmpdir):
+    """
+    Yields (stage, documents, bytes, run, setup) for every stage of the
+    [doctype] corpus, see measure
+    """
+    import lib.splitter as splitter
+    import lib.handlers.xml_driver as xml_driver
+    filenames = sorted(f for pattern in corpora[doctype] for f in glob.glob(pattern))
+    size = sum(os.path.getsize(f) for f in filenames)
+    docs = [(filename, str(doc)) for filename in filenames
+            for offset, doc in splitter.split_file(filename)]
+    length = sum(len(xml) for filename, xml in docs)
+
+    yield 'split', len(docs), size, lambda: sum(1 for f in filenames for doc in splitter.split_file(f)), None
+
+    for engine in engines:
+        try:
+            xml_driver.set_engine(engine)
+            xml_driver.parse(docs[0][1], is_string=True)
+        except ImportError:
+            continue
+        def run_engine(engine=engine):
+            xml_driver.set_engine(engine)
+            # one tree at a time, as the handlers hold them
+            return sum(1 for filename, xml in docs if xml_driver.parse(xml, is_string=True))
+        yield 'xml.' + engine, len(docs), length, run_engine, None
+    xml_driver.set_engine(alchemy.get_config().get('parse').get('xml_engine', 'sax'))
+
+    handlers = OrderedDict()
+    for filename, xml in docs:
+        handler = parse._get_parser(parse._get_date(filename), doctype)
+        handlers.setdefault(handler, []).append(xml)
+    for handler, xmls in handlers.iteritems():
+        run_handler = lambda handler=handler, xmls=xmls: [handler.Patent(xml, True).get_patobj() for xml in xmls]
+        yield ('handler.' + handler.__name__.split('.')[-1], len(xmls), sum(map(len, xmls)),
+               run_handler, None)
+
+    objs = [parse.parse_patent((parse._get_date(filename), xml), doctype) for filename, xml in docs]
+    objs = [obj for obj in objs if obj]
+    base = alchemy.schema.GrantBase if doctype == 'grant' else alchemy.schema.ApplicationBase
+    add_all = alchemy.add_grants if doctype == 'grant' else alchemy.add_applications
+    size = alchemy.get_config()['parse'].get('commit_frequency', 0) or len(objs)
+    database = os.path.join(tmpdir, doctype + '.db')
+    def setup():
+        if os.path.exists(database):
+            os.remove(database)
+        engine = create_engine('sqlite:///{0}'.format(database))
+        base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine, _enable_transaction_accounting=False)()
+        if doctype == 'grant':
+            alchemy.grantsession = session
+        else:
+            alchemy.appsession = session
+    def load():
+        for i in range(0, len(objs), size):
+            add_all(objs[i:i+size])
+    yield 'load.bulk', len(objs), length, load, setup
+
+
+def run(repeat, doctypes, path):
+    commit, dirty = current_commit()
+    reporter = JSONLinesReporter(path)
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        # importing alchemy opens the configured databases in the current directory
+        os.chdir(tmpdir)
+        import parse
+        import lib.alchemy as alchemy
+        # handlers are looked up in process.cfg
+        os.chdir(rootdir)
+        print "commit {0}{1}, best of {2}".format(commit, ' (modified)' if dirty else '', repeat)
+        started = time.strftime('%Y-%m-%d %H:%M:%S')
+        for doctype in doctypes:
+            for stage, documents, size, run_stage, setup in stages(parse, alchemy, doctype, tmpdir):
+                stats = measure(run_stage, repeat, setup)
+                record = OrderedDict([
+                    ('commit', commit), ('modified', dirty), ('date', started),
+                    ('doctype', doctype), ('stage', stage), ('repeat', repeat),
+                    ('documents', documents), ('bytes', size),
+                    ('docs_per_sec', rate(documents, stats['seconds']))])
+                record.update(sorted(stats.items()))
+                reporter.report(record)
+                print "{0:<12} {1:<32} {2:>5} docs {3:>10.1f} docs/sec {4:>8} KB peak {5:>8} KB grown {6:>8} objects".format(
+                    doctype, stage, documents, record['docs_per_sec'], stats['peak_rss_kb'],
+                    stats['rss_growth_kb'], stats['objects'])
+    finally:
+        reporter.close()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def latest(path, commit):
+    """
+    Returns the latest results of [commit] (or of a commit it abbreviates)
+    in [path], by (doctype, stage)
+    """
+    results = OrderedDict()
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record['commit'].startswith(commit) or commit.startswith(record['commit']):
+                results[record['doctype'], record['stage']] = record
+    return results
+
+
+def compare(path, base, head, threshold):
+    """
+    Prints the results of [base] against those of [head] and returns the
+    number of stages that are more than [threshold] percent slower
+    """
+    before, after = latest(path, base), latest(path, head)
+    if not (before and after):
+        print "no results for", base if not before else head
+        return 1
+    print "{0:<12} {1:<32} {2:>12} {3:>12} {4:>8} {5:>10} {6:>10}".format(
+        'doctype', 'stage', base, head, 'change', 'KB peak', 'KB peak')
+    regressions = 0
+    for key, new in after.iteritems():
+        old = before.get(key)
+        if not old:
+            continue
+        change = 100.0 * (new['docs_per_sec'] - old['docs_per_sec']) / old['docs_per_sec']
+        slower = change < -threshold
+        regressions += slower
+        print "{0:<12} {1:<32} {2:>12.1f} {3:>12.1f} {4:>+7.1f}% {5:>10} {6:>10}{7}".format(
+            key[0], key[1], old['docs_per_sec'], new['docs_per_sec'], change,
+            old['peak_rss_kb'], new['peak_rss_kb'], '  slower' if slower else '')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the stages of the parse path.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of passes of every stage, the fastest is reported')
+    parser.add_argument('--doctype', choices=corpora.keys(), default=None,
+                        help='Corpus to run, by default both')
+    parser.add_argument('--results', default=results_file,
+                        help='File the results are appended to and compared from')
+    parser.add_argument('--compare', nargs='+', metavar='COMMIT',
+                        help='Compare the results of BASE to those of HEAD (the current commit)')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percentage of docs/sec a stage may lose before it is marked slower')
+    args = parser.parse_args()
+    if args.compare:
+        base = args.compare[0]
+        head = args.compare[1] if len(args.compare) > 1 else current_commit()[0]
+        sys.exit(1 if compare(args.results, base, head, args.threshold) else 0)
+    run(args.repeat, [args.doctype] if args.doctype else corpora.keys(), args.results)
+
+if __name__ == '__main__':
+    main()
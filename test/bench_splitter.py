@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+Compares the mmap-based document splitter in lib/splitter.py against the
+original line-by-line generator that parse.extract_xml_strings used to be.
+Run from the test directory:
+
+    python bench_splitter.py [repeat]
+
+[repeat] (default 10) is the number of times the test/fixtures/ipgxml files
+are concatenated together to simulate a full weekly file.
+"""
+
+import os
+import re
+import sys
+import glob
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.append('../lib/')
+import splitter
+
+ipgdir = os.path.join(os.curdir, 'fixtures/ipgxml/')
+
+
+def legacy_extract_xml_strings(filename):
+    """
+    The original parse.extract_xml_strings, kept here as the baseline
+    """
+    endtag_regex = re.compile('^<!DOCTYPE (.*) SYSTEM')
+    endtag = ''
+    with open(filename, 'r') as f:
+        doc = ''
+        for line in f:
+            doc += line
+            endtag = endtag_regex.findall(line) if not endtag else endtag
+            if not endtag:
+                continue
+            terminate = re.compile('^</{0}>'.format(endtag[0]))
+            if terminate.findall(line):
+                yield doc
+                endtag = ''
+                doc = ''
+
+
+def splitter_spans(filename):
+    with splitter.mapped_file(filename) as mm:
+        for span in splitter.document_spans(mm):
+            yield span
+
+
+def splitter_strings(filename):
+    with splitter.mapped_file(filename) as mm:
+        for offset, length in splitter.document_spans(mm):
+            yield mm[offset:offset+length]
+
+
+def run(label, generator, filename, size):
+    start = timer()
+    count = sum(1 for doc in generator(filename))
+    elapsed = timer() - start
+    print "{0:<20} {1:>6} docs {2:>8.3f}s {3:>10.1f} docs/sec {4:>8.1f} MB/sec".format(
+        label, count, elapsed, count / elapsed, size / elapsed / 2**20)
+    return count
+
+
+def main(repeat=10):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        weekly = os.path.join(tmpdir, 'ipg000000.xml')
+        with open(weekly, 'wb') as out:
+            for i in range(repeat):
+                for filename in sorted(glob.glob(ipgdir+'*.xml')):
+                    with open(filename, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+        size = os.path.getsize(weekly)
+        print "{0:.1f} MB file built from {1}".format(size / 2.0**20, ipgdir)
+        counts = [run('legacy', legacy_extract_xml_strings, weekly, size),
+                  run('splitter (spans)', splitter_spans, weekly, size),
+                  run('splitter (strings)', splitter_strings, weekly, size)]
+        assert len(set(counts)) == 1, counts
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
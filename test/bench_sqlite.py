@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""
+Compares loading a SQLite database with its default pragmas against loading
+it with the bulk load profile of lib/alchemy/config.ini ([sqlite-bulk],
+see alchemy.bulk_load), and with that profile and its secondary indexes
+deferred until the end of the load (see lib/alchemy/indexes.py). Run from
+the test directory:
+
+    python bench_sqlite.py [repeat] [commit_frequency]
+
+The weekly grant fixtures (test/fixtures/ipgxml) are parsed [repeat] times
+(default 10), renumbering each copy as bench_loader.py does, and loaded with
+the bulk loader into an empty database both ways, committing every
+[commit_frequency] documents (by default the configured one). The time of
+the load and that of finishing it (creating the deferred indexes, restoring
+the safe pragmas and analyzing the database) are reported separately.
+"""
+
+import os
+import sys
+import glob
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+from bench_loader import rootdir, fixtures, parse_documents
+
+
+def write_config(directory, database, profile, defer):
+    """
+    Writes the config.ini that makes alchemy keep the grant [database] in
+    [directory], loaded with the bulk [profile] or without, and with its
+    indexes deferred or not ([defer])
+    """
+    with open(os.path.join(directory, 'config.ini'), 'w') as f:
+        f.write('[sqlite]\npath = {0}\ngrant-database = {1}\nbulk-profile = {2}\n'.format(
+            directory, database, profile))
+        f.write('[parse]\ndefer_indexes = {0}\n'.format(defer))
+
+
+def run(label, profile, defer, alchemy, objs, commit_frequency, tmpdir):
+    write_config(tmpdir, label + '.db', profile, defer)
+    alchemy.reload_config()
+    alchemy.grantsession = alchemy.LazySession('grant')
+    start = timer()
+    with alchemy.bulk_load('grant', defer_indexes=True):
+        for i in range(0, len(objs), commit_frequency):
+            alchemy.add_grants(objs[i:i+commit_frequency])
+        loaded = timer()
+    finished = timer()
+    rows = sum(alchemy.grantsession.execute(table.count()).scalar()
+               for table in alchemy.schema.GrantBase.metadata.sorted_tables)
+    alchemy.grantsession.close()
+    print "{0:<9} {1:>6} docs {2:>8} rows {3:>8.3f}s load {4:>7.3f}s finish {5:>10.1f} docs/sec".format(
+        label, len(objs), rows, loaded - start, finished - loaded, len(objs) / (finished - start))
+    return rows
+
+
+def main(repeat=10, commit_frequency=None):
+    # not in /tmp, which may be a memory file system where syncing costs nothing
+    tmpdir = os.path.realpath(tempfile.mkdtemp(dir=os.curdir))
+    cwd = os.getcwd()
+    try:
+        # the local config.ini of alchemy is read from the current directory
+        os.chdir(tmpdir)
+        import parse
+        import lib.alchemy as alchemy
+        commit_frequency = commit_frequency or alchemy.get_config()['parse'].get('commit_frequency')
+        # handlers are looked up in process.cfg
+        os.chdir(rootdir)
+        objs = parse_documents(parse, 'grant', repeat)
+        commit_frequency = commit_frequency or len(objs)
+        os.chdir(tmpdir)
+        weeks = repeat * len(glob.glob(fixtures['grant'][0]))
+        print "{0} weekly files, committing every {1} documents".format(weeks, commit_frequency)
+        counts = [run('default', False, False, alchemy, objs, commit_frequency, tmpdir),
+                  run('bulk', True, False, alchemy, objs, commit_frequency, tmpdir),
+                  run('deferred', True, True, alchemy, objs, commit_frequency, tmpdir)]
+        assert len(set(counts)) == 1, counts
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+         int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+Compares the updates of lib/alchemy/match.commit_updates on SQLite, applied
+from a temporary table (commit_sqlite_updates), against executing one UPDATE
+per record, as the cleaning of assignees, lawyers and locations does for the
+raw tables. Run from the test directory:
+
+    python bench_updates.py [rows] [commit_frequency]
+
+A rawassignee table of [rows] records (default 200000) is updated in random
+order of its primary key, committing every [commit_frequency] updates
+(default 20000, as the cleaning does), both ways, with the default pragmas
+and inside alchemy.bulk_load (the bulk load profile of config.ini).
+"""
+
+import os
+import sys
+import uuid
+import random
+import shutil
+import tempfile
+from timeit import default_timer as timer
+from sqlalchemy.sql.expression import bindparam
+
+sys.path.append(os.path.realpath('..'))
+
+
+def row_updates(session, update_key, update_statements, table, commit_frequency):
+    """
+    Executes [update_statements] with one UPDATE per record, as commit_updates
+    does on MySQL
+    """
+    primary_key = table.primary_key.columns.values()[0]
+    u = table.update().where(primary_key == bindparam('pk')).values({table.columns[update_key]: bindparam('update')})
+    for i in range(0, len(update_statements), commit_frequency):
+        session.connection().execute(u, *update_statements[i:i+commit_frequency])
+        session.commit()
+
+
+def run(label, profile, commit, alchemy, ids, updates, commit_frequency, tmpdir):
+    database = label.replace(' ', '-') + '.db'
+    with open(os.path.join(tmpdir, 'config.ini'), 'w') as f:
+        f.write('[sqlite]\npath = {0}\ngrant-database = {1}\nbulk-profile = {2}\n'.format(
+            tmpdir, database, profile))
+    alchemy.reload_config()
+    table = alchemy.schema.RawAssignee.__table__
+    session = alchemy.fetch_session(dbtype='grant')
+    session.execute(table.insert(), [{'uuid': i, 'patent_id': u'1', 'sequence': 0} for i in ids])
+    session.commit()
+    session.close()
+    start = timer()
+    with alchemy.bulk_load('grant'):
+        session = alchemy.fetch_session(dbtype='grant')
+        # commit_updates prints every chunk it commits
+        sys.stdout, stdout = open(os.devnull, 'w'), sys.stdout
+        try:
+            commit(session, 'assignee_id', updates, table, commit_frequency)
+        finally:
+            sys.stdout = stdout
+        session.close()
+    seconds = timer() - start
+    session = alchemy.fetch_session(dbtype='grant')
+    values = dict(tuple(row) for row in session.execute('SELECT uuid, assignee_id FROM rawassignee'))
+    session.close()
+    print "{0:<20} {1:>8} rows {2:>8.3f}s {3:>10.1f} rows/sec".format(
+        label, len(updates), seconds, len(updates) / seconds)
+    return values
+
+
+def main(rows=200000, commit_frequency=20000):
+    # not in /tmp, which may be a memory file system where syncing costs nothing
+    tmpdir = os.path.realpath(tempfile.mkdtemp(dir=os.curdir))
+    cwd = os.getcwd()
+    try:
+        # the local config.ini of alchemy is read from the current directory
+        os.chdir(tmpdir)
+        import lib.alchemy as alchemy
+        from lib.alchemy.match import commit_updates
+        ids = [unicode(uuid.uuid4()) for i in range(rows)]
+        updates = [{'pk': i, 'update': unicode(uuid.uuid4())} for i in ids]
+        random.shuffle(updates)
+        results = []
+        for profile in (False, True):
+            for label, commit in (('rows', row_updates), ('set', commit_updates)):
+                results.append(run(('bulk ' if profile else 'default ') + label, profile, commit,
+                                   alchemy, ids, updates, commit_frequency, tmpdir))
+        assert all(values == results[0] for values in results)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
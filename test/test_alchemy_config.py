@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.append('../lib/')
+import alchemy
+
+class TestConfiguration(unittest.TestCase):
+
+    def setUp(self):
+        # a local config.ini, in the current directory, keeps the databases in tmpdir
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        self.write_config('grant.db')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+        alchemy.reload_config()
+
+    def write_config(self, database):
+        with open('config.ini', 'w') as f:
+            f.write('[sqlite]\npath = {0}\ngrant-database = {1}\n'.format(self.tmpdir, database))
+
+    def test_config_cached(self):
+        config = alchemy.get_config()
+        self.assertTrue(config['sqlite']['grant-database'] == 'grant.db')
+        self.assertTrue(config['parse']['commit_frequency'] == 1000)
+        self.write_config('other.db')
+        self.assertTrue(alchemy.get_config() is config)
+        alchemy.reload_config()
+        self.assertTrue(alchemy.get_config()['sqlite']['grant-database'] == 'other.db')
+
+    def test_engine_reused(self):
+        alchemy.reload_config()
+        engine = alchemy.get_engine(dbtype='grant')
+        self.assertTrue(alchemy.get_engine(dbtype='grant') is engine)
+        self.assertTrue(alchemy.fetch_session(dbtype='grant').bind is engine)
+        self.assertTrue(alchemy.session_generator(dbtype='grant')().bind is engine)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'grant.db')))
+        self.assertFalse(alchemy.get_engine(dbtype='application') is engine)
+        self.write_config('other.db')
+        alchemy.reload_config()
+        self.assertFalse(alchemy.get_engine(dbtype='grant') is engine)
+
+    def test_lazy_session(self):
+        alchemy.reload_config()
+        session = alchemy.LazySession('grant')
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'grant.db')))
+        self.assertTrue(session.query(alchemy.schema.Patent).count() == 0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'grant.db')))
+
+    def test_bulk_load(self):
+        alchemy.reload_config()
+        def pragma(name):
+            session = alchemy.fetch_session(dbtype='grant')
+            value = session.execute('PRAGMA ' + name).scalar()
+            session.close()
+            return value
+        self.assertTrue(pragma('journal_mode') == 'delete')
+        with alchemy.bulk_load('grant'):
+            self.assertTrue(pragma('journal_mode') == 'wal')
+            self.assertTrue(pragma('synchronous') == 0)
+            self.assertTrue(pragma('cache_size') == -262144)
+            session = alchemy.fetch_session(dbtype='grant')
+            session.execute(alchemy.schema.Patent.__table__.insert(), [{'id': u'1', 'number': u'1'}])
+            session.commit()
+            session.close()
+        self.assertTrue(pragma('journal_mode') == 'delete')
+        self.assertTrue(pragma('synchronous') == 2)
+        self.assertTrue(pragma('cache_size') != -262144)
+        self.assertTrue(pragma('table_info(sqlite_stat1)') is not None)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'grant.db-wal')))
+
+    def test_deferred_indexes(self):
+        alchemy.reload_config()
+        def indexes():
+            session = alchemy.fetch_session(dbtype='grant')
+            names = set(name for table, name in alchemy.indexes.existing_indexes(
+                        session.connection(), [alchemy.schema.Patent.__table__]))
+            session.close()
+            return names
+        self.assertTrue(indexes() == set(['pat_idx1', 'pat_idx2']))
+        with alchemy.bulk_load('grant', defer_indexes=True):
+            self.assertTrue(indexes() == set(['pat_idx1']))
+        self.assertTrue(indexes() == set(['pat_idx1', 'pat_idx2']))
+        # an interrupted load leaves them to the next phase
+        try:
+            with alchemy.bulk_load('grant', defer_indexes=True):
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        self.assertTrue(indexes() == set(['pat_idx1']))
+        with alchemy.bulk_load('grant'):
+            self.assertTrue(indexes() == set(['pat_idx1', 'pat_idx2']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+sys.path.append('../lib/alchemy/')
+import splitter
+import grant_handler_v42
+import application_handler_v43
+import schema
+import bulk
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+def parse_grants(filename):
+    return [grant_handler_v42.Patent(str(doc), True).get_patobj()
+            for offset, doc in splitter.split_file(testdir+filename)]
+
+def parse_applications(filename):
+    return [application_handler_v43.Patent(str(doc), True).get_patobj()
+            for offset, doc in splitter.split_file(testdir+filename)]
+
+class TestBulkGrants(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        schema.GrantBase.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.patobjs = parse_grants('ipg120327.18.xml')
+
+    def count(self, table):
+        return self.session.query(table).count()
+
+    def test_grant_rows(self):
+        rows = bulk.grant_rows(self.patobjs)
+        self.assertTrue(len(rows[schema.Patent.__table__]) == 18)
+        self.assertTrue(len(rows[schema.Application.__table__]) == 18)
+        for table, table_rows in rows.iteritems():
+            for row in table_rows:
+                self.assertTrue(sorted(row.keys()) == sorted(table.c.keys()))
+        # rawlocations are shared between inventors and assignees
+        locations = [row['id'] for row in rows[schema.RawLocation.__table__]]
+        self.assertTrue(len(locations) == len(set(locations)))
+
+    def test_add_grants(self):
+        counts = bulk.add_grants(self.session, self.patobjs, False)
+        self.assertTrue(counts['patent'] == 18)
+        self.assertTrue(self.count(schema.Patent) == 18)
+        self.assertTrue(self.count(schema.Claim) == counts['claim'])
+        self.assertTrue(self.count(schema.RawInventor) == counts['rawinventor'])
+        patent = self.session.query(schema.Patent).first()
+        self.assertTrue(patent.application.patent_id == patent.id)
+        self.assertTrue(all(inv.rawlocation for inv in patent.rawinventors))
+
+    def test_add_grants_override(self):
+        bulk.add_grants(self.session, self.patobjs, False)
+        claims = self.count(schema.Claim)
+        # reparsed patobjs have the same row ids
+        bulk.add_grants(self.session, parse_grants('ipg120327.18.xml'), False)
+        self.assertTrue(self.count(schema.Patent) == 18)
+        self.assertTrue(self.count(schema.Claim) == claims)
+
+    def test_add_grants_no_override(self):
+        bulk.add_grants(self.session, self.patobjs[:10], False)
+        counts = bulk.add_grants(self.session, parse_grants('ipg120327.18.xml'), False, override=False)
+        self.assertTrue(counts['patent'] == 8)
+        self.assertTrue(self.count(schema.Patent) == 18)
+
+class TestBulkApplications(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        schema.ApplicationBase.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.appobjs = parse_applications('ipa130117.one.xml')
+
+    def count(self, table):
+        return self.session.query(table).count()
+
+    def test_application_rows(self):
+        rows = bulk.application_rows(self.appobjs)
+        self.assertTrue(len(rows[schema.App_Application.__table__]) == 2)
+        self.assertTrue(rows.keys() == bulk.application_tables)
+        for table, table_rows in rows.iteritems():
+            for row in table_rows:
+                self.assertTrue(sorted(row.keys()) == sorted(table.c.keys()))
+                if 'application_id' in row:
+                    self.assertTrue(row['application_id'])
+
+    def test_add_applications(self):
+        counts = bulk.add_applications(self.session, self.appobjs, False)
+        self.assertTrue(self.count(schema.App_Application) == 2)
+        self.assertTrue(self.count(schema.App_Claim) == counts['claim'])
+        app = self.session.query(schema.App_Application).first()
+        self.assertTrue(app.claims)
+        self.assertTrue(all(inv.rawlocation for inv in app.rawinventors))
+
+    def test_add_applications_override(self):
+        bulk.add_applications(self.session, self.appobjs, False)
+        claims = self.count(schema.App_Claim)
+        bulk.add_applications(self.session, parse_applications('ipa130117.one.xml'), False)
+        self.assertTrue(self.count(schema.App_Application) == 2)
+        self.assertTrue(self.count(schema.App_Claim) == claims)
+
+    def test_add_applications_no_override(self):
+        bulk.add_applications(self.session, self.appobjs[:1], False)
+        counts = bulk.add_applications(self.session, parse_applications('ipa130117.one.xml'), False, override=False)
+        self.assertTrue(counts['application'] == 1)
+        self.assertTrue(self.count(schema.App_Application) == 2)
+
+if __name__ == '__main__':
+    unittest.main()
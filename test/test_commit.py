@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.append('../lib/')
+sys.path.append('../lib/alchemy/')
+import schema
+import match
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+class TestChunks(unittest.TestCase):
+
+    def test_chunks(self):
+        self.assertTrue(list(match.chunks(range(10), 4)) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertTrue(list(match.chunks(range(8), 4)) == [[0, 1, 2, 3], [4, 5, 6, 7]])
+        self.assertFalse(list(match.chunks([], 4)))
+
+    def test_chunks_lazy(self):
+        consumed = []
+        def rows():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+        chunks = match.chunks(rows(), 4)
+        self.assertTrue(next(chunks) == [0, 1, 2, 3])
+        self.assertTrue(len(consumed) == 4)
+
+class TestCommit(unittest.TestCase):
+
+    def setUp(self):
+        # a file, whose connections are closed on commit, drops the temporary table
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine('sqlite:///{0}'.format(os.path.join(self.tmpdir, 'grant.db')))
+        self.table = schema.RawAssignee.__table__
+        self.table.create(engine)
+        schema.patentassignee.create(engine)
+        engine.execute(self.table.insert(), [{'uuid': unicode(i), 'patent_id': u'1', 'sequence': 0}
+                                             for i in range(10)])
+        self.session = sessionmaker(bind=engine)()
+        self.stdout, sys.stdout = sys.stdout, StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        self.session.close()
+        shutil.rmtree(self.tmpdir)
+
+    def assignees(self):
+        return dict(tuple(row) for row in self.session.execute('SELECT uuid, assignee_id FROM rawassignee'))
+
+    def commit_updates(self):
+        updates = [{'pk': unicode(i), 'update': u'a' + unicode(i)} for i in range(7)]
+        # the last update of a record is kept, also across chunks
+        updates += [{'pk': u'1', 'update': u'b'}, (u'4', u'c')]
+        match.commit_updates(self.session, 'assignee_id', iter(updates), self.table, 4)
+        expected = dict((unicode(i), u'a' + unicode(i)) for i in range(7))
+        expected.update({u'1': u'b', u'4': u'c', u'7': None, u'8': None, u'9': None})
+        self.assertTrue(self.assignees() == expected)
+        self.assertTrue(sys.stdout.getvalue().count('committing') == 3)
+
+    def test_update_from(self):
+        self.commit_updates()
+
+    def test_correlated_update(self):
+        sqlite3 = match.sqlite3
+        class old_sqlite3(object):
+            sqlite_version_info = (3, 7, 17)
+        match.sqlite3 = old_sqlite3
+        try:
+            self.commit_updates()
+        finally:
+            match.sqlite3 = sqlite3
+
+    def test_failed_update(self):
+        self.session.execute("CREATE TRIGGER fail BEFORE UPDATE ON rawassignee "
+                             "BEGIN SELECT RAISE(ABORT, 'failed update'); END")
+        self.assertRaises(Exception, match.commit_updates, self.session, 'assignee_id',
+                          [(u'1', u'a')], self.table, 4)
+        # on the connection the update failed on
+        self.assertFalse(self.session.execute('SELECT name FROM sqlite_temp_master').fetchall())
+
+    def test_no_updates(self):
+        match.commit_updates(self.session, 'assignee_id', [], self.table, 4)
+        self.assertFalse(any(self.assignees().values()))
+
+    def test_commit_inserts(self):
+        rows = ((unicode(i), u'a' + unicode(i)) for i in range(5))
+        match.commit_inserts(self.session, rows, schema.patentassignee, False, 2)
+        match.commit_inserts(self.session, [{'patent_id': u'5', 'assignee_id': u'a5'}],
+                             schema.patentassignee, False, 2)
+        inserted = sorted(tuple(row) for row in self.session.execute('SELECT * FROM patent_assignee'))
+        self.assertTrue(inserted == [(unicode(i), u'a' + unicode(i)) for i in range(6)])
+        self.assertTrue(sys.stdout.getvalue().count('committing') == 4)
+
+    def test_commit_inserts_mixed(self):
+        # a chunk is bound by position if it starts with a tuple, by name if with a dictionary
+        rows = [(u'0', u'a0'), {'patent_id': u'1', 'assignee_id': u'a1'},
+                {'patent_id': u'2', 'assignee_id': u'a2'}, (u'3', u'a3')]
+        match.commit_inserts(self.session, rows, schema.patentassignee, False, 2)
+        inserted = sorted(tuple(row) for row in self.session.execute('SELECT * FROM patent_assignee'))
+        self.assertTrue(inserted == [(unicode(i), u'a' + unicode(i)) for i in range(4)])
+
+    def test_commit_statements(self):
+        inserts = [([], schema.patentassignee)]
+        updates = ('assignee_id', [], self.table)
+        for i in range(5):
+            inserts[0][0].append((unicode(i), u'a' + unicode(i)))
+            updates[1].append((unicode(i), u'a' + unicode(i)))
+            match.commit_statements(self.session, inserts, updates, False, 2)
+            # written and emptied every two updates
+            self.assertTrue(len(updates[1]) == (i + 1) % 2 and len(inserts[0][0]) == (i + 1) % 2)
+        self.assertTrue(len([uuid for uuid, assignee in self.assignees().items() if assignee]) == 4)
+        match.commit_statements(self.session, inserts, updates, False, 2, final=True)
+        self.assertFalse(updates[1] or inserts[0][0])
+        expected = dict((unicode(i), u'a' + unicode(i) if i < 5 else None) for i in range(10))
+        self.assertTrue(self.assignees() == expected)
+        self.assertTrue(self.session.execute('SELECT count(*) FROM patent_assignee').scalar() == 5)
+
+if __name__ == '__main__':
+    unittest.main()
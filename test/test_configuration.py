@@ -7,6 +7,7 @@ sys.path.append('..')
 sys.path.append('../lib')
 
 from start import get_year_list
+from config_parser import HandlerRegistry, get_handler_registry
 
 class Test_Configuration(unittest.TestCase):
 
@@ -48,4 +49,46 @@ class Test_Configuration(unittest.TestCase):
         self.assertTrue(expected == years, '\n{0} should be\n{1}'\
                         .format(years, expected))
 
+class Test_HandlerRegistry(unittest.TestCase):
+
+    def setUp(self):
+        # stand-ins for the handler modules
+        self.v42, self.v44, self.v45, self.default = object(), object(), object(), object()
+        self.registry = HandlerRegistry()
+        self.registry.register(20050000, 20130108, self.v42)
+        self.registry.register(20130115, float('inf'), self.v44)
+        self.registry.register('default', None, self.default)
+
+    def test_lookup(self):
+        self.assertTrue(self.registry.lookup(20050104) is self.v42)
+        self.assertTrue(self.registry.lookup(20130108) is self.v42)
+        self.assertTrue(self.registry.lookup(20130115) is self.v44)
+        self.assertTrue(self.registry.lookup(20990101) is self.v44)
+
+    def test_lookup_default(self):
+        self.assertTrue(self.registry.lookup(20130110) is self.default)
+        self.assertTrue(self.registry.lookup(19990101) is self.default)
+        self.assertTrue(self.registry.lookup('default') is self.default)
+
+    def test_register_new_version(self):
+        self.registry.register(20150101, float('inf'), self.v45)
+        self.assertTrue(self.registry.lookup(20141231) is self.v44)
+        self.assertTrue(self.registry.lookup(20150101) is self.v45)
+
+    def test_register_nested_range(self):
+        patched = object()
+        self.registry.register(20100101, 20100131, patched)
+        self.assertTrue(self.registry.lookup(20100115) is patched)
+        self.assertTrue(self.registry.lookup(20100201) is self.v42)
+
+    def test_process_cfg(self):
+        grants = get_handler_registry('../process.cfg', 'grant')
+        self.assertTrue(grants is get_handler_registry('../process.cfg', 'grant'))
+        self.assertTrue(grants.lookup(20120327).__name__ == 'lib.handlers.grant_handler_v42')
+        self.assertTrue(grants.lookup(20130416).__name__ == 'lib.handlers.grant_handler_v44')
+        applications = get_handler_registry('../process.cfg', 'application')
+        self.assertTrue(applications.lookup(20040101).__name__ == 'lib.handlers.application_handler_v41')
+        self.assertTrue(applications.lookup(20061228).__name__ == 'lib.handlers.application_handler_v42')
+        self.assertTrue(applications.lookup(20130117).__name__ == 'lib.handlers.application_handler_v43')
+
 unittest.main()
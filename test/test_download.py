@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import threading
+import unittest
+import BaseHTTPServer
+
+sys.path.append('../lib/')
+import download
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+class ArchiveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves the files in the server's `files` dictionary (name to content),
+    with support for Range requests. Records the Range header of every
+    request in the server's `ranges` list
+    """
+
+    def do_GET(self):
+        name = self.path.split('/')[-1]
+        if name not in self.server.files:
+            self.send_error(404)
+            return
+        content = self.server.files[name]
+        requested = self.headers.get('Range')
+        self.server.ranges.append(requested)
+        start = int(requested.split('=')[1].rstrip('-')) if requested else 0
+        if start >= len(content):
+            self.send_response(416)
+            if self.server.content_range:
+                self.send_header('Content-Range', 'bytes */{0}'.format(len(content)))
+            self.end_headers()
+            return
+        self.send_response(206 if requested else 200)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def do_HEAD(self):
+        name = self.path.split('/')[-1]
+        if name not in self.server.files:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.files[name])))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), ArchiveHandler)
+        self.server.files = {}
+        self.server.ranges = []
+        self.server.content_range = True
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        for name in ('ipg120327.one', 'ipg120327.two'):
+            self.add_archive(name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def add_archive(self, name):
+        archive = os.path.join(self.directory, name + '.zip')
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(testdir + name + '.xml', name + '.xml')
+        with open(archive, 'rb') as f:
+            self.server.files[name + '.zip'] = f.read()
+        os.remove(archive)
+
+    def url(self, name):
+        return 'http://127.0.0.1:{0}/downloads/{1}'.format(self.server.server_port, name)
+
+    def target(self, name=''):
+        return os.path.join(self.directory, 'data', name)
+
+    def test_download_files(self):
+        urls = [self.url('ipg120327.one.zip'), self.url('ipg120327.two.zip')]
+        self.assertTrue(download.download_files(urls, self.target(), workers=2))
+        self.assertTrue(sorted(os.listdir(self.target())) == ['ipg120327.one.xml', 'ipg120327.two.xml'])
+        with open(testdir + 'ipg120327.two.xml', 'rb') as f:
+            self.assertTrue(open(self.target('ipg120327.two.xml'), 'rb').read() == f.read())
+        # files that are already there are not downloaded again
+        requests = len(self.server.ranges)
+        self.assertTrue(download.download_files(urls, self.target(), workers=2))
+        self.assertTrue(len(self.server.ranges) == requests)
+
+    def test_resume(self):
+        os.makedirs(self.target())
+        content = self.server.files['ipg120327.one.zip']
+        with open(self.target('ipg120327.one.zip.part'), 'wb') as f:
+            f.write(content[:1000])
+        path = download.download(self.url('ipg120327.one.zip'), self.target())
+        self.assertTrue(self.server.ranges == ['bytes=1000-'])
+        self.assertTrue(open(path, 'rb').read() == content)
+        self.assertFalse(os.path.exists(self.target('ipg120327.one.zip.part')))
+
+    def test_complete_part(self):
+        os.makedirs(self.target())
+        content = self.server.files['ipg120327.one.zip']
+        for content_range in (True, False):
+            self.server.content_range = content_range
+            self.server.ranges = []
+            # a partial file as long as the file is complete
+            with open(self.target('ipg120327.one.zip.part'), 'wb') as f:
+                f.write(content)
+            path = download.download(self.url('ipg120327.one.zip'), self.target())
+            self.assertTrue(self.server.ranges == ['bytes={0}-'.format(len(content))])
+            self.assertTrue(open(path, 'rb').read() == content)
+            # a longer one is stale, and is downloaded again
+            with open(self.target('ipg120327.one.zip.part'), 'wb') as f:
+                f.write(content + 'stale')
+            self.server.ranges = []
+            path = download.download(self.url('ipg120327.one.zip'), self.target())
+            self.assertTrue(self.server.ranges == ['bytes={0}-'.format(len(content) + 5), None])
+            self.assertTrue(open(path, 'rb').read() == content)
+            self.assertFalse(os.path.exists(self.target('ipg120327.one.zip.part')))
+            os.remove(path)
+
+    def test_verification(self):
+        os.makedirs(self.target())
+        url = self.url('ipg120327.one.zip')
+        self.assertRaises(IOError, download.download, url, self.target(), md5='0' * 32)
+        self.assertFalse(os.listdir(self.target()))
+        # a corrupt archive is not extracted, and is reported as an error
+        content = self.server.files['ipg120327.one.zip']
+        self.server.files['ipg120327.one.zip'] = content[:100] + 'x' * 50 + content[150:]
+        self.assertFalse(download.download_files([url], self.target()))
+        self.assertFalse(os.path.exists(self.target('ipg120327.one.xml')))
+        self.assertFalse(download.download_files([self.url('missing.zip')], self.target()))
+
+if __name__ == '__main__':
+    unittest.main()
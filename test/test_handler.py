@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import pickle
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+import splitter
+import grant_handler_v42
+import application_handler_v43
+from handler import PatentHandler, GrantRecord, ApplicationRecord, cached_property
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+def first_document(filename):
+    for offset, doc in splitter.split_file(testdir+filename):
+        return str(doc)
+
+class Counter(PatentHandler):
+
+    record = ApplicationRecord
+
+    def __init__(self):
+        self.calls = 0
+
+    @cached_property
+    def claims(self):
+        """claims of the document"""
+        self.calls += 1
+        return [self.calls]
+
+class TestCachedProperty(unittest.TestCase):
+
+    def test_computed_once(self):
+        handler = Counter()
+        self.assertTrue(handler.claims == [1])
+        self.assertTrue(handler.claims is handler.claims)
+        self.assertTrue(handler.calls == 1)
+
+    def test_class_access(self):
+        self.assertTrue(isinstance(Counter.claims, cached_property))
+        self.assertTrue(Counter.claims.__doc__ == 'claims of the document')
+
+    def test_handler_fields_extracted_once(self):
+        patent = grant_handler_v42.Patent(first_document('ipg120327.one.xml'), True)
+        claims = patent.claims
+        patobj = patent.get_patobj()
+        self.assertTrue(patobj.claims is claims)
+        self.assertTrue(patent.get_patobj().inventor_list is patobj.inventor_list)
+
+class TestRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.patobj = grant_handler_v42.Patent(first_document('ipg120327.one.xml'), True).get_patobj()
+        self.appobj = application_handler_v43.Patent(first_document('ipa130117.one.xml'), True).get_patobj()
+
+    def test_record_types(self):
+        self.assertTrue(isinstance(self.patobj, GrantRecord))
+        self.assertTrue(isinstance(self.appobj, ApplicationRecord))
+        self.assertFalse(hasattr(self.patobj, '__dict__'))
+        self.assertTrue(self.patobj.patent == self.patobj.pat['number'])
+        self.assertTrue(self.appobj.application == self.appobj.app['number'])
+
+    def test_as_dict(self):
+        fields = self.appobj.as_dict()
+        self.assertTrue(sorted(fields) == sorted(ApplicationRecord.__slots__))
+        self.assertTrue(fields['claims'] is self.appobj.claims)
+
+    def test_pickle(self):
+        for protocol in (0, 2):
+            patobj = pickle.loads(pickle.dumps(self.patobj, protocol))
+            self.assertTrue(patobj.as_dict() == self.patobj.as_dict())
+
+class TestRowIds(unittest.TestCase):
+
+    def row_ids(self, value):
+        if isinstance(value, dict):
+            ids = [value['uuid']] if 'uuid' in value else []
+            value = value.values()
+        else:
+            ids = []
+        if isinstance(value, list):
+            for item in value:
+                ids.extend(self.row_ids(item))
+        return ids
+
+    def test_deterministic(self):
+        doc = first_document('ipg120327.one.xml')
+        first = self.row_ids(grant_handler_v42.Patent(doc, True).get_patobj().as_dict().values())
+        second = self.row_ids(grant_handler_v42.Patent(doc, True).get_patobj().as_dict().values())
+        self.assertTrue(first and first == second)
+        self.assertTrue('D656296-claim-0' in first)
+
+    def test_unique(self):
+        for handler, filename in [(grant_handler_v42, 'ipg120327.18.xml'),
+                                  (application_handler_v43, 'ipa130117.one.xml')]:
+            ids = []
+            for offset, doc in splitter.split_file(testdir+filename):
+                ids.extend(self.row_ids(handler.Patent(str(doc), True).get_patobj().as_dict().values()))
+            self.assertTrue(len(ids) == len(set(ids)))
+            self.assertTrue(max(map(len, ids)) <= 36)
+
+if __name__ == '__main__':
+    unittest.main()
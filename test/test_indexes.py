@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+import sys
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/alchemy/')
+import schema
+import bulk
+import indexes
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+class TestIndexes(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        schema.GrantBase.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.tables = bulk.grant_tables
+
+    def existing(self):
+        return set(name for table, name in indexes.existing_indexes(self.session.connection(), self.tables))
+
+    def pending(self):
+        return sorted(row.name for row in self.session.query(schema.PendingIndex))
+
+    def test_defer_and_rebuild(self):
+        before = self.existing()
+        deferred = indexes.defer(self.session, schema.PendingIndex, self.tables)
+        self.assertTrue('pat_idx2' in deferred and 'loc_idx1' in deferred)
+        # unique indexes are kept for INSERT OR IGNORE
+        self.assertFalse('pat_idx1' in deferred)
+        self.assertTrue(self.existing() == before - set(deferred))
+        self.assertTrue(self.pending() == deferred)
+        self.assertTrue(indexes.defer(self.session, schema.PendingIndex, self.tables) == deferred)
+        created = indexes.rebuild(self.session, schema.PendingIndex, self.tables)
+        self.assertTrue(sorted(created) == deferred)
+        self.assertTrue(self.existing() == before)
+        self.assertFalse(self.pending())
+        self.assertFalse(indexes.rebuild(self.session, schema.PendingIndex, self.tables))
+
+    def test_interrupted(self):
+        before = self.existing()
+        indexes.defer(self.session, schema.PendingIndex, self.tables)
+        # recorded as pending but interrupted before it was dropped
+        pat_idx2 = [i for i in schema.Patent.__table__.indexes if i.name == 'pat_idx2'][0]
+        pat_idx2.create(bind=self.session.connection())
+        self.session.commit()
+        created = indexes.rebuild(self.session, schema.PendingIndex, self.tables)
+        self.assertFalse('pat_idx2' in created)
+        self.assertTrue(self.existing() == before)
+        self.assertFalse(self.pending())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+from xml.sax import parseString
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+import splitter
+import xml_driver
+import lxml_driver
+import grant_handler_v42
+import application_handler_v43
+from xml_driver import XMLHandler
+
+# Directory of test files
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+text = """<?xml version="1.0" encoding="UTF-8"?>
+<root>
+  <p id="p&amp;1">x&#x2014;y &amp; z
+  second <b>q</b> &#x3b1; t</p>
+  <p>H<sub>2</sub>O and H<sub>2</sub>&#x2014;<sub>4</sub></p>
+  <p>one <i>two</i>
+  three<?in-line-formulae description="In-line Formulae" end="lead"?>four</p>
+  <p>   </p>
+  <x><p>skipped
+  </p></x>
+  <p>last</p>
+</root>
+"""
+
+# references inside a CDATA section, comment or processing instruction are text
+sections = """<root>
+  <p><![CDATA[x &amp; y]]></p>
+  <p>pre &amp; <![CDATA[x &amp; y]]> post<!-- c &amp; d --> z<?pi a &amp; b?>w</p>
+  <p>one<![CDATA[two
+  three]]>four</p>
+</root>
+"""
+
+# references and ]> inside the internal subset of the DOCTYPE are left alone
+subset_doctype = """<?xml version="1.0"?>
+<!-- before &amp; -->
+<!DOCTYPE root [
+  <!ENTITY e "x ]> &#38;#38; &amp; y">
+  <!ATTLIST p id CDATA 'a&amp;b'>
+  <!-- c &amp; d ]> -->
+  <?pi a &amp; b ]>?>
+]>
+"""
+subset = subset_doctype + """<root>
+  <p id="q&amp;r">s &amp; t</p>
+</root>
+"""
+
+# elements named alike inside each other and at different depths
+nested = """<root>
+  <a><c>1</c><b><c>2<c>3</c></c></b></a>
+  <c>4</c>
+  <b><d><c>5</c></d><c>6</c></b>
+</root>
+"""
+
+def tree(element):
+    """
+    Returns the name, attributes, content and children of [element] as
+    nested tuples, to compare the trees built by the two engines
+    """
+    return (element._name, element._attributes, list(element.content),
+            [tree(child) for child in element.children])
+
+class Test_LXMLDriver(unittest.TestCase):
+
+    def sax(self, paths=None):
+        xmlhandler = XMLHandler(paths)
+        parseString(text, xmlhandler)
+        return xmlhandler.root
+
+    def test_same_tree(self):
+        root = lxml_driver.parse(text, is_string=True).root
+        self.assertTrue(tree(root) == tree(self.sax()))
+
+    def test_chunks(self):
+        root = lxml_driver.parse(text, is_string=True).root
+        self.assertTrue(root.p[0].content == [u'x\u2014y & z', u'  second q\u03b1 t'])
+        self.assertTrue(root.p[1].content == [u'H<sub>2</sub>O and H<sub>2</sub>\u2014<sub>4</sub>'])
+        self.assertTrue(root.p[0].get_attribute('id', upper=False) == u'p&1')
+
+    def test_sections(self):
+        root = lxml_driver.parse(sections, is_string=True).root
+        self.assertTrue(root.p[0].content == [u'x &amp; y'])
+        self.assertTrue(root.p[0].get_content() == 'X &AMP; Y')
+        xmlhandler = XMLHandler()
+        parseString(sections, xmlhandler)
+        self.assertTrue(tree(root) == tree(xmlhandler.root))
+
+    def test_doctype(self):
+        marked = lxml_driver.mark_references(subset)
+        self.assertTrue(marked[:len(subset_doctype)] == subset_doctype)
+        self.assertTrue('&#xFDD0;&amp;&#xFDD0;' in marked[len(subset_doctype):])
+        external = '<!DOCTYPE root SYSTEM "root[1].dtd" [<!ENTITY e "&amp;">]>\n<root/>'
+        self.assertTrue(lxml_driver.mark_references(external) == external)
+        root = lxml_driver.parse(subset, is_string=True).root
+        self.assertTrue(root.p[0].content == [u's & t'])
+        xmlhandler = XMLHandler()
+        parseString(subset, xmlhandler)
+        self.assertTrue(tree(root) == tree(xmlhandler.root))
+
+    def test_lookups(self):
+        roots = [parse(nested, is_string=True).root
+                 for parse in (xml_driver.parse_sax, lxml_driver.parse)]
+        contents = lambda elements: [element.content for element in elements]
+        for sax, lxml in [roots, [root.root for root in roots]]:
+            self.assertTrue(contents(lxml.c) == contents(sax.c))
+            self.assertTrue(contents(lxml.b.c) == contents(sax.b.c))
+            self.assertTrue(contents(lxml.a.b.c.c) == contents(sax.a.b.c.c))
+            self.assertTrue(contents(lxml.a.c) == contents(sax.a.c))
+        self.assertTrue(contents(roots[1].root.b.c) == [[u'6'], [u'2'], [u'5']])
+        self.assertFalse(roots[1].root.e)
+
+    def test_long_document(self):
+        # libxml2 does not number the lines past 65535
+        document = '<root>' + '\n' * lxml_driver.max_lines + '<p>last</p></root>'
+        xmlhandler = lxml_driver.parse(document, is_string=True)
+        self.assertFalse(isinstance(xmlhandler, lxml_driver.LXMLHandler))
+        self.assertTrue(xmlhandler.root.root.p[0].content == [u'last'])
+
+    def test_paths(self):
+        root = lxml_driver.parse(text, ['root/p'], True).root
+        self.assertFalse(root.x)
+        self.assertTrue(tree(root) == tree(self.sax(['root/p'])))
+
+    def test_file(self):
+        root = lxml_driver.parse(testdir+'basic.xml').root
+        self.assertTrue(root.a.b.contents_of('c') == ['HELLO', 'WORLD', '3'])
+
+    def test_engine(self):
+        self.assertRaises(ValueError, xml_driver.set_engine, 'dom')
+        try:
+            xml_driver.set_engine('lxml')
+            self.assertTrue(isinstance(xml_driver.parse(text, None, True), lxml_driver.LXMLHandler))
+        finally:
+            xml_driver.set_engine('sax')
+        self.assertFalse(isinstance(xml_driver.parse(text, None, True), lxml_driver.LXMLHandler))
+
+    def compare_handler(self, handler, filename):
+        for offset, doc in splitter.split_file(testdir+filename):
+            records = []
+            for engine in ('sax', 'lxml'):
+                try:
+                    xml_driver.set_engine(engine)
+                    records.append(handler.Patent(str(doc), True).get_patobj().as_dict())
+                finally:
+                    xml_driver.set_engine('sax')
+            self.assertTrue(records[0] == records[1])
+
+    def test_grant_handler(self):
+        self.compare_handler(grant_handler_v42, 'ipg120327.18.xml')
+
+    def test_application_handler(self):
+        self.compare_handler(application_handler_v43, 'ipa130117.one.xml')
+
+if __name__ == '__main__':
+    unittest.main()
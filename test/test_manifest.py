@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import types
+import shutil
+import tempfile
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/alchemy/')
+import schema
+import manifest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+grant_handler = types.ModuleType('lib.handlers.grant_handler_v42')
+other_handler = types.ModuleType('lib.handlers.grant_handler_v44')
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        schema.GrantBase.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'ipg120327.xml')
+        shutil.copyfile(testdir+'ipg120327.two.xml', self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_entry(self, handler=grant_handler):
+        return manifest.get_entry(self.session, schema.Manifest, self.filename, handler)
+
+    def load(self):
+        entry = self.get_entry()
+        progress = manifest.FileProgress(entry, os.path.getsize(self.filename))
+        progress.add(0, 100)
+        progress.add(100, os.path.getsize(self.filename) - 100)
+        progress.stage()
+        self.session.commit()
+        return entry
+
+    def test_new_entry(self):
+        entry = self.get_entry()
+        self.assertTrue(entry.path == os.path.abspath(self.filename))
+        self.assertTrue(entry.path_hash == manifest.path_hash(entry.path))
+        self.assertTrue(len(entry.path_hash) == 40)
+        self.assertTrue(entry.size == os.path.getsize(self.filename))
+        self.assertTrue(entry.hash == manifest.file_hash(self.filename))
+        self.assertTrue(entry.handler == 'grant_handler_v42')
+        self.assertTrue(entry.offset == 0)
+        self.assertFalse(entry.complete)
+
+    def test_unchanged(self):
+        self.load()
+        entry = self.get_entry()
+        self.assertTrue(entry.complete)
+        self.assertTrue(entry.documents == 2)
+
+    def test_touched(self):
+        self.load()
+        stat = os.stat(self.filename)
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime - 3600))
+        entry = self.get_entry()
+        self.assertTrue(entry.complete)
+        self.assertTrue(entry.mtime == int(stat.st_mtime - 3600))
+
+    def test_changed_contents(self):
+        self.load()
+        with open(self.filename, 'ab') as f:
+            f.write('\n')
+        entry = self.get_entry()
+        self.assertFalse(entry.complete)
+        self.assertTrue(entry.offset == 0 and entry.documents == 0)
+
+    def test_changed_handler(self):
+        self.load()
+        entry = self.get_entry(other_handler)
+        self.assertFalse(entry.complete)
+        self.assertTrue(entry.handler == 'grant_handler_v44')
+
+    def test_progress_out_of_order(self):
+        progress = manifest.FileProgress(self.get_entry(), 30)
+        progress.add(10, 10)
+        progress.add(20, 10)
+        self.assertTrue(progress.frontier == 0 and progress.documents == 0)
+        progress.add(0, 10)
+        self.assertTrue(progress.frontier == 30 and progress.documents == 3)
+        self.assertTrue(progress.complete)
+
+    def test_progress_resume(self):
+        entry = self.get_entry()
+        progress = manifest.FileProgress(entry, 30)
+        progress.add(0, 10)
+        progress.stage()
+        self.session.commit()
+        progress = manifest.FileProgress(self.get_entry(), 30)
+        self.assertTrue(progress.frontier == 10 and progress.documents == 1)
+        self.assertFalse(progress.complete)
+
+    def test_no_entry(self):
+        progress = manifest.FileProgress(None, 10)
+        progress.add(0, 10)
+        progress.stage()
+        self.assertTrue(progress.complete)
+
+    def test_checkpoint(self):
+        entry = self.get_entry()
+        progress = manifest.FileProgress(entry, 30)
+        progress.add(0, 10)
+        stage = progress.checkpoint()
+        progress.add(10, 10)
+        stage()
+        self.assertTrue(entry.offset == 10 and entry.documents == 1)
+        self.assertFalse(entry.complete)
+        manifest.FileProgress(None, 10).checkpoint()()
+
+if __name__ == '__main__':
+    unittest.main()
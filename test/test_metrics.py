@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+import metrics
+import splitter
+import handler
+import xml_driver
+import grant_handler_v42
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+class ListReporter(object):
+
+    def __init__(self):
+        self.records = []
+
+    def report(self, record):
+        self.records.append(record)
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.reporter = ListReporter()
+        self.metrics = metrics.Metrics(self.reporter)
+
+    def test_stages(self):
+        self.metrics.start_file('a.xml')
+        self.metrics.add('parse', 0.5)
+        self.metrics.add('parse', 0.25)
+        self.metrics.add('db.patent', 0.1, 40)
+        self.metrics.add_document(100)
+        self.metrics.add_document(50)
+        self.metrics.batch(2)
+        self.metrics.end_file()
+        self.metrics.set_file(None)
+        self.metrics.add('db.commit', 0.5)
+        self.metrics.end_run()
+        batch, document, run = self.reporter.records
+        self.assertTrue(batch['event'] == 'batch' and batch['documents'] == 2)
+        self.assertTrue(document['file'] == 'a.xml')
+        self.assertTrue(document['documents'] == 2 and document['bytes'] == 150)
+        self.assertTrue(document['stages']['parse'] == {'seconds': 0.75, 'count': 2})
+        self.assertTrue(document['stages']['db.patent']['count'] == 40)
+        self.assertFalse('db.commit' in document['stages'])
+        self.assertTrue(run['documents'] == 2)
+        self.assertTrue(run['stages']['db.commit']['count'] == 1)
+        self.assertTrue(run['peak_rss_kb'] > 0)
+
+    def test_merge(self):
+        worker = metrics.Metrics(None)
+        worker.set_file('a.xml')
+        worker.add('parse', 1.0)
+        worker.add_document(10)
+        self.metrics.set_file('a.xml')
+        self.metrics.add('split', 0.5, 3)
+        self.metrics.merge(worker.files)
+        self.metrics.merge(worker.files)
+        self.metrics.end_file('a.xml')
+        record = self.reporter.records[0]
+        self.assertTrue(record['documents'] == 2 and record['seconds'] is None)
+        self.assertTrue(record['stages']['parse']['count'] == 2)
+        self.assertTrue(record['stages']['split']['count'] == 3)
+
+    def test_reporter(self):
+        path = tempfile.mktemp()
+        try:
+            reporter = metrics.JSONLinesReporter(path)
+            reporter.report({'event': 'batch', 'documents': 1})
+            reporter.report({'event': 'run', 'documents': 2})
+            reporter.close()
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            self.assertTrue([r['documents'] for r in records] == [1, 2])
+        finally:
+            os.remove(path)
+
+class TestHooks(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics(ListReporter())
+        handler.metrics = self.metrics
+        xml_driver.metrics = self.metrics
+
+    def tearDown(self):
+        handler.metrics = None
+        xml_driver.metrics = None
+
+    def test_handler(self):
+        documents = [str(doc) for offset, doc in splitter.split_file(testdir + 'ipg120327.18.xml')]
+        for doc in documents:
+            grant_handler_v42.Patent(doc, True).get_patobj()
+        stages = self.metrics.files[None]['stages']
+        self.assertTrue(stages['xml'][1] == len(documents))
+        self.assertTrue(stages['handler.claims'][1] == len(documents))
+        self.assertTrue(all(seconds >= 0 for seconds, count in stages.values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import unittest
+
+basedir = os.path.realpath(os.curdir)
+rootdir = os.path.dirname(basedir)
+sys.path.append(rootdir)
+ipgdir = os.path.join(basedir, 'fixtures/ipgxml/')
+
+class ListReporter(object):
+
+    def __init__(self):
+        self.records = []
+
+    def report(self, record):
+        self.records.append(record)
+
+class TestParseFiles(unittest.TestCase):
+
+    def setUp(self):
+        # a local config.ini, in the current directory, keeps the database in tmpdir
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        self.write_config('grant.db')
+        shutil.copyfile(os.path.join(rootdir, 'process.cfg'), 'process.cfg')
+        self.filename = os.path.join(self.tmpdir, 'ipg120103.xml')
+        shutil.copyfile(os.path.join(ipgdir, 'ipg120103.small.xml'), self.filename)
+        import parse
+        import lib.alchemy as alchemy
+        self.parse, self.alchemy = parse, alchemy
+        alchemy.reload_config()
+        alchemy.grantsession = alchemy.LazySession('grant')
+        self.commit_frequency, parse.commit_frequency = parse.commit_frequency, 10
+        self.stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        self.parse.commit_frequency = self.commit_frequency
+        self.alchemy.grantsession.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+        self.alchemy.reload_config()
+
+    def write_config(self, database):
+        with open('config.ini', 'w') as f:
+            f.write('[sqlite]\npath = {0}\ngrant-database = {1}\n'.format(self.tmpdir, database))
+
+    def use_database(self, database):
+        self.alchemy.grantsession.close()
+        self.write_config(database)
+        self.alchemy.reload_config()
+        self.alchemy.grantsession = self.alchemy.LazySession('grant')
+
+    def contents(self):
+        """
+        Returns the rows of every table of the grant database, sorted, and the
+        manifest without the times it was updated
+        """
+        session = self.alchemy.grantsession
+        tables = dict((table.name, sorted(tuple(row) for row in session.execute(table.select())))
+                      for table in self.alchemy.schema.GrantBase.metadata.sorted_tables
+                      if table.name != 'manifest')
+        entries = sorted((entry.path, entry.documents, entry.offset, entry.complete)
+                         for entry in session.query(self.alchemy.schema.Manifest))
+        return tables, entries
+
+    def patents(self):
+        return self.alchemy.grantsession.query(self.alchemy.schema.Patent).count()
+
+    def entry(self):
+        return self.alchemy.grantsession.query(self.alchemy.schema.Manifest).one()
+
+    def fail_second(self, module, name, counted=lambda: True):
+        """
+        Makes the second call to the function [name] of [module] for which
+        [counted] is True raise
+        """
+        function = getattr(module, name)
+        calls = []
+        def failing(*args, **kwargs):
+            if counted():
+                calls.append(args)
+                if len(calls) == 2:
+                    raise RuntimeError('failed batch')
+            return function(*args, **kwargs)
+        setattr(module, name, failing)
+        try:
+            self.assertRaises(RuntimeError, self.parse.parse_files, [self.filename])
+        finally:
+            setattr(module, name, function)
+
+    def test_failed_batch(self):
+        self.fail_second(self.alchemy.bulk, 'delete_existing')
+        # the manifest holds the first batch, the only one that was written
+        self.assertTrue(self.patents() == 10)
+        self.assert_resumed()
+
+    def test_failed_orm_batch(self):
+        loader, self.parse.loader = self.parse.loader, 'orm'
+        session = self.alchemy.grantsession
+        # add_grant commits every document, the batch commits carry the manifest
+        batch = lambda: any(isinstance(obj, self.alchemy.schema.Manifest) for obj in session.dirty)
+        try:
+            self.fail_second(session, 'commit', batch)
+            self.assertTrue(self.patents() >= 10)
+            self.assert_resumed()
+        finally:
+            self.parse.loader = loader
+
+    def assert_resumed(self):
+        entry = self.entry()
+        self.assertTrue(entry.documents == 10)
+        self.assertFalse(entry.complete)
+        self.alchemy.grantsession.close()
+        self.parse.parse_files([self.filename])
+        self.assertTrue(self.patents() == 25)
+        entry = self.entry()
+        self.assertTrue(entry.documents == 25)
+        self.assertTrue(entry.complete)
+
+    def test_tsv(self):
+        directory = os.path.join(self.tmpdir, 'tsv')
+        for run in range(2):
+            self.parse.parse_files([self.filename], tsv_directory=directory)
+            # every table file is closed, and holds the rows of this run only
+            if os.path.exists('/proc/self/fd'):
+                open_files = [os.path.realpath(os.path.join('/proc/self/fd', fd))
+                              for fd in os.listdir('/proc/self/fd')]
+                self.assertFalse([path for path in open_files if path.startswith(directory)])
+            with open(os.path.join(directory, 'patent.txt')) as f:
+                self.assertTrue(len(f.readlines()) == 25)
+
+    def test_skipped_metrics(self):
+        self.parse.parse_files([self.filename])
+        reporter = ListReporter()
+        self.parse.set_metrics(self.parse.Metrics(reporter))
+        try:
+            self.parse.parse_files([self.filename])
+        finally:
+            self.parse.set_metrics(None)
+        records = reporter.records
+        self.assertTrue([(record['event'], record['documents']) for record in records] ==
+                        [('file', 0), ('run', 0)])
+        self.assertTrue(records[0]['file'] == self.filename)
+        self.assertTrue(records[0]['seconds'] is not None)
+
+    def test_workers(self):
+        filenames = sorted(glob.glob(os.path.join(ipgdir, '*.xml')))
+        self.parse.parse_files(filenames)
+        tables, entries = self.contents()
+        self.use_database('workers.db')
+        self.parse.parse_files(filenames, workers=2)
+        self.assertTrue(self.contents() == (tables, entries))
+        self.assertTrue(len(entries) == len(filenames) and all(entry[3] for entry in entries))
+        self.assertTrue(sum(map(len, tables.values())) > 0)
+
+    def test_failed_worker(self):
+        # only the workers read documents, the calling process splits the file
+        read = self.parse.splitter.MappedReader.read
+        def failing(reader, offset, length):
+            raise IOError('failed read')
+        self.parse.splitter.MappedReader.read = failing
+        try:
+            self.assertRaises(RuntimeError, self.parse.parse_files, [self.filename], 'grant', 2)
+        finally:
+            self.parse.splitter.MappedReader.read = read
+        self.assertFalse(self.entry().complete)
+
+if __name__ == '__main__':
+    unittest.main()
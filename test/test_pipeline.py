@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import sys
+import time
+import threading
+import unittest
+
+sys.path.append('../lib/')
+import pipeline
+
+class TestCommitter(unittest.TestCase):
+
+    def test_order(self):
+        done = []
+        committer = pipeline.Committer(2)
+        for i in range(20):
+            committer.submit(lambda i=i: done.append(i))
+        committer.join()
+        self.assertTrue(done == range(20))
+        committer.submit(lambda: done.append(20))
+        committer.join()
+        self.assertTrue(done[-1] == 20)
+
+    def test_inline(self):
+        done = []
+        committer = pipeline.Committer(0)
+        committer.submit(lambda: done.append(threading.current_thread()))
+        self.assertTrue(done == [threading.current_thread()])
+        committer.join()
+
+    def test_depth(self):
+        release = threading.Event()
+        committer = pipeline.Committer(2)
+        committer.submit(release.wait)
+        committer.submit(lambda: None)
+        # a third job has to wait for one of the first two to finish
+        threading.Timer(0.2, release.set).start()
+        start = time.time()
+        committer.submit(lambda: None)
+        self.assertTrue(time.time() - start >= 0.15)
+        self.assertTrue(committer.blocked >= 0.15)
+        committer.join()
+
+    def test_overlap(self):
+        # commits that wait (e.g. on the database server) run while the next batch is parsed
+        committer = pipeline.Committer(1)
+        start = time.time()
+        for i in range(5):
+            time.sleep(0.05)
+            committer.submit(lambda: time.sleep(0.05))
+        committer.join()
+        self.assertTrue(time.time() - start < 0.45)
+
+    def test_error(self):
+        done = []
+        release = threading.Event()
+        def failing():
+            release.wait()
+            1/0
+        # room for both jobs, so the second is queued before the first fails
+        committer = pipeline.Committer(2)
+        committer.submit(failing)
+        committer.submit(lambda: done.append(1))
+        release.set()
+        self.assertRaises(ZeroDivisionError, committer.join)
+        self.assertFalse(done)
+        committer.submit(lambda: done.append(2))
+        committer.join()
+        self.assertTrue(done == [2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import os
+import re
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+sys.path.append('../lib/')
+import splitter
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+ipgdir = os.path.join(basedir, 'fixtures/ipgxml/')
+regex = re.compile(r"""([<][?]xml version.*?[>]\s*[<][!]DOCTYPE\s+([A-Za-z-]+)\s+.*?/\2[>]\s*)$""", re.S+re.I)
+
+class TestSplitter(unittest.TestCase):
+
+    def assertDocuments(self, filename, count):
+        with open(filename) as f:
+            contents = f.read()
+        docs = [str(doc) for offset, doc in splitter.split_file(filename)]
+        self.assertTrue(len(docs) == count, \
+            "{0} has {1} documents, should be {2}".format(filename, len(docs), count))
+        for doc in docs:
+            self.assertTrue(regex.match(doc))
+        # spans are contiguous from the start of the file
+        self.assertTrue(contents.startswith(''.join(docs)))
+        return docs
+
+    def test_grant_v42(self):
+        self.assertDocuments(testdir+'ipg120327.one.xml', 1)
+        self.assertDocuments(testdir+'ipg120327.two.xml', 2)
+        self.assertDocuments(testdir+'ipg120327.196.xml', 196)
+
+    def test_grant_ipgxml(self):
+        self.assertDocuments(ipgdir+'ipg050104.small.xml', 25)
+        self.assertDocuments(ipgdir+'ipg130416.small.xml', 27)
+
+    def test_application(self):
+        self.assertDocuments(testdir+'ipa061228.one.xml', 1)
+        self.assertDocuments(testdir+'ipa130117.one.xml', 2)
+
+    def test_application_publication(self):
+        docs = self.assertDocuments(testdir+'pa040101.two.xml', 1)
+        self.assertTrue('<!DOCTYPE patent-application-publication' in docs[0])
+
+    def test_no_documents(self):
+        self.assertDocuments(testdir+'basic.xml', 0)
+
+    def test_document_spans_offset(self):
+        with splitter.mapped_file(testdir+'ipg120327.two.xml') as mm:
+            spans = list(splitter.document_spans(mm))
+            self.assertTrue(len(spans) == 2)
+            self.assertTrue(spans[0][0] == 0)
+            self.assertTrue(spans[1][0] == sum(spans[0]))
+            resumed = list(splitter.document_spans(mm, spans[1][0]))
+            self.assertTrue(resumed == spans[1:])
+
+    def test_truncated_document(self):
+        with open(testdir+'ipg120327.two.xml') as f:
+            contents = f.read()
+        truncated = contents[:contents.rindex('</us-patent-grant>')]
+        spans = list(splitter.document_spans(truncated))
+        self.assertTrue(len(spans) == 1)
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = os.path.join(self.directory, 'ipg120327.zip')
+        with zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(testdir+'ipg120327.18.xml', 'ipg120327.xml')
+        with splitter.mapped_file(testdir+'ipg120327.18.xml') as mm:
+            self.docs = [(offset, mm[offset:offset+length])
+                         for offset, length in splitter.document_spans(mm)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stream_documents(self):
+        # block sizes that cut documents and closing tags at every place
+        for blocksize in (1, 7, 100, 4096, 2**20):
+            with open(testdir+'ipg120327.18.xml', 'rb') as f:
+                docs = list(splitter.stream_documents(f, blocksize=blocksize))
+            self.assertTrue(docs == self.docs)
+        with open(testdir+'ipg120327.18.xml', 'rb') as f:
+            self.assertTrue(list(splitter.stream_documents(f, self.docs[5][0], 1000)) == self.docs[5:])
+
+    def test_split_archive(self):
+        self.assertTrue(splitter.archive_member(self.archive) == 'ipg120327.xml')
+        self.assertTrue(list(splitter.split_file(self.archive)) == self.docs)
+
+    def test_archive_reader(self):
+        with splitter.open_reader(self.archive) as reader:
+            spans = list(reader.spans())
+            self.assertTrue(spans == [(offset, len(doc)) for offset, doc in self.docs])
+            self.assertTrue(list(reader.spans(spans[3][0])) == spans[3:])
+            # forward reads skip documents, reading back starts over
+            for i in (0, 2, 3, 17, 1):
+                self.assertTrue(reader.read(*spans[i]) == self.docs[i][1])
+        with splitter.open_reader(testdir+'ipg120327.18.xml') as reader:
+            self.assertTrue(list(reader.spans()) == spans)
+            self.assertTrue(reader.read(*spans[17]) == self.docs[17][1])
+
+if __name__ == '__main__':
+    unittest.main()
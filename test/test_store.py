@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+import store
+import splitter
+import grant_handler_v42
+import application_handler_v43
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+def documents(handler, filename):
+    return [handler.Patent(str(doc), True).get_patobj()
+            for offset, doc in splitter.split_file(testdir+filename)]
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, doctype, source, patobjs, batch_size=1000):
+        path = store.store_path(self.directory, source)
+        with store.RecordWriter(path, doctype, source, batch_size) as writer:
+            for patobj in patobjs:
+                writer.add(patobj)
+        return path
+
+    def test_round_trip(self):
+        for doctype, handler, filename in [('grant', grant_handler_v42, 'ipg120327.18.xml'),
+                                           ('application', application_handler_v43, 'ipa130117.one.xml')]:
+            patobjs = documents(handler, filename)
+            # small batches so the records span several batches
+            path = self.write(doctype, testdir+filename, patobjs, batch_size=4)
+            self.assertTrue(path == os.path.join(self.directory, filename + '.records'))
+            header = store.read_header(path)
+            self.assertTrue(header['doctype'] == doctype and header['source'] == filename)
+            loaded = list(store.read_records(path))
+            self.assertTrue(type(loaded[0]).__name__ == type(patobjs[0]).__name__)
+            self.assertTrue([p.as_dict() for p in loaded] == [p.as_dict() for p in patobjs])
+
+    def test_list_store(self):
+        patobjs = documents(grant_handler_v42, 'ipg120327.one.xml')
+        second = self.write('grant', 'ipg120403.xml', patobjs)
+        first = self.write('grant', 'ipg120327.xml', patobjs)
+        open(os.path.join(self.directory, 'notes.txt'), 'w').close()
+        self.assertTrue(store.list_store(self.directory) == [first, second])
+
+    def test_abort(self):
+        path = store.store_path(self.directory, 'ipg120327.xml')
+        try:
+            with store.RecordWriter(path, 'grant', 'ipg120327.xml') as writer:
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(os.listdir(self.directory))
+
+    def test_truncated(self):
+        patobjs = documents(grant_handler_v42, 'ipg120327.one.xml')
+        path = self.write('grant', 'ipg120327.xml', patobjs)
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-10])
+        self.assertRaises(IOError, list, store.read_records(path))
+        with open(path, 'wb') as f:
+            f.write('<?xml version="1.0"?>')
+        self.assertRaises(IOError, store.read_header, path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+
+sys.path.append('../lib/')
+sys.path.append('../lib/handlers/')
+sys.path.append('../lib/alchemy/')
+import splitter
+import grant_handler_v42
+import schema
+import bulk
+import tsv
+
+basedir = os.curdir
+testdir = os.path.join(basedir, 'fixtures/xml/')
+
+def parse_grants(filename):
+    return [grant_handler_v42.Patent(str(doc), True).get_patobj()
+            for offset, doc in splitter.split_file(testdir+filename)]
+
+class TestFormat(unittest.TestCase):
+
+    def test_escape(self):
+        self.assertTrue(tsv.escape('plain text') == 'plain text')
+        self.assertTrue(tsv.escape('a\tb\nc\\d"e\r\0') == 'a\\tb\\nc\\\\d\\"e\\r\\0')
+
+    def test_values(self):
+        date = tsv.column_formatter(schema.Patent.__table__.c.date)
+        self.assertTrue(date(None) == '\\N')
+        self.assertTrue(date(datetime.datetime(2012, 3, 27)) == '2012-03-27')
+        text = tsv.column_formatter(schema.Patent.__table__.c.title)
+        self.assertTrue(text(u'caf\xe9\tbar') == 'caf\xc3\xa9\\tbar')
+        self.assertTrue(text(12) == '12')
+
+class TestTSVWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.patobjs = parse_grants('ipg120327.18.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, table):
+        with open(os.path.join(self.directory, table.name + '.txt')) as f:
+            return [line.split('\t') for line in f.read().split('\n')[:-1]]
+
+    def test_tables(self):
+        writer = tsv.TSVWriter(self.directory, 'grant')
+        counts = writer.add_all(self.patobjs)
+        writer.close()
+        rows = bulk.grant_rows(self.patobjs)
+        for table in bulk.grant_tables:
+            self.assertTrue(counts[table.name] == len(rows[table]))
+            if not rows[table]:
+                self.assertFalse(os.path.exists(os.path.join(self.directory, table.name + '.txt')))
+                continue
+            lines = self.read(table)
+            self.assertTrue(len(lines) == len(rows[table]))
+            self.assertTrue(all(len(line) == len(table.c) for line in lines))
+        patents = self.read(schema.Patent.__table__)
+        self.assertTrue(patents[0][0] == self.patobjs[0].pat['id'])
+
+    def test_shared_rows_written_once(self):
+        writer = tsv.TSVWriter(self.directory, 'grant')
+        writer.add_all(self.patobjs[:10])
+        counts = writer.add_all(self.patobjs)
+        writer.close()
+        locations = bulk.grant_rows(self.patobjs)[schema.RawLocation.__table__]
+        self.assertTrue(counts['patent'] == len(self.patobjs))
+        self.assertTrue(len(self.read(schema.RawLocation.__table__)) == len(locations))
+        self.assertTrue(len(self.read(schema.Patent.__table__)) == len(self.patobjs) + 10)
+
+    def test_rerun(self):
+        for run in range(2):
+            writer = tsv.TSVWriter(self.directory, 'grant')
+            writer.add_all(self.patobjs)
+            writer.close()
+        self.assertTrue(len(self.read(schema.Patent.__table__)) == len(self.patobjs))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,13 @@
 import os
 import re
 import sys
+import pickle
 import unittest
-from xml.sax import make_parser, handler
+from xml.sax import make_parser, handler, parseString
 from cgi import escape as html_escape
 
 sys.path.append('../lib/handlers/')
-from xml_driver import XMLElement, XMLHandler
+from xml_driver import XMLElement, XMLHandler, ChainList, path_trie, whole_subtree
 
 # Directory of test files
 basedir = os.curdir
@@ -49,4 +50,115 @@ class Test_XMLElement_Basic(unittest.TestCase):
         self.assertTrue(self.root.a.b.contents_of('c') == ['HELLO','WORLD','3'])
         self.assertTrue(self.root.a.b[0].contents_of('c') == ['HELLO','WORLD'])
 
+nested = """<?xml version="1.0"?>
+<root>
+<x><a>1</a><b><a>2<a>3</a></a></b></x>
+<a>4</a>
+</root>"""
+
+class Test_XMLElement_Index(unittest.TestCase):
+
+    def setUp(self):
+        xmlhandler = XMLHandler()
+        parseString(nested, xmlhandler)
+        self.root = xmlhandler.root
+
+    def contents(self, elements):
+        return [element.get_content() for element in elements]
+
+    def test_breadth_first_order(self):
+        # shallower matches come first, then document order
+        self.assertTrue(self.contents(self.root.a) == ['4', '1', '2'])
+
+    def test_nested_matches_skipped(self):
+        self.assertTrue(self.contents(self.root.x.a) == ['1', '2'])
+        self.assertTrue(self.contents(self.root.b.a) == ['2'])
+        self.assertTrue(self.contents(self.root.b.a[0].a) == ['3'])
+
+    def test_chainlist(self):
+        x, = self.root.x
+        b, = self.root.b
+        # items are searched together, nearest matches first, in list order
+        self.assertTrue(self.contents(ChainList([b, x]).a) == ['2', '1', '2'])
+        self.assertTrue(self.contents(ChainList(self.root.a).a) == ['4', '1', '2'])
+        self.assertFalse(ChainList([b, x]).c)
+
+    def test_unindexed(self):
+        # elements built by hand are searched without the index
+        root = XMLElement('root', {})
+        for name in ('x', 'a', 'x'):
+            root.add_child(XMLElement(name, {}))
+        root.children[0].add_child(XMLElement('a', {}))
+        self.assertTrue(len(root.a) == 2)
+        self.assertTrue(root.a[0] is root.children[1])
+        self.assertTrue(len(ChainList(root.children).a) == 2)
+
+class Test_XMLElement_Compact(unittest.TestCase):
+
+    def setUp(self):
+        xmlhandler = XMLHandler()
+        parseString(nested, xmlhandler)
+        self.root = xmlhandler.root
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(self.root, '__dict__'))
+
+    def test_shared_empty(self):
+        a, = self.root.b.a[0].a
+        x, = self.root.x
+        self.assertTrue(a.children is x.a[0].children)
+        a.add_child(XMLElement('c', {}))
+        self.assertTrue(len(a.children) == 1)
+        self.assertFalse(x.a[0].children)
+        self.assertTrue(x.get_content() == [])
+
+    def test_attributes(self):
+        element = XMLElement('a', {'id': 'x1'})
+        self.assertTrue(element['id'] == 'X1')
+        self.assertTrue(element.get_attribute('id', upper=False) == 'x1')
+
+    def test_pickle(self):
+        root = pickle.loads(pickle.dumps(self.root, 2))
+        self.assertTrue([a.get_content() for a in root.a] == ['4', '1', '2'])
+
+class Test_XMLHandler_Paths(unittest.TestCase):
+
+    def parse(self, paths):
+        xmlhandler = XMLHandler(paths)
+        parseString(nested, xmlhandler)
+        return xmlhandler.root
+
+    def contents(self, elements):
+        return [element.get_content() for element in elements]
+
+    def test_path_trie(self):
+        self.assertTrue(path_trie(['root/x', 'root/x/b', 'root/a']) == \
+                        {'root': {'x': whole_subtree, 'a': whole_subtree}})
+        self.assertTrue(path_trie(['root/x/b']) == {'root': {'x': {'b': whole_subtree}}})
+
+    def test_whole_subtree(self):
+        root = self.parse(['root/x'])
+        self.assertTrue(self.contents(root.a) == ['1', '2'])
+        self.assertTrue(self.contents(root.b.a[0].a) == ['3'])
+
+    def test_path(self):
+        root = self.parse(['root/x/b'])
+        self.assertTrue(len(root.x) == 1)
+        self.assertTrue(self.contents(root.a) == ['2'])
+
+    def test_skipped_root(self):
+        root = self.parse(['other/x'])
+        self.assertFalse(root.children)
+        self.assertFalse(root.a)
+
+    def test_handler_paths(self):
+        full = Test_XMLElement_Basic('test_basic_xml_tag_counts')
+        full.setUp()
+        xmlhandler = XMLHandler(['a/b'])
+        parser = make_parser()
+        parser.setContentHandler(xmlhandler)
+        parser.setFeature(handler.feature_external_ges, False)
+        parser.parse(testdir+'basic.xml')
+        self.assertTrue(xmlhandler.root.a.b.contents_of('c') == full.root.a.b.contents_of('c'))
+
 unittest.main()
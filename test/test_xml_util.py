@@ -178,4 +178,29 @@ class Test_xml_util(unittest.TestCase):
             "{0}\nshould be\n{1}\nand\n{2}\nshould be\n{3}".format\
             (newfirst, "Troy", newlast, "Van Der Whol"))
 
+    def test_clean_shortcuts(self):
+        teststrings = [u"US", u"2012-03-27", u"New York", u"a  b", u"a\tb", u"x & y",
+                       u"H<sub>2</sub>O", u"a<sub>&#x2014;</sub>b", u"Z\u00fcrich",
+                       accent_file.decode('utf-8'), "plain str"]
+        for teststring in teststrings:
+            for upper in (True, False):
+                resstring = xml_util.clean(teststring, upper)
+                goalstring = xml_util.clean_string(teststring, upper)
+                self.assertTrue(resstring == goalstring and type(resstring) == type(goalstring), \
+                    "{0}\nshould be\n{1}".format(repr(resstring), repr(goalstring)))
+                # again, from the cache for the short ones
+                self.assertTrue(xml_util.clean(teststring, upper) == goalstring)
+
+    def test_lru_cache(self):
+        cache = xml_util.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        self.assertTrue(cache.get('a') == 1)
+        cache.put('d', 4)
+        cache.put('e', 5)
+        self.assertTrue(cache.get('b') is None)
+        self.assertTrue(cache.get('a') == 1)
+        self.assertTrue(len(cache.recent) + len(cache.old) <= 4)
+
 unittest.main()